@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# 本地假模型服务：同时实现 OpenAI chat/completions、Responses API、docker llama.cpp runner
+# 与自定义 http provider 的协议，延迟、分块与错误率均可配置，供压测使用
+
+
+@dataclass
+class FakeSettings:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    ttft_ms: float = 20.0
+    chunk_delay_ms: float = 5.0
+    chunks: int = 8
+    error_rate: float = 0.0
+    seed: int | None = None
+
+
+def _answer_for(prompt: str, structured: bool = False) -> str:
+    # 生成子节点的提示词要求只输出 JSON，返回合法内容以覆盖解析路径；带 JSON Schema 时按结构化输出包一层对象
+    if "最终只输出 JSON" in prompt:
+        match = re.search(r"生成 (\d+) 个", prompt)
+        count = int(match.group(1)) if match else 2
+        questions = [{"question": f"子问题 {index + 1}"} for index in range(count)]
+        return json.dumps({"questions": questions} if structured else questions, ensure_ascii=False)
+    return "这是假模型的回答，用于压测。" * 4
+
+
+def _usage(prompt: str, answer: str) -> Dict[str, int]:
+    return {"prompt_tokens": len(prompt), "completion_tokens": len(answer), "total_tokens": len(prompt) + len(answer)}
+
+
+def _split(answer: str, parts: int) -> list[str]:
+    size = max(1, -(-len(answer) // max(1, parts)))
+    return [answer[index:index + size] for index in range(0, len(answer), size)]
+
+
+def _sse(data: Any) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(settings: FakeSettings) -> FastAPI:
+    app = FastAPI(title="MindFlow fake LLM")
+    rng = random.Random(settings.seed)
+    stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    async def delay(base_ms: float) -> None:
+        jitter = rng.uniform(-settings.jitter_ms, settings.jitter_ms) if settings.jitter_ms else 0.0
+        await asyncio.sleep(max(0.0, base_ms + jitter) / 1000)
+
+    def failed() -> Response | None:
+        stats["requests"] += 1
+        if settings.error_rate and rng.random() < settings.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "fake overload"}}, status_code=503)
+        return None
+
+    async def chunks(answer: str) -> AsyncIterator[str]:
+        await delay(settings.ttft_ms)
+        for index, piece in enumerate(_split(answer, settings.chunks)):
+            if index:
+                await asyncio.sleep(settings.chunk_delay_ms / 1000)
+            yield piece
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        error = failed()
+        if error is not None:
+            return error
+        prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+        answer = _answer_for(prompt, "response_format" in body)
+        model = body.get("model", "fake")
+        if not body.get("stream"):
+            await delay(settings.latency_ms)
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}],
+                    "usage": _usage(prompt, answer),
+                }
+            )
+        stats["streams"] += 1
+
+        async def events() -> AsyncIterator[str]:
+            async for piece in chunks(answer):
+                yield _sse({"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": piece}}]})
+            yield _sse({"object": "chat.completion.chunk", "choices": [], "usage": _usage(prompt, answer)})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.post("/v1/chat/completions")(chat_completions)
+    app.post("/engines/llama.cpp/v1/chat/completions")(chat_completions)
+
+    @app.post("/v1/responses")
+    async def responses(request: Request) -> Response:
+        body = await request.json()
+        error = failed()
+        if error is not None:
+            return error
+        prompt = str(body.get("input", ""))
+        answer = _answer_for(prompt, "text" in body)
+        usage = {"input_tokens": len(prompt), "output_tokens": len(answer)}
+        if not body.get("stream"):
+            await delay(settings.latency_ms)
+            return JSONResponse(
+                {
+                    "id": "resp-fake",
+                    "output": [{"type": "message", "content": [{"type": "output_text", "text": answer}]}],
+                    "usage": usage,
+                }
+            )
+        stats["streams"] += 1
+
+        async def events() -> AsyncIterator[str]:
+            async for piece in chunks(answer):
+                yield _sse({"type": "response.output_text.delta", "delta": piece})
+            yield _sse({"type": "response.completed", "response": {"usage": usage}})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/ask")
+    async def custom_http(request: Request) -> Response:
+        body = await request.json()
+        error = failed()
+        if error is not None:
+            return error
+        prompt = str(body.get("question", ""))
+        answer = _answer_for(prompt, "schema" in body)
+        if not body.get("stream"):
+            await delay(settings.latency_ms)
+            return JSONResponse({"answer": answer, "usage": _usage(prompt, answer)})
+        stats["streams"] += 1
+        return StreamingResponse(chunks(answer), media_type="text/plain; charset=utf-8")
+
+    @app.get("/stats")
+    async def fake_stats() -> Dict[str, Any]:
+        return {**stats, "uptime": round(time.monotonic() - started, 3)}
+
+    started = time.monotonic()
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake LLM server for MindFlow benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--latency-ms", type=float, default=FakeSettings.latency_ms, help="非流式回答的平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=FakeSettings.jitter_ms, help="延迟的随机抖动范围")
+    parser.add_argument("--ttft-ms", type=float, default=FakeSettings.ttft_ms, help="流式回答的首段延迟")
+    parser.add_argument("--chunk-delay-ms", type=float, default=FakeSettings.chunk_delay_ms, help="流式分块间隔")
+    parser.add_argument("--chunks", type=int, default=FakeSettings.chunks, help="流式回答的分块数")
+    parser.add_argument("--error-rate", type=float, default=FakeSettings.error_rate, help="返回 503 的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    settings = FakeSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        ttft_ms=args.ttft_ms,
+        chunk_delay_ms=args.chunk_delay_ms,
+        chunks=args.chunks,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# 各 provider 在假模型服务上对应的路径
+PROVIDER_PATHS = {
+    "openai": "/v1/chat/completions",
+    "openai-responses": "/v1/responses",
+    "docker": "/engines/llama.cpp/v1/chat/completions",
+    "http": "/ask",
+}
+
+SCENARIOS = ("ask", "ask_stream", "generate", "summary", "mindmap")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    # nearest-rank，样本量小时也不会插值出不存在的值
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _summarize(samples: list[float]) -> Dict[str, float]:
+    values = sorted(samples)
+    if not values:
+        return {}
+    return {
+        "p50": round(_percentile(values, 50) * 1000, 3),
+        "p95": round(_percentile(values, 95) * 1000, 3),
+        "p99": round(_percentile(values, 99) * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+async def _drive(
+    name: str,
+    requests: int,
+    concurrency: int,
+    call: Callable[[int], Awaitable[Optional[float]]],
+    **extra: Any,
+) -> Dict[str, Any]:
+    latencies: list[float] = []
+    first_bytes: list[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                ttfb = await call(index)
+            except Exception as exc:  # noqa: BLE001
+                key = type(exc).__name__
+                if isinstance(exc, httpx.HTTPStatusError):
+                    key = str(exc.response.status_code)
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if ttfb is not None:
+                first_bytes.append(ttfb)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    duration = time.perf_counter() - started
+    result: Dict[str, Any] = {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": _summarize(latencies),
+        **extra,
+    }
+    if first_bytes:
+        result["ttfb_ms"] = _summarize(first_bytes)
+    return result
+
+
+def _build_tree(total: int, fanout: int) -> list[Dict[str, Any]]:
+    now = datetime.now(timezone.utc).isoformat()
+    nodes: list[Dict[str, Any]] = []
+    queue: list[Dict[str, Any]] = []
+    for index in range(total):
+        node = {
+            "id": uuid.uuid4().hex,
+            "parentId": None,
+            "question": f"节点 {index} 的问题",
+            "answer": f"节点 {index} 的回答，" * 3,
+            "position": {"x": float(index % 200) * 40, "y": float(index // 200) * 40},
+            "createdAt": now,
+            "updatedAt": now,
+            "children": [],
+        }
+        if queue:
+            parent = queue[0]
+            node["parentId"] = parent["id"]
+            parent["children"].append(node)
+            if len(parent["children"]) >= fanout:
+                queue.pop(0)
+        else:
+            nodes.append(node)
+        queue.append(node)
+    return nodes
+
+
+async def run_scenarios(client: httpx.AsyncClient, args: argparse.Namespace) -> list[Dict[str, Any]]:
+    results: list[Dict[str, Any]] = []
+    # 每次提问内容不同，避免命中回答缓存或被 single-flight 合并
+    run_id = uuid.uuid4().hex[:8]
+
+    async def ask(index: int) -> None:
+        response = await client.post("/api/ask", json={"question": f"bench {run_id} ask {index}"})
+        response.raise_for_status()
+
+    async def ask_stream(index: int) -> float:
+        started = time.perf_counter()
+        ttfb: float | None = None
+        async with client.stream("POST", "/api/ask/stream", json={"question": f"bench {run_id} stream {index}"}) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if ttfb is None and chunk:
+                    ttfb = time.perf_counter() - started
+        return ttfb or 0.0
+
+    async def generate(index: int) -> None:
+        response = await client.post("/api/generate", json={"topic": f"bench {run_id} topic {index}", "count": 3})
+        response.raise_for_status()
+
+    entries = [{"question": f"问题 {n}", "answer": f"回答 {n}", "depth": min(n, 3)} for n in range(12)]
+
+    async def summary(index: int) -> None:
+        response = await client.post("/api/summary", json={"topic": f"bench {run_id} summary {index}", "entries": entries})
+        response.raise_for_status()
+
+    calls = {"ask": ask, "ask_stream": ask_stream, "generate": generate, "summary": summary}
+    for name in args.scenarios:
+        if name in calls:
+            print(f"running {name} requests={args.requests} concurrency={args.concurrency}", file=sys.stderr)
+            results.append(await _drive(name, args.requests, args.concurrency, calls[name]))
+
+    if "mindmap" in args.scenarios:
+        for size in args.mindmap_sizes:
+            results.extend(await _mindmap_scenarios(client, size, args))
+    return results
+
+
+async def _mindmap_scenarios(client: httpx.AsyncClient, size: int, args: argparse.Namespace) -> list[Dict[str, Any]]:
+    print(f"running mindmap size={size}", file=sys.stderr)
+    payload = json.dumps({"nodes": _build_tree(size, args.fanout)}, ensure_ascii=False).encode("utf-8")
+    repeat = max(1, args.mindmap_repeat)
+    headers = {"Content-Type": "application/json"}
+
+    async def save(_: int) -> None:
+        response = await client.post("/api/mindmap", content=payload, headers=headers)
+        response.raise_for_status()
+
+    async def load(_: int) -> None:
+        response = await client.get("/api/mindmap")
+        response.raise_for_status()
+        await response.aread()
+
+    # 保存会串行化（写锁），并发意义不大；读取用配置的并发
+    extra = {"nodes": size, "payload_bytes": len(payload)}
+    saved = await _drive("mindmap_save", repeat, 1, save, **extra)
+    loaded = await _drive("mindmap_load", repeat, args.concurrency, load, **extra)
+    return [saved, loaded]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} 在 {timeout} 秒内未就绪")
+            await asyncio.sleep(0.2)
+
+
+def _spawn(stack: ExitStack, command: list[str], env: Dict[str, str], log_path: Path) -> None:
+    log = stack.enter_context(log_path.open("w", encoding="utf-8"))
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop() -> None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    stack.callback(stop)
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    with ExitStack() as stack:
+        target = args.target
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="mindflow-bench-")))
+        if target is None:
+            fake_port, api_port = _free_port(), _free_port()
+            fake_command = [
+                sys.executable, "-m", "bench.fake_llm", "--port", str(fake_port),
+                "--latency-ms", str(args.latency_ms), "--ttft-ms", str(args.ttft_ms),
+                "--chunk-delay-ms", str(args.chunk_delay_ms), "--error-rate", str(args.error_rate),
+                "--seed", str(args.seed),
+            ]
+            _spawn(stack, fake_command, dict(os.environ), workdir / "fake_llm.log")
+            provider = "openai" if args.provider == "openai-responses" else args.provider
+            suffix = "sqlite3" if args.storage == "sqlite" else "json"
+            env = {
+                **os.environ,
+                "MINDFLOW_PROVIDER": provider,
+                "MINDFLOW_BASE_URL": f"http://127.0.0.1:{fake_port}{PROVIDER_PATHS[args.provider]}",
+                "MINDFLOW_API_KEY": "bench",
+                "MINDFLOW_MODEL": "bench",
+                "MINDFLOW_CACHE_ENABLED": "false",
+                "MINDFLOW_CONFIG_WATCH_INTERVAL": "0",
+                "MINDFLOW_MAX_QUEUE": str(max(64, args.concurrency * 4)),
+                "MINDFLOW_HISTORY_PATH": str(workdir / "history.jsonl"),
+                "MINDFLOW_STORAGE_BACKEND": args.storage,
+                "MINDFLOW_STORAGE_PATH": str(workdir / f"mindmap.{suffix}"),
+            }
+            api_command = [
+                sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(api_port),
+                "--log-level", "warning",
+            ]
+            _spawn(stack, api_command, env, workdir / "api.log")
+            target = f"http://127.0.0.1:{api_port}"
+            await _wait_ready(f"http://127.0.0.1:{fake_port}/stats")
+        await _wait_ready(f"{target}/health")
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=target, timeout=args.timeout, limits=limits) as client:
+            results = await run_scenarios(client, args)
+            metrics = None
+            if args.metrics:
+                response = await client.get("/api/metrics")
+                metrics = response.text if response.status_code == 200 else None
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.target or "spawned",
+            "provider": args.provider,
+            "storage": args.storage,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "fake": {
+                "latency_ms": args.latency_ms,
+                "ttft_ms": args.ttft_ms,
+                "chunk_delay_ms": args.chunk_delay_ms,
+                "error_rate": args.error_rate,
+                "seed": args.seed,
+            },
+        },
+        "results": results,
+    }
+    if metrics is not None:
+        report["metrics"] = metrics
+    return report
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MindFlow benchmark suite")
+    parser.add_argument("--target", default=None, help="压测已运行的服务（如 http://127.0.0.1:8000），默认自动启动服务与假模型")
+    parser.add_argument("--provider", choices=sorted(PROVIDER_PATHS), default="openai", help="自动启动时使用的 provider 协议")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json", help="自动启动时使用的脑图存储")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mindmap-sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--mindmap-repeat", type=int, default=5, help="每种规模的保存/读取次数")
+    parser.add_argument("--fanout", type=int, default=8, help="生成测试脑图时每个节点的子节点数")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--ttft-ms", type=float, default=20.0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--metrics", action="store_true", help="在结果中附带 /api/metrics 的快照")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 输出路径，默认打印到 stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
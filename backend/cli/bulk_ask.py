@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+try:
+    from backend.services.ai_client import AIClient, ProviderError
+    from backend.services.cache import CachePolicy
+    from backend.services.mindmap_registry import DEFAULT_MAP_ID, MindMapRegistry, create_mindmap_registry
+    from backend.services.mindmap_store import shutdown_mindmap_store
+    from backend.services.scheduler import Priority, SchedulerOverloaded
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.ai_client import AIClient, ProviderError  # type: ignore
+    from services.cache import CachePolicy  # type: ignore
+    from services.mindmap_registry import DEFAULT_MAP_ID, MindMapRegistry, create_mindmap_registry  # type: ignore
+    from services.mindmap_store import shutdown_mindmap_store  # type: ignore
+    from services.scheduler import Priority, SchedulerOverloaded  # type: ignore
+
+logger = logging.getLogger("mindflow.bulk_ask")
+
+# 写入脑图时每批最多提交的节点数，以及最长等待时间
+MINDMAP_BATCH = 50
+MINDMAP_BATCH_SECONDS = 1.0
+# 结果文件每写入这么多行 fsync 一次，崩溃时最多重做这些条目
+FSYNC_EVERY = 100
+
+
+@dataclass
+class Item:
+    index: int
+    key: str
+    question: str
+
+
+def _item_key(question: str, explicit: Any = None) -> str:
+    # 没有显式 id 时按问题内容生成，输入文件增删行后断点续跑依然对得上
+    if explicit not in (None, ""):
+        return str(explicit)
+    return hashlib.sha256(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def detect_format(path: Path, fmt: str) -> str:
+    if fmt != "auto":
+        return fmt
+    suffix = path.suffix.lower()
+    if suffix in {".jsonl", ".ndjson"}:
+        return "jsonl"
+    if suffix in {".csv", ".tsv"}:
+        return "csv"
+    return "text"
+
+
+def iter_questions(path: Path, fmt: str) -> Iterator[Item]:
+    """逐行读取问题，不把整个文件载入内存；空行、# 开头的注释行和缺少问题的记录会被跳过。"""
+    fmt = detect_format(path, fmt)
+    index = 0
+    with path.open("r", encoding="utf-8-sig", newline="") as fp:
+        if fmt == "csv":
+            rows: Iterator[tuple[str, Any]] = _csv_rows(fp, "\t" if path.suffix.lower() == ".tsv" else ",")
+        elif fmt == "jsonl":
+            rows = _jsonl_rows(fp)
+        else:
+            rows = ((line.strip(), None) for line in fp if not line.lstrip().startswith("#"))
+        for question, explicit in rows:
+            if not question:
+                continue
+            yield Item(index, _item_key(question, explicit), question)
+            index += 1
+
+
+def _jsonl_rows(fp: TextIO) -> Iterator[tuple[str, Any]]:
+    for line_no, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning("Skip malformed JSONL line %s", line_no)
+            continue
+        if isinstance(record, str):
+            yield record.strip(), None
+        elif isinstance(record, dict):
+            yield str(record.get("question") or "").strip(), record.get("id")
+
+
+def _csv_rows(fp: TextIO, delimiter: str) -> Iterator[tuple[str, Any]]:
+    reader = csv.reader(fp, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [name.strip().lower() for name in header]
+    if "question" in columns:
+        question_col, id_col = columns.index("question"), columns.index("id") if "id" in columns else None
+    else:
+        # 没有表头时第一列即问题，表头行本身也是一条问题
+        question_col, id_col = 0, None
+        yield header[0].strip(), None
+    for row in reader:
+        if len(row) > question_col:
+            yield row[question_col].strip(), row[id_col] if id_col is not None and len(row) > id_col else None
+
+
+def load_checkpoint(path: Path) -> Dict[str, Dict[str, Any]]:
+    """读取已有结果文件中成功完成的条目；崩溃时写了一半的末行会被截掉。"""
+    if not path.exists():
+        return {}
+    with path.open("rb+") as fp:
+        data = fp.read()
+        if data and not data.endswith(b"\n"):
+            cut = data.rfind(b"\n") + 1
+            fp.truncate(cut)
+            data = data[:cut]
+            logger.warning("Truncated partial last line in %s", path)
+    done: Dict[str, Dict[str, Any]] = {}
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and record.get("answer") is not None and record.get("id"):
+            done[record["id"]] = record
+    return done
+
+
+class Progress:
+    """按固定间隔在 stderr 输出完成数、吞吐与预计剩余时间。"""
+
+    def __init__(self, total: int, skipped: int, interval: float) -> None:
+        self.total = total
+        self.skipped = skipped
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        now = time.perf_counter()
+        if self.interval and now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        processed = self.done + self.failed
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.skipped - processed)
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "answered": self.done,
+            "failed": self.failed,
+            "elapsed": round(elapsed, 3),
+            "rate": round(rate, 3),
+            "eta": round(remaining / rate, 1) if rate else None,
+        }
+
+    def report(self) -> None:
+        stats = self.snapshot()
+        processed = stats["skipped"] + stats["answered"] + stats["failed"]
+        eta = f"{stats['eta']:.0f}s" if stats["eta"] is not None else "-"
+        print(
+            f"[{processed}/{stats['total']}] answered={stats['answered']} failed={stats['failed']} "
+            f"{stats['rate']:.2f} q/s eta={eta}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+class MindMapSink:
+    """把回答写成脑图节点：全部挂在同一个根节点下，节点 id 由条目 key 决定，重跑时覆盖而不重复。"""
+
+    def __init__(self, registry: MindMapRegistry, map_id: str, root_title: str, source: str) -> None:
+        self.registry = registry
+        self.map_id = map_id
+        self.root_title = root_title
+        self.root_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"mindflow-bulk:{source}"))
+        self.source = source
+        self._pending: list[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self.written = 0
+
+    async def open(self) -> None:
+        if not self.registry.exists(self.map_id):
+            await self.registry.create(self.root_title, self.map_id)
+        async with self.registry.lease(self.map_id) as store:
+            if await store.node(self.root_id) is None:
+                await store.apply([{"op": "upsert", "node": self._node(self.root_id, None, self.root_title, None, 0)}])
+
+    async def add(self, item: Item, answer: str) -> None:
+        self._pending.append(self._item_node(item, answer))
+        if len(self._pending) >= MINDMAP_BATCH or time.monotonic() - self._last_flush >= MINDMAP_BATCH_SECONDS:
+            await self.flush()
+
+    async def replay(self, records: Iterator[Dict[str, Any]]) -> int:
+        """把结果文件中已完成的回答重新写入脑图。
+
+        结果记录先于脑图落盘，上次在两者之间中断时这些条目会被断点跳过、永远进不了脑图；
+        节点 id 固定，每次续跑都整体重写一遍即可补上，已存在的节点只是被覆盖。
+        """
+        replayed = 0
+        for record in records:
+            if not record.get("question"):
+                continue
+            item = Item(record.get("index", 0), record["id"], record["question"])
+            self._pending.append(self._item_node(item, record["answer"]))
+            replayed += 1
+            if len(self._pending) >= MINDMAP_BATCH:
+                await self.flush()
+        await self.flush()
+        return replayed
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        async with self.registry.lease(self.map_id) as store:
+            await store.apply([{"op": "upsert", "node": node} for node in batch])
+        self.written += len(batch)
+
+    def _item_node(self, item: Item, answer: str) -> Dict[str, Any]:
+        node_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"mindflow-bulk:{self.source}:{item.key}"))
+        return self._node(node_id, self.root_id, item.question, answer, item.index)
+
+    @staticmethod
+    def _node(node_id: str, parent_id: Optional[str], question: str, answer: Optional[str], index: int) -> Dict[str, Any]:
+        timestamp = datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+        position = {"x": 0, "y": 0} if parent_id is None else {"x": 320, "y": index * 120}
+        return {
+            "id": node_id,
+            "parentId": parent_id,
+            "question": question,
+            "answer": answer,
+            "position": position,
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+        }
+
+
+class ResultWriter:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = path.open("a", encoding="utf-8")
+        self._unsynced = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fp.flush()
+        self._unsynced += 1
+        if self._unsynced >= FSYNC_EVERY:
+            self.sync()
+
+    def sync(self) -> None:
+        os.fsync(self._fp.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        self.sync()
+        self._fp.close()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fmt = detect_format(args.input, args.format)
+    output: Path = args.output or args.input.with_name(args.input.name + ".answers.jsonl")
+    done = load_checkpoint(output) if args.resume else {}
+    if not args.resume and output.exists():
+        output.unlink()
+    # 先流式扫描一遍得到去重后的条目数，用于估算剩余时间
+    keys = {item.key for item in iter_questions(args.input, fmt)}
+    progress = Progress(len(keys), len(keys & done.keys()), args.progress_interval)
+
+    client = AIClient()
+    if client.settings.provider == "echo":
+        logger.warning("provider=echo: answers will be local echoes, configure backend/config.toml first")
+    await client.start()
+    registry: Optional[MindMapRegistry] = None
+    sink: Optional[MindMapSink] = None
+    if args.map:
+        registry = create_mindmap_registry()
+        sink = MindMapSink(registry, args.map, args.root_title or args.input.stem, args.input.name)
+        await sink.open()
+        replayed = await sink.replay(record for key, record in done.items() if key in keys)
+        if replayed:
+            logger.info("Re-applied %s checkpointed answers to mindmap %s", replayed, args.map)
+    writer = ResultWriter(output)
+    concurrency = args.concurrency or client.settings.generate_concurrency
+    queue: asyncio.Queue[Optional[Item]] = asyncio.Queue(maxsize=concurrency * 2)
+    cache = CachePolicy(read=not args.no_cache, write=not args.no_cache)
+    print(
+        f"bulk ask: {progress.total} questions ({progress.skipped} already done) -> {output}, "
+        f"concurrency={concurrency}",
+        file=sys.stderr,
+        flush=True,
+    )
+
+    async def feed() -> None:
+        for item in iter_questions(args.input, fmt):
+            if item.key in done:
+                continue
+            # 一个条目在结果文件中只写一次成功记录，输入里重复的问题只问一次
+            done[item.key] = {}
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work() -> None:
+        while (item := await queue.get()) is not None:
+            started = time.perf_counter()
+            record: Dict[str, Any] = {"id": item.key, "index": item.index, "question": item.question}
+            try:
+                answer = await client.ask(item.question, cache=cache, strict=True, priority=Priority.BACKGROUND)
+            except (ProviderError, SchedulerOverloaded) as exc:
+                record["error"] = str(exc) or exc.__class__.__name__
+            else:
+                record["answer"] = answer
+                if sink is not None:
+                    await sink.add(item, answer)
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            writer.write(record)
+            progress.record("answer" in record)
+
+    try:
+        await asyncio.gather(feed(), *(work() for _ in range(concurrency)))
+        if sink is not None:
+            await sink.flush()
+    finally:
+        writer.close()
+        if registry is not None:
+            await registry.close()
+            # 默认脑图不归注册表管理，需单独关闭，否则写入延迟期内的修改会随进程退出丢失
+            await shutdown_mindmap_store()
+        await client.aclose()
+    progress.report()
+    report = {**progress.snapshot(), "output": str(output)}
+    if sink is not None:
+        report["mindmap"] = {"map": args.map, "root": sink.root_id, "nodes": sink.written}
+    return report
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MindFlow bulk ask: answer a question list offline")
+    parser.add_argument("input", type=Path, help="问题列表：纯文本（每行一个）、JSONL（question / id 字段）或 CSV（question / id 列）")
+    parser.add_argument("--format", choices=("auto", "text", "jsonl", "csv"), default="auto", help="默认按扩展名判断")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSONL，兼作断点文件，默认 <input>.answers.jsonl")
+    parser.add_argument("--concurrency", type=int, default=None, help="并发调用数，默认取 generate_concurrency")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="忽略已有结果，从头开始")
+    parser.add_argument("--no-cache", action="store_true", help="不读写回答缓存")
+    parser.add_argument("--map", default=None, help=f"同时写入该脑图（不存在时新建），{DEFAULT_MAP_ID} 为默认脑图")
+    parser.add_argument("--root-title", default=None, help="脑图中承载本批问题的根节点标题，默认取输入文件名")
+    parser.add_argument("--progress-interval", type=float, default=2.0, help="进度输出间隔（秒），0 表示只在结束时输出")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    logging.basicConfig(level=logging.WARNING, format="[%(levelname)s] %(name)s: %(message)s")
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
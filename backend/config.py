@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import copy
+import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
 try:
     import tomllib  # Python 3.11+
@@ -20,7 +22,15 @@ DEFAULT_CONFIG = {
         "model": "gpt-4o-mini",
         "headers": {},
         "answer_style": "你是一名简明扼要的助理，请用 2-3 句话直接回答用户问题。",
-    }
+    },
+    "storage": {
+        "backend": "json",
+        "path": "",
+        "flush_delay": 1.0,
+        "maps_dir": "",
+        "max_maps": 64,
+        "cache_mb": 256,
+    },
 }
 
 
@@ -65,14 +75,32 @@ def _simple_toml_load(text: str) -> Dict[str, Any]:
     return data
 
 
+# 按 (mtime, size) 缓存解析结果，文件未变化时不再重复读取和解析
+_parsed: Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def config_fingerprint(path: Path = CONFIG_PATH) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def _load_from(path: Path) -> Dict[str, Any]:
-    if not path.exists():
+    fingerprint = config_fingerprint(path)
+    if fingerprint is None:
         return {}
-    if tomllib is not None:
-        with path.open("rb") as fp:
-            return tomllib.load(fp)
-    # Fallback：简单解析器，支持当前配置格式
-    return _simple_toml_load(path.read_text(encoding="utf-8"))
+    cached = _parsed.get(path)
+    if cached is None or cached[0] != fingerprint:
+        if tomllib is not None:
+            with path.open("rb") as fp:
+                data = tomllib.load(fp)
+        else:
+            # Fallback：简单解析器，支持当前配置格式
+            data = _simple_toml_load(path.read_text(encoding="utf-8"))
+        cached = _parsed[path] = (fingerprint, data)
+    return copy.deepcopy(cached[1])
 
 
 def load_ai_config() -> Dict[str, Any]:
@@ -81,3 +109,13 @@ def load_ai_config() -> Dict[str, Any]:
     if config:
         data.update(config)
     return data.get("ai", {})
+
+
+def load_storage_config() -> Dict[str, Any]:
+    data = dict(DEFAULT_CONFIG["storage"])
+    data.update(_load_from(CONFIG_PATH).get("storage", {}))
+    for key in data:
+        env_name = f"MINDFLOW_STORAGE_{key}".upper()
+        if env_name in os.environ:
+            data[key] = os.environ[env_name]
+    return data
@@ -1,17 +1,29 @@
+import asyncio
 import logging
 import os
 from logging.config import dictConfig
 from pathlib import Path
 
-from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 
 from routers import ask  # type: ignore[attr-defined]
 from routers import summary  # type: ignore[attr-defined]
 from routers import generate  # type: ignore[attr-defined]
 from routers import mindmap  # type: ignore[attr-defined]
+from routers import maps  # type: ignore[attr-defined]
+from routers import admin  # type: ignore[attr-defined]
+from routers import history  # type: ignore[attr-defined]
+from routers import metrics  # type: ignore[attr-defined]
+from services.ai_client import shutdown_ai_client, startup_ai_client
+from services.encoding import log_missing_codecs
+from services.metrics import MetricsMiddleware, monitor_event_loop
+from services.mindmap_registry import get_mindmap_registry, shutdown_mindmap_registry
+from services.mindmap_store import get_mindmap_store, shutdown_mindmap_store
+from services.scheduler import SchedulerOverloaded
+from services.speculation import shutdown_speculator
+from services.static_files import StaticSite
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -50,8 +62,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"]
 )
-
-routers = [ask.router, summary.router, generate.router, mindmap.router]
+app.add_middleware(MetricsMiddleware)
+
+routers = [
+    ask.router,
+    summary.router,
+    generate.router,
+    mindmap.router,
+    maps.router,
+    admin.router,
+    history.router,
+    metrics.router,
+]
 for router in routers:
     app.include_router(router)
 
@@ -62,14 +84,33 @@ for router in routers:
 app.include_router(api_router, prefix="/api")
 
 
+@app.exception_handler(SchedulerOverloaded)
+async def handle_overload(request: Request, exc: SchedulerOverloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
     logger.info("MindFlow API starting with routers: %s", [route.path for route in app.routes])
+    log_missing_codecs()
+    await startup_ai_client()
+    get_mindmap_store()
+    get_mindmap_registry()
+    app.state.loop_monitor = asyncio.create_task(monitor_event_loop())
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
     logger.info("MindFlow API stopping")
+    app.state.loop_monitor.cancel()
+    await shutdown_speculator()
+    await shutdown_ai_client()
+    await shutdown_mindmap_registry()
+    await shutdown_mindmap_store()
 
 
 @app.get("/health")
@@ -81,19 +122,19 @@ FRONTEND_DIST = Path(os.getenv("FRONTEND_DIST", Path(__file__).resolve().parents
 INDEX_FILE = FRONTEND_DIST / "index.html"
 
 if INDEX_FILE.exists():
-    assets_dir = FRONTEND_DIST / "assets"
-    if assets_dir.exists():
-        app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
+    # 启动时一次性建立文件索引，请求只查内存中的字典，不再逐个解析文件系统路径
+    static_site = StaticSite(FRONTEND_DIST)
+
+    @app.on_event("startup")
+    async def index_frontend() -> None:
+        await static_site.load()
 
     @app.get("/", include_in_schema=False)
-    async def serve_index():
-        return FileResponse(INDEX_FILE)
+    async def serve_index(request: Request):
+        return static_site.response("index.html", request)
 
     @app.get("/{full_path:path}", include_in_schema=False)
-    async def serve_spa(full_path: str):
+    async def serve_spa(full_path: str, request: Request):
         if full_path.startswith(("api", "openapi", "docs", "redoc", "health")):
             raise HTTPException(status_code=404)
-        candidate = (FRONTEND_DIST / full_path).resolve()
-        if candidate.is_file() and str(candidate).startswith(str(FRONTEND_DIST)):
-            return FileResponse(candidate)
-        return FileResponse(INDEX_FILE)
+        return static_site.response(full_path, request)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from services.ai_client import AIClient, get_ai_client
+from services.mindmap_registry import MindMapRegistry, get_mindmap_registry
+from services.speculation import Speculator, get_speculator
+
+logger = logging.getLogger("mindflow.admin")
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/cache", response_model=dict)
+async def cache_stats(client: AIClient = Depends(get_ai_client)) -> dict[str, Any]:
+    if client.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **client.cache.stats()}
+
+
+@router.delete("/cache", response_model=dict)
+async def clear_cache(client: AIClient = Depends(get_ai_client)) -> dict[str, Any]:
+    if client.cache is not None:
+        await client.cache.clear()
+        logger.info("Response cache cleared")
+    return {"status": "ok"}
+
+
+@router.get("/inflight", response_model=dict)
+async def inflight_stats(client: AIClient = Depends(get_ai_client)) -> dict[str, Any]:
+    return client.flights.stats()
+
+
+@router.get("/providers", response_model=list)
+async def provider_stats(client: AIClient = Depends(get_ai_client)) -> list[dict[str, Any]]:
+    return client.provider_stats()
+
+
+@router.get("/speculation", response_model=dict)
+async def speculation_stats(
+    client: AIClient = Depends(get_ai_client), speculator: Speculator = Depends(get_speculator)
+) -> dict[str, Any]:
+    return {"enabled": client.settings.speculation, **speculator.stats()}
+
+
+@router.get("/maps", response_model=dict)
+async def map_cache_stats(registry: MindMapRegistry = Depends(get_mindmap_registry)) -> dict[str, Any]:
+    return registry.stats()
+
+
+@router.post("/reload", response_model=dict)
+async def reload_config(client: AIClient = Depends(get_ai_client)) -> dict[str, Any]:
+    try:
+        changed = await client.reload()
+    except ValueError as exc:
+        # TOML 语法错误与字段校验失败都是 ValueError，保留当前配置
+        raise HTTPException(status_code=400, detail=f"配置无效：{exc}")
+    return {
+        "changed": changed,
+        "provider": client.settings.provider,
+        "model": client.settings.model,
+        "chain": [target.name for target in client.targets],
+    }
@@ -1,9 +1,17 @@
+import json
 import logging
+from typing import AsyncIterator, Callable
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from services.ai_client import AIClient, get_ai_client
+from services.ai_client import AIClient, ProviderError, get_ai_client
+from services.cache import CachePolicy, request_cache_policy
+from services.mindmap_registry import DEFAULT_MAP_ID, MindMapRegistry, get_mindmap_registry
+from services.mindmap_store import MindMapNotFound
+from services.speculation import Speculator, get_speculator
+from services.summarizer import estimate_tokens
 
 logger = logging.getLogger("mindflow.ask")
 router = APIRouter(prefix="/ask", tags=["ask"])
@@ -11,6 +19,8 @@ router = APIRouter(prefix="/ask", tags=["ask"])
 
 class AskRequest(BaseModel):
     question: str = Field(..., min_length=1, description="需要发送给模型的问题")
+    nodeId: str | None = Field(default=None, description="问题所在节点，提供时把祖先节点的问答作为对话上下文")
+    mapId: str | None = Field(default=None, description="节点所在脑图，省略时为默认脑图")
 
 
 class AskResponse(BaseModel):
@@ -18,8 +28,122 @@ class AskResponse(BaseModel):
 
 
 @router.post("", response_model=AskResponse)
-async def ask_ai(payload: AskRequest, client: AIClient = Depends(get_ai_client)):
-    logger.info("Received question len=%s", len(payload.question))
-    answer = await client.ask(payload.question)
+async def ask_ai(
+    payload: AskRequest,
+    request: Request,
+    client: AIClient = Depends(get_ai_client),
+    cache: CachePolicy = Depends(request_cache_policy),
+    speculator: Speculator = Depends(get_speculator),
+    registry: MindMapRegistry = Depends(get_mindmap_registry),
+):
+    context = await _node_context(payload, client, registry)
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return await _sse_response(payload, context, client, cache, speculator)
+    logger.info("Received question len=%s context_turns=%s", len(payload.question), len(context))
+    try:
+        answer = await client.ask(payload.question, context=context, cache=cache, strict=True)
+    except ProviderError as exc:
+        # provider 全部失败时仍返回本地回声，但不为它预生成子问题
+        return AskResponse(answer=client.fallback(payload.question, error=str(exc)))
     logger.info("Completed question")
+    _speculate(client, speculator, payload.question, answer)
     return AskResponse(answer=answer)
+
+
+@router.post("/stream")
+async def ask_ai_stream(
+    payload: AskRequest,
+    client: AIClient = Depends(get_ai_client),
+    cache: CachePolicy = Depends(request_cache_policy),
+    speculator: Speculator = Depends(get_speculator),
+    registry: MindMapRegistry = Depends(get_mindmap_registry),
+) -> StreamingResponse:
+    context = await _node_context(payload, client, registry)
+    return await _sse_response(payload, context, client, cache, speculator)
+
+
+async def _node_context(payload: AskRequest, client: AIClient, registry: MindMapRegistry) -> list[tuple[str, str]]:
+    budget = client.settings.context_tokens
+    if not payload.nodeId or not budget:
+        return []
+    try:
+        async with registry.lease(payload.mapId or DEFAULT_MAP_ID) as store:
+            chain = await store.ancestors(payload.nodeId)
+    except MindMapNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    if chain is None:
+        # 新建的节点可能尚未同步到服务端，此时按无上下文的问题处理
+        logger.info("Node %s not found, asking without context", payload.nodeId)
+        return []
+    return ancestor_context(chain, budget)
+
+
+def ancestor_context(chain: list[dict], budget: int) -> list[tuple[str, str]]:
+    """从父节点往上取已回答的祖先问答，直到 token 预算用完；结果只取决于祖先链，兄弟节点的前缀完全相同。"""
+    turns: list[tuple[str, str]] = []
+    used = 0
+    for node in reversed(chain):
+        question, answer = (node.get("question") or "").strip(), (node.get("answer") or "").strip()
+        if not question or not answer:
+            continue
+        used += estimate_tokens(question) + estimate_tokens(answer)
+        if used > budget:
+            break
+        turns.append((question, answer))
+    turns.reverse()
+    return turns
+
+
+def _speculate(client: AIClient, speculator: Speculator, question: str, answer: str) -> None:
+    # 用户多半会接着展开这个节点，提前以最低优先级生成子问题；未配置远程 provider 时生成注定失败，
+    # 关闭回答缓存时结果无处存放
+    if client.settings.speculation and client.targets and client.cache is not None and answer.strip():
+        speculator.submit(question, answer)
+
+
+async def _sse_response(
+    payload: AskRequest,
+    context: list[tuple[str, str]],
+    client: AIClient,
+    cache: CachePolicy,
+    speculator: Speculator,
+) -> StreamingResponse:
+    logger.info("Received streaming question len=%s context_turns=%s", len(payload.question), len(context))
+    stream = client.ask_stream(payload.question, context=context, cache=cache, strict=True)
+    on_complete: Callable[[str], None] = lambda answer: _speculate(client, speculator, payload.question, answer)
+    # 先取到第一段再返回响应头，排队失败等错误仍能以 429/503 返回
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except ProviderError as exc:
+        # 已结束的生成器再迭代会立即停止，回声作为唯一一段输出
+        first = client.fallback(payload.question, error=str(exc))
+        on_complete = lambda answer: None
+    return StreamingResponse(
+        _sse_events(first, stream, on_complete),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _sse_events(
+    first: str, stream: AsyncIterator[str], on_complete: Callable[[str], None]
+) -> AsyncIterator[str]:
+    parts = [first]
+    yield _sse("delta", {"delta": first})
+    try:
+        async for delta in stream:
+            parts.append(delta)
+            yield _sse("delta", {"delta": delta})
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Streaming question aborted: %s", exc)
+        yield _sse("error", {"detail": str(exc)})
+        return
+    logger.info("Completed streaming question")
+    on_complete("".join(parts))
+    yield _sse("done", {})
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-import re
-from fastapi import APIRouter, Depends
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from services.ai_client import AIClient, get_ai_client
+from services.ai_client import AIClient, ProviderError, get_ai_client
+from services.cache import CachePolicy, request_cache_policy
+from services.mindmap_registry import DEFAULT_MAP_ID, MindMapRegistry, get_mindmap_registry
+from services.mindmap_store import MindMapNotFound, MindMapStore
+from services.questions import generate_questions, stream_questions
+from services.speculation import Speculator, get_speculator
 
 logger = logging.getLogger("mindflow.generate")
 router = APIRouter(prefix="/generate", tags=["generate"])
@@ -26,53 +36,213 @@ class GenerateResponse(BaseModel):
     questions: list[GeneratedNode]
 
 
-PROMPT_TEMPLATE = (
-    "你是一位善于发散的思维导图助手，请根据当前节点生成 {count} 个子问题。"
-    "要求：\n"
-    "1. 子问题要与当前主题紧密相关，但角度互相不同。\n"
-    "2. 每个问题使用简洁的一句话，保持原语言。\n"
-    "3. 最终只输出 JSON 数组，每个元素形如 {{\"question\": \"...\"}}。"
-    "\n\n当前问题：{topic}\n当前回答：{answer}\n"
-)
+class BatchGenerateRequest(BaseModel):
+    nodeIds: list[str] = Field(..., min_length=1, max_length=200, description="需要扩展的节点 id（来自服务端脑图）")
+    mapId: str | None = Field(default=None, description="节点所在脑图，省略时为默认脑图")
+    depth: int = Field(1, ge=1, le=4, description="向下扩展的层数，新生成的子问题会继续扩展")
+    count: int = Field(2, ge=1, le=5, description="每个节点生成的子问题数量")
+    maxNodes: int = Field(50, ge=1, le=500, description="本次最多扩展（调用模型）的节点数")
+    concurrency: int | None = Field(default=None, ge=1, le=32, description="并发调用上限，默认取配置")
+    persist: bool = Field(False, description="是否把生成的节点直接写入服务端脑图")
 
 
 @router.post("", response_model=GenerateResponse)
-async def generate_children(payload: GenerateRequest, client: AIClient = Depends(get_ai_client)):
+async def generate_children(
+    payload: GenerateRequest,
+    request: Request,
+    client: AIClient = Depends(get_ai_client),
+    cache: CachePolicy = Depends(request_cache_policy),
+    speculator: Speculator = Depends(get_speculator),
+):
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return await _sse_response(payload, client, cache, speculator)
+    if cache.read:
+        speculated = await speculator.lookup(payload.topic, payload.answer, payload.count)
+        if speculated is not None:
+            logger.info("Served %s child questions from speculative generation", len(speculated))
+            return GenerateResponse(questions=[GeneratedNode(question=question) for question in speculated])
     logger.info("Generating %s child questions for '%s'", payload.count, payload.topic)
-    prompt = PROMPT_TEMPLATE.format(count=payload.count, topic=payload.topic, answer=payload.answer or "暂无")
-    raw = await client.ask(prompt)
-    logger.debug("Raw generation response: %s", raw)
-    questions: list[GeneratedNode] = []
-    try:
-        data = extract_json_block(raw)
-        parsed = json.loads(data)
-        if isinstance(parsed, list):
-            for item in parsed:
-                question = item.get("question")
-                if question:
-                    questions.append(GeneratedNode(question=question.strip()))
-    except Exception:  # noqa: BLE001
-        logger.warning("Failed to parse generation response, fallback to line split")
-        for line in raw.splitlines():
-            line = line.strip("-*  \t")
-            if line:
-                questions.append(GeneratedNode(question=line))
-    if len(questions) > payload.count:
-        questions = questions[:payload.count]
+    questions = await generate_questions(client, payload.topic, payload.answer, payload.count, cache=cache)
     logger.info("Generated %s child questions", len(questions))
-    return GenerateResponse(questions=questions)
+    return GenerateResponse(questions=[GeneratedNode(question=question) for question in questions])
+
+
+@router.post("/stream")
+async def generate_children_stream(
+    payload: GenerateRequest,
+    client: AIClient = Depends(get_ai_client),
+    cache: CachePolicy = Depends(request_cache_policy),
+    speculator: Speculator = Depends(get_speculator),
+) -> StreamingResponse:
+    return await _sse_response(payload, client, cache, speculator)
+
+
+async def _sse_response(
+    payload: GenerateRequest, client: AIClient, cache: CachePolicy, speculator: Speculator
+) -> StreamingResponse:
+    logger.info("Streaming %s child questions for '%s'", payload.count, payload.topic)
+    speculated = await speculator.lookup(payload.topic, payload.answer, payload.count) if cache.read else None
+    if speculated is not None:
+        questions = _replay(speculated)
+    else:
+        questions = stream_questions(client, payload.topic, payload.answer, payload.count, cache=cache)
+    # 先取到第一个子问题再返回响应头，排队失败等错误仍能以 429/503 返回
+    try:
+        first = await questions.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return StreamingResponse(
+        _sse_events(first, questions),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
+async def _replay(questions: list[str]) -> AsyncIterator[str]:
+    for question in questions:
+        yield question
 
-def extract_json_block(text: str) -> str:
-    data = text.strip()
-    block = _CODE_BLOCK_PATTERN.search(data)
-    if block:
-        data = block.group(1).strip()
-    if data.lower().startswith("json"):
-        parts = data.split("\n", 1)
-        if len(parts) > 1:
-            data = parts[1].strip()
-    return data
 
+async def _sse_events(
+    first: str | None, questions: AsyncIterator[str]
+) -> AsyncIterator[str]:
+    count = 0
+    try:
+        if first is not None:
+            count += 1
+            yield _sse("question", {"question": first})
+        async for question in questions:
+            count += 1
+            yield _sse("question", {"question": question})
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Streaming generation aborted: %s", exc)
+        yield _sse("error", {"detail": str(exc)})
+        return
+    finally:
+        await questions.aclose()
+    logger.info("Streamed %s child questions", count)
+    yield _sse("done", {"count": count})
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/batch")
+async def generate_batch(
+    payload: BatchGenerateRequest,
+    client: AIClient = Depends(get_ai_client),
+    registry: MindMapRegistry = Depends(get_mindmap_registry),
+    cache: CachePolicy = Depends(request_cache_policy),
+) -> StreamingResponse:
+    roots = []
+    try:
+        async with registry.lease(payload.mapId or DEFAULT_MAP_ID) as store:
+            for node_id in dict.fromkeys(payload.nodeIds):
+                node = await store.node(node_id)
+                if node is None:
+                    raise HTTPException(status_code=404, detail=f"节点不存在：{node_id}")
+                roots.append(node)
+    except MindMapNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    logger.info("Batch generating for %s nodes depth=%s count=%s", len(roots), payload.depth, payload.count)
+    return StreamingResponse(
+        _batch_events(payload, roots, client, registry, cache),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _batch_events(
+    payload: BatchGenerateRequest,
+    roots: list[dict[str, Any]],
+    client: AIClient,
+    registry: MindMapRegistry,
+    cache: CachePolicy,
+) -> AsyncIterator[str]:
+    # 响应在路由返回后才开始输出，写入脑图期间重新持有租约，避免脑图被淘汰
+    try:
+        async with registry.lease(payload.mapId or DEFAULT_MAP_ID) as store:
+            async for line in _expand_levels(payload, roots, client, store, cache):
+                yield line
+    except MindMapNotFound as exc:
+        # 读取节点之后脑图被删除
+        yield json.dumps({"error": str(exc)}, ensure_ascii=False) + "\n"
+
+
+async def _expand_levels(
+    payload: BatchGenerateRequest,
+    roots: list[dict[str, Any]],
+    client: AIClient,
+    store: MindMapStore,
+    cache: CachePolicy,
+) -> AsyncIterator[str]:
+    # 按层扩展：完成一个节点就立刻输出一行 NDJSON，并把新节点加入下一层待扩展队列
+    semaphore = asyncio.Semaphore(payload.concurrency or client.settings.generate_concurrency)
+    results: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+    tasks: set[asyncio.Task[None]] = set()
+    scheduled = 0
+    pending = 0
+
+    def schedule(node: dict[str, Any], level: int) -> None:
+        nonlocal scheduled, pending
+        if scheduled >= payload.maxNodes:
+            return
+        scheduled += 1
+        pending += 1
+        task = asyncio.create_task(_expand(node, level))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def _expand(node: dict[str, Any], level: int) -> None:
+        nonlocal pending
+        item: dict[str, Any] = {"nodeId": node["id"], "depth": level}
+        try:
+            async with semaphore:
+                questions = await generate_questions(
+                    client, node["question"], node.get("answer"), payload.count, cache=cache, strict=True
+                )
+            children = _child_nodes(node, questions)
+            if payload.persist and children:
+                await store.apply([{"op": "upsert", "node": child} for child in children])
+            item["children"] = children
+            if level < payload.depth:
+                for child in children:
+                    schedule(child, level + 1)
+        except ProviderError as exc:
+            item["error"] = f"模型调用失败：{exc}"
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Batch expansion failed for node %s", node["id"])
+            item["error"] = str(exc)
+        # 先登记子任务再递减计数，保证主循环看到 pending == 0 时已没有后续结果
+        pending -= 1
+        results.put_nowait(item)
+
+    for root in roots:
+        schedule(root, 1)
+    try:
+        while pending or not results.empty():
+            item = await results.get()
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+    finally:
+        for task in list(tasks):
+            task.cancel()
+    logger.info("Batch generation finished, expanded %s nodes", scheduled)
+
+
+def _child_nodes(parent: dict[str, Any], questions: list[str]) -> list[dict[str, Any]]:
+    timestamp = datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+    position = parent.get("position") or {"x": 0, "y": 0}
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "parentId": parent["id"],
+            "question": question,
+            "answer": None,
+            "position": {"x": position["x"] + 240, "y": position["y"] + index * 120},
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+        }
+        for index, question in enumerate(questions)
+    ]
 
-_CODE_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from services.ai_client import AIClient, get_ai_client
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+
+class HistoryItem(BaseModel):
+    id: int
+    question: str
+    answer: str
+    timestamp: str
+
+
+class HistoryPage(BaseModel):
+    items: list[HistoryItem] = Field(default_factory=list)
+    nextCursor: str | None = Field(default=None, description="传给下一次请求的 cursor，为空表示没有更多记录")
+
+
+def _epoch(value: datetime | None) -> float | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@router.get("", response_model=HistoryPage)
+async def search_history(
+    q: str = Query(default="", max_length=200, description="全文搜索问题与回答，多个词以空格分隔"),
+    since: datetime | None = Query(default=None, description="起始时间（含），ISO 8601，未带时区按 UTC"),
+    until: datetime | None = Query(default=None, description="结束时间（不含）"),
+    cursor: str | None = Query(default=None, description="上一页返回的 nextCursor"),
+    limit: int = Query(default=20, ge=1, le=100),
+    client: AIClient = Depends(get_ai_client),
+) -> HistoryPage:
+    index = client.history.index
+    if index is None:
+        raise HTTPException(status_code=404, detail="未启用历史索引（history_index = false）")
+    try:
+        before_id = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的 cursor：{cursor}")
+    # 刚提交的回答可能还在写入队列中，先落盘再查询
+    await client.history.flush()
+    items, next_cursor = await asyncio.to_thread(
+        index.search, q, since=_epoch(since), until=_epoch(until), before_id=before_id, limit=limit
+    )
+    return HistoryPage(
+        items=[HistoryItem(**item) for item in items],
+        nextCursor=str(next_cursor) if next_cursor is not None else None,
+    )
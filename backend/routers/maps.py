@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, WebSocket, status
+from pydantic import BaseModel, Field
+
+from routers.mindmap import (
+    FETCH_RESPONSES,
+    SAVE_OPENAPI,
+    MindMapPatch,
+    MindMapPayload,
+    apply_mindmap_patch,
+    read_mindmap,
+    serve_mindmap_sync,
+    write_mindmap,
+)
+from services.mindmap_registry import MindMapExists, MindMapRegistry, get_mindmap_registry
+from services.mindmap_store import MindMapNotFound, MindMapStore
+from services.mindmap_sync import close_sync_channel
+
+router = APIRouter(prefix="/maps", tags=["maps"])
+
+
+class MapInfo(BaseModel):
+    id: str
+    title: str
+    createdAt: str | None = None
+    loaded: bool = False
+
+
+class MapList(BaseModel):
+    maps: list[MapInfo]
+
+
+class CreateMapRequest(BaseModel):
+    title: str = Field("未命名脑图", max_length=200)
+    id: str | None = Field(default=None, description="可选的脑图 id，省略时自动生成")
+
+
+async def get_map_store(
+    map_id: str, registry: MindMapRegistry = Depends(get_mindmap_registry)
+) -> AsyncIterator[MindMapStore]:
+    # 请求期间持有租约，保证脑图不会在读写过程中被 LRU 淘汰
+    async with AsyncExitStack() as stack:
+        try:
+            store = await stack.enter_async_context(registry.lease(map_id))
+        except MindMapNotFound as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+        yield store
+
+
+@router.get("", response_model=MapList)
+async def list_maps(registry: MindMapRegistry = Depends(get_mindmap_registry)) -> MapList:
+    return MapList(maps=[MapInfo(**meta) for meta in registry.list_maps()])
+
+
+@router.post("", response_model=MapInfo, status_code=201)
+async def create_map(payload: CreateMapRequest, registry: MindMapRegistry = Depends(get_mindmap_registry)) -> MapInfo:
+    try:
+        meta = await registry.create(payload.title, payload.id)
+    except MindMapExists as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return MapInfo(**meta)
+
+
+@router.delete("/{map_id}", status_code=204)
+async def delete_map(map_id: str, registry: MindMapRegistry = Depends(get_mindmap_registry)) -> Response:
+    try:
+        # 推送通道的连接会一直持有租约，先通知订阅者断开
+        await registry.delete(map_id, release=lambda store: close_sync_channel(store, {"type": "deleted", "id": map_id}))
+    except MindMapNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return Response(status_code=204)
+
+
+@router.get("/{map_id}", response_model=MindMapPayload, responses=FETCH_RESPONSES)
+async def fetch_map(request: Request, store: MindMapStore = Depends(get_map_store)) -> Response:
+    return await read_mindmap(request, store)
+
+
+@router.post("/{map_id}", response_model=dict, openapi_extra=SAVE_OPENAPI)
+async def save_map(
+    request: Request,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    store: MindMapStore = Depends(get_map_store),
+) -> dict[str, Any]:
+    return await write_mindmap(request, response, if_match, store)
+
+
+@router.patch("/{map_id}", response_model=dict)
+async def patch_map(
+    payload: MindMapPatch,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    store: MindMapStore = Depends(get_map_store),
+) -> dict[str, Any]:
+    return await apply_mindmap_patch(payload, response, if_match, store)
+
+
+@router.websocket("/{map_id}/ws")
+async def sync_map(
+    websocket: WebSocket, map_id: str, registry: MindMapRegistry = Depends(get_mindmap_registry)
+) -> None:
+    # 连接期间一直持有租约，订阅中的脑图不会被淘汰
+    async with AsyncExitStack() as stack:
+        try:
+            store = await stack.enter_async_context(registry.lease(map_id))
+        except MindMapNotFound:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await serve_mindmap_sync(websocket, store)
@@ -1,17 +1,36 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
-from typing import Any
+import asyncio
+import logging
+import uuid
+import weakref
+from typing import Annotated, Any, Literal, Union
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError
 
-DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "mindmap.json"
-DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-if not DATA_PATH.exists():
-    DATA_PATH.write_text("[]", encoding="utf-8")
+from services.encoding import EncodedBody, dumps_json, etag_matches, negotiate
+from services.mindmap_wire import (
+    FLAT_FORMAT,
+    FLAT_JSON,
+    FLAT_MSGPACK,
+    TREE_JSON,
+    build_tree,
+    decode,
+    encode,
+    negotiate_media_type,
+)
+from services.mindmap_store import (
+    MindMapConflict,
+    MindMapCorrupted,
+    MindMapOpError,
+    MindMapStore,
+    get_mindmap_store,
+)
+from services.mindmap_sync import Subscriber, SyncChannel, current_origin, get_sync_channel
 
+logger = logging.getLogger("mindflow.mindmap")
 router = APIRouter(prefix="/mindmap", tags=["mindmap"])
 
 
@@ -20,34 +39,322 @@ class NodePosition(BaseModel):
     y: float
 
 
-class MindNode(BaseModel):
+class NodeData(BaseModel):
     id: str
     parentId: str | None = None
     question: str
     answer: str | None = None
-    children: list["MindNode"] = Field(default_factory=list)
     position: NodePosition
     createdAt: str
     updatedAt: str
 
 
+class MindNode(NodeData):
+    children: list["MindNode"] = Field(default_factory=list)
+
+
 MindNode.model_rebuild()
 
 
 class MindMapPayload(BaseModel):
     nodes: list[MindNode] = Field(default_factory=list)
+    version: int = Field(default=0, description="当前脑图版本，用于乐观并发控制")
+
+
+class FlatMindMap(BaseModel):
+    """扁平列式表示：各列等长，parent 为父节点下标（根为 -1），父节点必须排在子节点之前。"""
+
+    format: Literal["mindflow-flat/1"] = FLAT_FORMAT
+    version: int = 0
+    id: list[str]
+    parent: list[int]
+    question: list[str]
+    answer: list[str | None]
+    x: list[float]
+    y: list[float]
+    createdAt: list[str]
+    updatedAt: list[str]
+
+
+class UpsertNodeOp(BaseModel):
+    op: Literal["upsert"]
+    node: NodeData
 
 
-@router.get("", response_model=MindMapPayload)
-async def fetch_mindmap() -> MindMapPayload:
+class MoveNodeOp(BaseModel):
+    op: Literal["move"]
+    id: str
+    parentId: str | None = None
+    index: int | None = Field(default=None, ge=0, description="在新父节点 children 中的位置，默认追加到末尾")
+
+
+class DeleteNodeOp(BaseModel):
+    op: Literal["delete"]
+    id: str
+
+
+class UpdatePositionOp(BaseModel):
+    op: Literal["position"]
+    id: str
+    position: NodePosition
+    updatedAt: str | None = None
+
+
+MindMapOperation = Annotated[
+    Union[UpsertNodeOp, MoveNodeOp, DeleteNodeOp, UpdatePositionOp],
+    Field(discriminator="op"),
+]
+
+
+class MindMapPatch(BaseModel):
+    baseVersion: int | None = Field(default=None, description="客户端所基于的版本，不匹配时返回 409")
+    ops: list[MindMapOperation] = Field(..., min_length=1)
+
+
+def _dump_ops(ops: list[Any]) -> list[dict[str, Any]]:
+    # 只传客户端实际给出的字段：upsert 省略 parentId 表示保持原父节点，而不是移到根
+    return [op.model_dump(exclude_unset=True) for op in ops]
+
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _expected_version(if_match: str | None, body_version: int | None = None) -> int | None:
+    if body_version is not None:
+        return body_version
+    if not if_match or if_match.strip() == "*":
+        return None
     try:
-        data = json.loads(DATA_PATH.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无法解析 If-Match：{if_match}")
+
+
+# 每个 store 按表示格式缓存最新版本的序列化结果（及其压缩版本），版本变化后首次请求时重建
+_encoded: "weakref.WeakKeyDictionary[MindMapStore, dict[str, EncodedBody]]" = weakref.WeakKeyDictionary()
+
+# 浏览器每次都带 If-None-Match 回源校验，脑图未变化时只返回 304
+REVALIDATE = {"Cache-Control": "no-cache"}
+
+
+# 保存接口直接读取请求体以支持多种表示，请求体文档手动声明
+SAVE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            TREE_JSON: {"schema": {"$ref": "#/components/schemas/MindMapPayload"}},
+            FLAT_JSON: {"schema": FlatMindMap.model_json_schema()},
+            FLAT_MSGPACK: {},
+        },
+    }
+}
+FETCH_RESPONSES: dict[int | str, dict[str, Any]] = {
+    200: {"content": {FLAT_JSON: {"schema": FlatMindMap.model_json_schema()}, FLAT_MSGPACK: {}}}
+}
+
+
+def _representation_etag(version: int, media_type: str) -> str:
+    # 同一版本的不同表示字节不同，扁平格式使用弱 ETag；If-None-Match 弱比较时仍按版本命中
+    return _etag(version) if media_type == TREE_JSON else f"W/{_etag(version)}"
+
+
+async def _encoded_snapshot(store: MindMapStore, version: int, media_type: str) -> EncodedBody:
+    cache = _encoded.setdefault(store, {})
+    cached = cache.get(media_type)
+    if cached is not None and cached.etag == _representation_etag(version, media_type):
+        return cached
+    version, raw = await store.snapshot_encoded(lambda current, roots: encode(media_type, current, roots))
+    etag = _representation_etag(version, media_type)
+    # 版本变化后其他格式的缓存一并作废
+    for other in [key for key, body in cache.items() if body.etag.removeprefix("W/") != _etag(version)]:
+        del cache[other]
+    encoded = cache[media_type] = EncodedBody(raw, etag, media_type)
+    return encoded
+
+
+@router.get("", response_model=MindMapPayload, responses=FETCH_RESPONSES)
+async def fetch_mindmap(request: Request, store: MindMapStore = Depends(get_mindmap_store)) -> Response:
+    return await read_mindmap(request, store)
+
+
+async def read_mindmap(request: Request, store: MindMapStore) -> Response:
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    headers = {**REVALIDATE, "Vary": "Accept, Accept-Encoding"}
+    try:
+        version = await store.current_version()
+        etag = _representation_etag(version, media_type)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, **headers})
+        encoded = await _encoded_snapshot(store, version, media_type)
+    except MindMapCorrupted:
         raise HTTPException(status_code=500, detail="mindmap 数据损坏，请手动修复 backend/data/mindmap.json")
-    return MindMapPayload(nodes=data)
+    coding = negotiate(request.headers.get("accept-encoding"), len(encoded.raw))
+    if not encoded.has_variant(coding):
+        # 大图压缩耗时较长，放到线程里；同一版本只压缩一次
+        await asyncio.to_thread(encoded.variant, coding)
+    return encoded.response(coding, headers)
+
+
+def _parse_save_body(content_type: str, body: bytes) -> list[dict[str, Any]]:
+    media_type = content_type.partition(";")[0].strip().lower()
+    try:
+        if media_type in (FLAT_JSON, FLAT_MSGPACK):
+            flat = FlatMindMap.model_validate(decode(media_type, body))
+            return build_tree(flat.model_dump())
+        # 其余内容类型按原来的嵌套 JSON 处理，兼容旧客户端
+        payload = MindMapPayload.model_validate_json(body)
+        return [node.model_dump() for node in payload.nodes]
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors(include_url=False))
+    except LookupError as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"无法解析脑图数据：{exc}")
+
+
+@router.post("", response_model=dict, openapi_extra=SAVE_OPENAPI)
+async def save_mindmap(
+    request: Request,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    store: MindMapStore = Depends(get_mindmap_store),
+) -> dict[str, Any]:
+    return await write_mindmap(request, response, if_match, store)
+
+
+async def write_mindmap(
+    request: Request, response: Response, if_match: str | None, store: MindMapStore
+) -> dict[str, Any]:
+    nodes = _parse_save_body(request.headers.get("content-type", TREE_JSON), await request.body())
+    try:
+        version = await store.replace(nodes, _expected_version(if_match))
+    except MindMapConflict as exc:
+        raise HTTPException(status_code=409, detail={"message": str(exc), "version": exc.current})
+    response.headers["ETag"] = _etag(version)
+    return {"status": "ok", "version": version}
+
+
+@router.patch("", response_model=dict)
+async def patch_mindmap(
+    payload: MindMapPatch,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    store: MindMapStore = Depends(get_mindmap_store),
+) -> dict[str, Any]:
+    return await apply_mindmap_patch(payload, response, if_match, store)
+
+
+async def apply_mindmap_patch(
+    payload: MindMapPatch, response: Response, if_match: str | None, store: MindMapStore
+) -> dict[str, Any]:
+    expected = _expected_version(if_match, payload.baseVersion)
+    try:
+        version = await store.apply(_dump_ops(payload.ops), expected)
+    except MindMapConflict as exc:
+        raise HTTPException(status_code=409, detail={"message": str(exc), "version": exc.current})
+    except MindMapOpError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    response.headers["ETag"] = _etag(version)
+    return {"status": "ok", "version": version}
+
+
+@router.websocket("/ws")
+async def sync_mindmap(websocket: WebSocket, store: MindMapStore = Depends(get_mindmap_store)) -> None:
+    await serve_mindmap_sync(websocket, store)
+
+
+async def serve_mindmap_sync(websocket: WebSocket, store: MindMapStore) -> None:
+    """推送通道：连接时可带 ?since=<版本> 续传，之后服务端推送 ops/reset 事件，客户端发送 ops/position 消息。"""
+    channel = await get_sync_channel(store)
+    try:
+        since: int | None = int(websocket.query_params["since"])
+    except (KeyError, ValueError):
+        since = None
+    client_id = websocket.query_params.get("client") or uuid.uuid4().hex[:12]
+    await websocket.accept()
+    subscriber, replay = channel.subscribe(client_id, since)
+    tasks: list[asyncio.Task[None]] = []
+    try:
+        for message in replay:
+            await websocket.send_text(message)
+        tasks = [
+            asyncio.create_task(_receive_sync(websocket, store, channel, subscriber)),
+            asyncio.create_task(_send_sync(websocket, subscriber)),
+        ]
+        # 任一方向结束（客户端断开、消费过慢被断开、发送失败）即关闭整个连接
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("Mindmap sync connection %s failed: %r", client_id, task.exception())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        channel.unsubscribe(subscriber)
+        # 断开前提交尚在合并窗口内的位置更新
+        await channel.flush_positions(store)
+
+
+async def _send_sync(websocket: WebSocket, subscriber: Subscriber) -> None:
+    while True:
+        message = await subscriber.queue.get()
+        if subscriber.overflowed:
+            # 消费过慢：断开后客户端带版本号重连即可补齐
+            await websocket.close(code=1013)
+            return
+        await websocket.send_text(message)
+        if subscriber.closing and subscriber.queue.empty():
+            await websocket.close()
+            return
+
+
+async def _receive_sync(websocket: WebSocket, store: MindMapStore, channel: SyncChannel, subscriber: Subscriber) -> None:
+    current_origin.set(subscriber.client_id)
+    while True:
+        try:
+            message = await websocket.receive_json()
+        except WebSocketDisconnect:
+            return
+        except ValueError:
+            channel.send(subscriber, _sync_error(None, 400, "消息不是合法的 JSON"))
+            continue
+        if not isinstance(message, dict):
+            channel.send(subscriber, _sync_error(None, 400, "消息必须是 JSON 对象"))
+            continue
+        kind, request_id = message.get("type"), message.get("id")
+        if kind == "ping":
+            channel.send(subscriber, dumps_json({"type": "pong"}).decode("utf-8"))
+        elif kind == "position":
+            try:
+                op = UpdatePositionOp.model_validate({**message, "op": "position"})
+            except ValidationError as exc:
+                channel.send(subscriber, _sync_error(request_id, 422, exc.errors(include_url=False)))
+                continue
+            channel.queue_position(store, op.model_dump(exclude_none=True))
+        elif kind == "ops":
+            channel.send(subscriber, await _apply_sync_ops(store, channel, message))
+        else:
+            channel.send(subscriber, _sync_error(request_id, 400, f"未知消息类型：{kind}"))
+
+
+async def _apply_sync_ops(store: MindMapStore, channel: SyncChannel, message: dict[str, Any]) -> str:
+    request_id = message.get("id")
+    try:
+        patch = MindMapPatch.model_validate({"ops": message.get("ops"), "baseVersion": message.get("baseVersion")})
+    except ValidationError as exc:
+        return _sync_error(request_id, 422, exc.errors(include_url=False))
+    # 先提交排在前面的位置更新，保证与客户端发送顺序一致
+    await channel.flush_positions(store)
+    try:
+        version = await store.apply(_dump_ops(patch.ops), patch.baseVersion)
+    except MindMapConflict as exc:
+        return _sync_error(request_id, 409, str(exc), version=exc.current)
+    except MindMapOpError as exc:
+        return _sync_error(request_id, 422, str(exc))
+    return dumps_json({"type": "ack", "id": request_id, "version": version}).decode("utf-8")
 
 
-@router.post("", response_model=dict)
-async def save_mindmap(payload: MindMapPayload) -> dict[str, Any]:
-    DATA_PATH.write_text(json.dumps([node.model_dump() for node in payload.nodes], ensure_ascii=False, indent=2), encoding="utf-8")
-    return {"status": "ok"}
+def _sync_error(request_id: Any, status: int, detail: Any, **extra: Any) -> str:
+    return dumps_json({"type": "error", "id": request_id, "status": status, "detail": detail, **extra}).decode("utf-8")
@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import logging
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 
-from services.ai_client import AIClient, get_ai_client
+from services.ai_client import AIClient, ProviderError, get_ai_client
+from services.cache import CachePolicy, request_cache_policy
+from services.mindmap_registry import DEFAULT_MAP_ID, MindMapRegistry, get_mindmap_registry
+from services.mindmap_store import MindMapNotFound
+from services.scheduler import Priority
+from services.summarizer import TreeSummarizer, get_tree_summarizer
 
 logger = logging.getLogger("mindflow.summary")
 router = APIRouter(prefix="/summary", tags=["summary"])
@@ -26,6 +31,19 @@ class SummaryResponse(BaseModel):
   summary: str
 
 
+class TreeSummaryRequest(BaseModel):
+  nodeId: str = Field(..., description="需要汇总的节点 id，从服务端脑图读取其子树")
+  mapId: str | None = Field(default=None, description="节点所在脑图，省略时为默认脑图")
+  chunkTokens: int | None = Field(default=None, ge=200, description="单次调用的内容 token 预算，默认取配置")
+  maxConcurrency: int | None = Field(default=None, ge=1, le=32, description="并发调用上限，默认取配置")
+
+
+class TreeSummaryResponse(SummaryResponse):
+  chunks: int = Field(..., description="需要模型处理的分块数量")
+  modelCalls: int = Field(..., description="实际调用模型的次数")
+  cacheHits: int = Field(..., description="命中子树摘要缓存的次数")
+
+
 def build_prompt(payload: SummaryRequest) -> str:
   lines: list[str] = []
   for entry in payload.entries:
@@ -42,9 +60,42 @@ def build_prompt(payload: SummaryRequest) -> str:
 
 
 @router.post("", response_model=SummaryResponse)
-async def summarize_nodes(payload: SummaryRequest, client: AIClient = Depends(get_ai_client)):
+async def summarize_nodes(
+    payload: SummaryRequest,
+    client: AIClient = Depends(get_ai_client),
+    cache: CachePolicy = Depends(request_cache_policy),
+):
     logger.info("Summarizing topic='%s' entries=%s", payload.topic, len(payload.entries))
     prompt = build_prompt(payload)
-    answer = await client.ask(prompt)
+    answer = await client.ask(prompt, cache=cache, priority=Priority.SUMMARY)
     logger.info("Summary generated for topic='%s'", payload.topic)
     return SummaryResponse(summary=answer)
+
+
+@router.post("/tree", response_model=TreeSummaryResponse)
+async def summarize_subtree(
+    payload: TreeSummaryRequest,
+    client: AIClient = Depends(get_ai_client),
+    registry: MindMapRegistry = Depends(get_mindmap_registry),
+    summarizer: TreeSummarizer = Depends(get_tree_summarizer),
+    cache: CachePolicy = Depends(request_cache_policy),
+):
+    try:
+        async with registry.lease(payload.mapId or DEFAULT_MAP_ID) as store:
+            root = await store.subtree(payload.nodeId)
+    except MindMapNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    if root is None:
+        raise HTTPException(status_code=404, detail=f"节点不存在：{payload.nodeId}")
+    logger.info("Summarizing subtree node=%s", payload.nodeId)
+    try:
+        summary, run = await summarizer.summarize(
+            client,
+            root,
+            chunk_tokens=payload.chunkTokens or client.settings.summary_chunk_tokens,
+            concurrency=payload.maxConcurrency or client.settings.summary_concurrency,
+            cache=cache,
+        )
+    except ProviderError as exc:
+        raise HTTPException(status_code=502, detail=f"模型调用失败：{exc}")
+    return TreeSummaryResponse(summary=summary, chunks=run.chunks, modelCalls=run.model_calls, cacheHits=run.cache_hits)
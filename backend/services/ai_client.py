@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import signal
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 import os
-from typing import Any, Dict, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Sequence
 
 import httpx
 import logging
@@ -12,9 +17,23 @@ from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 try:
-    from backend.config import load_ai_config
+    from backend.config import CONFIG_PATH, config_fingerprint, load_ai_config
+    from backend.services.cache import CachePolicy, ResponseCache
+    from backend.services.history import HistoryStore
+    from backend.services.history_index import HistoryIndex
+    from backend.services import metrics
+    from backend.services.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+    from backend.services.scheduler import Priority, ProviderScheduler, SchedulerOverloaded
+    from backend.services.singleflight import SingleFlight
 except ModuleNotFoundError:  # running from backend/ as working dir
-    from config import load_ai_config  # type: ignore
+    from config import CONFIG_PATH, config_fingerprint, load_ai_config  # type: ignore
+    from services.cache import CachePolicy, ResponseCache  # type: ignore
+    from services.history import HistoryStore  # type: ignore
+    from services.history_index import HistoryIndex  # type: ignore
+    from services import metrics  # type: ignore
+    from services.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy  # type: ignore
+    from services.scheduler import Priority, ProviderScheduler, SchedulerOverloaded  # type: ignore
+    from services.singleflight import SingleFlight  # type: ignore
 
 
 class AISettings(BaseSettings):
@@ -26,87 +45,514 @@ class AISettings(BaseSettings):
     api_key: Optional[str] = Field(default=None, description="接口密钥")
     model: str = Field(default="gpt-4o-mini", description="模型名称，openai 模式必填")
     headers: Dict[str, str] = Field(default_factory=dict, description="附加 HTTP 请求头")
-    timeout: float = Field(default=30.0)
-    history_path: Path = Field(default=Path(__file__).resolve().parents[1] / "data" / "history.json")
+    timeout: float = Field(default=30.0, description="读取超时（秒），本地模型首次加载较慢时可调大")
+    connect_timeout: float = Field(default=3.0, description="建立连接的超时（秒），上游宕机时尽快失败")
+    fallbacks: List[str] = Field(
+        default_factory=list,
+        description="主 provider 失败或熔断时依次尝试的备用 provider，全部失败后回退到 echo",
+    )
+    providers: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description="备用 provider 的 base_url / api_key / model / headers / timeout 等配置",
+    )
+    retry_attempts: int = Field(default=3, ge=1, description="单个 provider 遇到超时、429、5xx 时的最多尝试次数")
+    retry_base_delay: float = Field(default=0.2, ge=0, description="指数退避的基础间隔（秒），实际间隔带随机抖动")
+    retry_max_delay: float = Field(default=2.0, ge=0, description="单次退避的最长间隔（秒）")
+    breaker_failures: int = Field(default=5, ge=1, description="连续失败多少次后熔断")
+    breaker_reset: float = Field(default=15.0, gt=0, description="熔断后多久放行一次探测请求（秒）")
+    config_watch_interval: float = Field(default=2.0, ge=0, description="检查 config.toml 是否变化的间隔（秒），0 表示不监听")
+    history_path: Path = Field(default=Path(__file__).resolve().parents[1] / "data" / "history.jsonl")
+    summary_chunk_tokens: int = Field(default=2000, ge=200, description="分层汇总时单次调用的内容 token 预算")
+    summary_concurrency: int = Field(default=4, ge=1, description="分层汇总时并发调用模型的上限")
+    generate_concurrency: int = Field(default=4, ge=1, description="批量生成子问题时并发调用模型的上限")
+    context_tokens: int = Field(
+        default=1500, ge=0, description="按节点提问时带上的祖先问答 token 预算，超出时从根部开始舍弃，0 表示不带"
+    )
+    docker_slots: int = Field(
+        default=0,
+        ge=0,
+        description="llama.cpp runner 的 slot 数；大于 0 时按对话前缀固定 id_slot，同一分支的问题落在同一 slot 复用 KV 缓存",
+    )
+    structured_output: bool = Field(
+        default=True,
+        description="生成子问题时要求模型按 JSON Schema 输出（OpenAI response_format / llama.cpp json_schema），不支持的模型可关闭",
+    )
+    speculation: bool = Field(default=False, description="回答问题后在后台以最低优先级预生成子问题，展开节点时直接返回")
+    speculation_count: int = Field(default=2, ge=1, le=5, description="预生成的子问题数量，展开时请求数量不超过它才能命中")
+    speculation_queue: int = Field(default=32, ge=1, description="预生成任务的排队上限，队列满时丢弃新任务")
+    concurrency: Dict[str, int] = Field(
+        default_factory=dict,
+        description="按 provider 覆盖同时在途的模型调用数，超出部分按优先级排队",
+    )
+    max_queue: int = Field(default=64, ge=0, description="每个 provider 的最大排队请求数，队列满时返回 429")
+    queue_timeout: float = Field(default=20.0, gt=0, description="请求最长排队时间（秒），超时返回 503")
+    history_fsync: Literal["batch", "interval", "never"] = Field(default="batch", description="历史记录 fsync 策略")
+    history_fsync_interval: float = Field(default=1.0, description="interval 策略下两次 fsync 的最小间隔（秒）")
+    history_batch_size: int = Field(default=256, ge=1, description="后台写入单批最多记录数")
+    history_max_bytes: int = Field(default=16 * 1024 * 1024, description="单个历史文件超过该大小后轮转，0 表示不轮转")
+    history_keep_segments: int = Field(default=10, description="保留的历史分段数量，0 表示全部保留")
+    history_index: bool = Field(default=True, description="是否为问答历史维护 SQLite 全文索引（GET /api/history）")
+    history_index_path: Optional[Path] = Field(default=None, description="全文索引路径，默认与历史文件同目录")
     answer_style: str = Field(default="你是一名简明扼要的助理，请用 2-3 句话直接回答用户问题。")
+    cache_enabled: bool = Field(default=True, description="是否缓存相同提示词的模型回答")
+    cache_max_bytes: int = Field(default=32 * 1024 * 1024, description="内存缓存容量上限（字节）")
+    cache_ttl: float = Field(default=3600.0, description="缓存有效期（秒）")
+    cache_path: Optional[Path] = Field(default=None, description="SQLite 磁盘缓存路径，留空则仅使用内存缓存")
+    http2: bool = Field(default=False, description="启用 HTTP/2（需安装 h2）")
+    pools: Dict[str, Dict[str, float]] = Field(
+        default_factory=dict,
+        description="按 provider 覆盖连接池：max_connections / max_keepalive_connections / keepalive_expiry",
+    )
 
     model_config = SettingsConfigDict(env_prefix="MINDFLOW_", extra="allow")
 
 
 logger = logging.getLogger(__name__)
 
+# 本地 llama.cpp runner 通常只有少量 slot，远程 API 则可承受更多并发连接
+PROVIDER_POOL_DEFAULTS: Dict[str, Dict[str, float]] = {
+    "docker": {"max_connections": 8, "max_keepalive_connections": 8, "keepalive_expiry": 60.0},
+    "http": {"max_connections": 16, "max_keepalive_connections": 8, "keepalive_expiry": 30.0},
+    "openai": {"max_connections": 64, "max_keepalive_connections": 20, "keepalive_expiry": 30.0},
+}
+
+# 备用 provider 需要单独配置的连接字段，其余（超时、回答风格等）沿用 [ai]
+TARGET_FIELDS = ("base_url", "api_key", "model", "headers")
+
+# 单 GPU 的 llama.cpp runner 并发过高只会让所有请求一起变慢
+PROVIDER_CONCURRENCY_DEFAULTS: Dict[str, int] = {"docker": 2, "http": 8, "openai": 16, "echo": 64}
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """一次模型调用的对话：system 风格说明、祖先节点的问答，以及本次问题。
+
+    前两部分只取决于配置和所在分支，同一分支下的兄弟问题共享逐字节相同的前缀，
+    本地 runner 可以复用已计算的 KV 缓存，只需处理最后一条问题。
+    """
+
+    question: str
+    system: str = ""
+    context: tuple[tuple[str, str], ...] = ()
+
+    def text(self) -> str:
+        # 拼成单条文本，用于缓存 key、历史记录以及只接受单个问题的自定义 http 服务
+        parts = [self.system] if self.system else []
+        parts.extend(f"问题：{question}\n回答：{answer}" for question, answer in self.context)
+        if not parts:
+            return self.question
+        parts.append(f"问题：{self.question}")
+        return "\n\n".join(parts)
+
+    def messages(self) -> list[Dict[str, str]]:
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        for question, answer in self.context:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": self.question})
+        return messages
+
+    def prefix_hash(self) -> int:
+        prefix = json.dumps([self.system, self.context], ensure_ascii=False)
+        return int.from_bytes(hashlib.sha256(prefix.encode("utf-8")).digest()[:8], "big")
+
+
+@dataclass(frozen=True)
+class JsonSchema:
+    """要求模型输出符合该 JSON Schema 的结构化结果。"""
+
+    name: str
+    schema: Dict[str, Any]
+
+    def response_format(self) -> Dict[str, Any]:
+        # Chat Completions 与 llama.cpp 的 OpenAI 兼容接口使用同一写法，后者据此生成约束语法
+        return {"type": "json_schema", "json_schema": {"name": self.name, "schema": self.schema, "strict": True}}
+
+    def text_format(self) -> Dict[str, Any]:
+        # Responses API 的写法
+        return {"format": {"type": "json_schema", "name": self.name, "schema": self.schema, "strict": True}}
+
+
+@dataclass
+class ProviderTarget:
+    name: str
+    settings: AISettings
+    scheduler: ProviderScheduler
+    breaker: CircuitBreaker
+    http: httpx.AsyncClient | None = field(default=None, repr=False)
+
+    def idle(self) -> bool:
+        return self.scheduler.active == 0 and self.scheduler.queue_length() == 0
+
 
 class AIClient:
     def __init__(self, settings: AISettings | None = None) -> None:
         config_overrides = load_ai_config()
         self.settings = settings or self._build_settings(config_overrides)
-        self.history_path = self.settings.history_path
-        self.history_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.history_path.exists():
-            self.history_path.write_text("[]", encoding="utf-8")
-
-    async def ask(self, question: str) -> str:
-        styled_question = self._apply_answer_style(question)
-        provider = self.settings.provider
-        logger.info("Dispatch question to provider=%s", provider)
-        try:
-            if provider == "http" and self.settings.base_url:
-                return await self._request_custom_http(styled_question)
-            if provider == "openai":
-                return await self._request_openai(styled_question)
-            if provider == "docker":
-                return await self._request_docker_runner(styled_question)
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Provider %s failed: %s", provider, exc)
-            return self._fallback(question, error=str(exc))
-        logger.warning("Unknown provider '%s', falling back to echo", provider)
-        return self._fallback(question)
-
-    async def _request_custom_http(self, question: str) -> str:
-        assert self.settings.base_url, "base_url must be configured for http provider"
-        logger.debug("Calling custom HTTP endpoint %s", self.settings.base_url)
-        async with httpx.AsyncClient(timeout=self.settings.timeout) as client:
-            response = await client.post(
-                self.settings.base_url,
-                json={"question": question},
-                headers=self.settings.headers or None,
+        self.history = HistoryStore(
+            self.settings.history_path,
+            fsync=self.settings.history_fsync,
+            fsync_interval=self.settings.history_fsync_interval,
+            batch_size=self.settings.history_batch_size,
+            max_bytes=self.settings.history_max_bytes,
+            keep_segments=self.settings.history_keep_segments,
+            index=self._build_history_index(),
+        )
+        self.cache: ResponseCache | None = None
+        if self.settings.cache_enabled:
+            self.cache = ResponseCache(
+                max_bytes=self.settings.cache_max_bytes,
+                ttl=self.settings.cache_ttl,
+                path=self.settings.cache_path,
             )
-            response.raise_for_status()
-            data = response.json()
-            answer = data.get("answer") or data.get("content")
-            if not answer:
-                raise ValueError("远程服务没有返回 answer / content 字段")
-            self._persist(question, answer)
-            logger.info("Custom HTTP provider answered successfully")
+        self.flights: SingleFlight[str] = SingleFlight()
+        self.retry = RetryPolicy(
+            attempts=self.settings.retry_attempts,
+            base_delay=self.settings.retry_base_delay,
+            max_delay=self.settings.retry_max_delay,
+        )
+        self.targets = self._build_targets()
+        self._config_fingerprint = config_fingerprint()
+        self._background: set[asyncio.Task[None]] = set()
+
+    def _build_history_index(self) -> HistoryIndex | None:
+        if not self.settings.history_index:
+            return None
+        path = self.settings.history_index_path or self.settings.history_path.with_suffix(".sqlite3")
+        return HistoryIndex(path)
+
+    def _build_targets(self) -> list[ProviderTarget]:
+        # 主 provider 使用顶层配置，备用 provider 在其基础上套用 [ai.providers.<name>]；
+        # 名称可以直接是 provider 类型，也可以在该表里用 provider = "http" 指定类型
+        targets: list[ProviderTarget] = []
+        for name in [self.settings.provider, *self.settings.fallbacks]:
+            if name == "echo" or any(target.name == name for target in targets):
+                break
+            # 连接相关字段不继承主 provider，避免把 docker 的地址发给 openai
+            overrides: Dict[str, Any] = {
+                field: AISettings.model_fields[field].get_default(call_default_factory=True) for field in TARGET_FIELDS
+            }
+            overrides.update(self.settings.providers.get(name, {}))
+            overrides.setdefault("provider", name)
+            settings = self.settings if not targets else self.settings.model_copy(update=overrides)
+            targets.append(
+                ProviderTarget(
+                    name=name,
+                    settings=settings,
+                    scheduler=self._build_scheduler(name, settings.provider),
+                    breaker=CircuitBreaker(
+                        name,
+                        failure_threshold=self.settings.breaker_failures,
+                        reset_timeout=self.settings.breaker_reset,
+                    ),
+                )
+            )
+        return targets
+
+    def _http_client(self, target: ProviderTarget) -> httpx.AsyncClient:
+        # 连接池挂在 target 上：重载配置后，旧请求继续使用旧连接池直到完成
+        if target.http is None or target.http.is_closed:
+            target.http = self._build_http_client(target)
+        return target.http
+
+    def _build_http_client(self, target: ProviderTarget) -> httpx.AsyncClient:
+        provider = target.settings.provider
+        pool = {
+            **PROVIDER_POOL_DEFAULTS.get(provider, {}),
+            **self.settings.pools.get(provider, {}),
+            **self.settings.pools.get(target.name, {}),
+        }
+        limits = httpx.Limits(
+            max_connections=int(pool.get("max_connections", 16)),
+            max_keepalive_connections=int(pool.get("max_keepalive_connections", 8)),
+            keepalive_expiry=float(pool.get("keepalive_expiry", 30.0)),
+        )
+        timeout = httpx.Timeout(float(target.settings.timeout), connect=float(target.settings.connect_timeout))
+        http2 = self.settings.http2 and _h2_available()
+        logger.info("Creating pooled HTTP client provider=%s limits=%s http2=%s", target.name, limits, http2)
+        return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+    def _build_scheduler(self, name: str, provider: str) -> ProviderScheduler:
+        concurrency = self.settings.concurrency.get(
+            name, self.settings.concurrency.get(provider, PROVIDER_CONCURRENCY_DEFAULTS.get(provider, 4))
+        )
+        return ProviderScheduler(
+            name,
+            concurrency=concurrency,
+            max_queue=self.settings.max_queue,
+            queue_timeout=self.settings.queue_timeout,
+        )
+
+    def provider_stats(self) -> list[Dict[str, Any]]:
+        return [
+            {"provider": target.name, "circuit": target.breaker.stats(), "scheduler": target.scheduler.stats()}
+            for target in self.targets
+        ]
+
+    async def start(self) -> None:
+        self.history.start()
+        if self.settings.config_watch_interval > 0:
+            self._spawn(self._watch_config())
+
+    async def aclose(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await self.history.close()
+        if self.cache is not None:
+            self.cache.close()
+        await _close_targets(self.targets)
+
+    async def reload(self, *, force: bool = False) -> bool:
+        """重新读取 config.toml 与环境变量；配置变化时原子替换 provider 链路，返回是否有变化。"""
+        self._config_fingerprint = config_fingerprint()
+        settings = self._build_settings(load_ai_config())
+        if settings == self.settings and not force:
+            return False
+        restart_fields = [
+            name
+            for name in AISettings.model_fields
+            if name.startswith(("history_", "cache_")) and getattr(settings, name) != getattr(self.settings, name)
+        ]
+        if restart_fields:
+            logger.warning("Config fields %s only take effect after restart", ", ".join(restart_fields))
+        previous = self.targets
+        # 以下赋值之间没有 await，对事件循环中的其他请求而言是一次原子切换；
+        # 已经开始的请求持有旧 target，继续用旧连接池完成
+        self.settings = settings
+        self.retry = RetryPolicy(
+            attempts=settings.retry_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+        )
+        self.targets = self._build_targets()
+        logger.info(
+            "AI config reloaded provider=%s model=%s chain=%s",
+            settings.provider, settings.model, [target.name for target in self.targets],
+        )
+        self._spawn(self._retire(previous))
+        return True
+
+    async def _retire(self, targets: list[ProviderTarget]) -> None:
+        # 等旧链路上的请求（含排队中的）全部结束再关闭连接池，最多等一个读取超时加排队超时
+        deadline = asyncio.get_running_loop().time() + self.settings.timeout + self.settings.queue_timeout
+        while not all(target.idle() for target in targets):
+            if asyncio.get_running_loop().time() >= deadline:
+                logger.warning("Closing retired provider pools with requests still in flight")
+                break
+            await asyncio.sleep(0.5)
+        await _close_targets(targets)
+
+    async def _watch_config(self) -> None:
+        while self.settings.config_watch_interval > 0:
+            await asyncio.sleep(self.settings.config_watch_interval)
+            if config_fingerprint() == self._config_fingerprint:
+                continue
+            try:
+                await self.reload()
+            except Exception as exc:  # noqa: BLE001
+                # 改到一半的配置文件可能无法解析，保留当前配置，等下一次变化
+                logger.error("Failed to reload %s: %s", CONFIG_PATH, exc)
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def ask(
+        self,
+        question: str,
+        *,
+        context: Sequence[tuple[str, str]] = (),
+        cache: CachePolicy = CachePolicy(),
+        strict: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        schema: JsonSchema | None = None,
+    ) -> str:
+        prompt = self._build_prompt(question, context)
+        cached = await self._cache_lookup(prompt, schema, cache)
+        if cached is not None:
+            logger.info("Answer served from cache")
+            return cached
+        # 相同提示词正在请求中时直接复用，避免并发占用模型 slot；
+        # 优先级不同的请求不合并，否则交互请求跟随后台请求时会继承它在队尾的位置
+        flight_key = f"{self._cache_key(self.settings, prompt, schema)}:{priority.name}"
+        if strict:
+            flight_key += ":strict"
+        return await self.flights.do(
+            flight_key, lambda: self._resolve(question, prompt, cache, strict, priority, schema)
+        )
+
+    async def cached(
+        self,
+        question: str,
+        *,
+        context: Sequence[tuple[str, str]] = (),
+        schema: JsonSchema | None = None,
+    ) -> Optional[str]:
+        """只查回答缓存，不调用模型；与 ask 使用相同的键，未命中返回 None。"""
+        return await self._cache_lookup(self._build_prompt(question, context), schema, CachePolicy())
+
+    async def _resolve(
+        self,
+        question: str,
+        prompt: Prompt,
+        cache: CachePolicy,
+        strict: bool,
+        priority: Priority,
+        schema: JsonSchema | None,
+    ) -> str:
+        errors: list[str] = []
+        for target in self.targets:
+            try:
+                answer = await self._call_target(target, prompt, priority, schema)
+            except SchedulerOverloaded:
+                # 排队失败直接抛给路由返回 429/503，不换 provider 也不走回声兜底
+                raise
+            except CircuitOpenError as exc:
+                logger.warning("Skip provider %s: %s", target.name, exc)
+                errors.append(str(exc))
+                continue
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Provider %s failed: %s", target.name, exc)
+                errors.append(f"{target.name}: {exc}")
+                continue
+            if answer is None:
+                logger.warning("Provider '%s' is not configured, skipping", target.name)
+                continue
+            await self._cache_set(self._cache_key(target.settings, prompt, schema), answer, cache)
             return answer
-        raise ValueError("provider=http 需要配置 base_url")
+        if errors:
+            if strict:
+                # 多步任务（如分层汇总）不能把回声文本当成结果继续使用
+                raise ProviderError("; ".join(errors))
+            return self.fallback(question, error="; ".join(errors))
+        logger.warning("No remote provider configured, falling back to echo")
+        return self.fallback(question)
+
+    async def _call_target(
+        self, target: ProviderTarget, prompt: Prompt, priority: Priority, schema: JsonSchema | None = None
+    ) -> Optional[str]:
+        # 熔断中的 provider 不占用排队名额，毫秒级失败后切到下一个
+        target.breaker.check()
+        async with target.scheduler.slot(priority):
+            logger.info("Dispatch question to provider=%s priority=%s", target.name, priority.name)
+            return await self.retry.run(target.breaker, lambda: self._timed_dispatch(target, prompt, schema))
+
+    async def _timed_dispatch(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            answer = await self._dispatch(target, prompt, schema)
+        except Exception:
+            metrics.PROVIDER_LATENCY.observe(time.perf_counter() - started, target.name, "error")
+            raise
+        if answer is not None:
+            metrics.PROVIDER_LATENCY.observe(time.perf_counter() - started, target.name, "ok")
+            metrics.PROMPT_CHARS.observe(len(prompt.text()), target.name)
+            metrics.ANSWER_CHARS.observe(len(answer), target.name)
+        return answer
+
+    async def _dispatch(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> Optional[str]:
+        provider = target.settings.provider
+        if provider == "http" and target.settings.base_url:
+            return await self._request_custom_http(target, prompt, schema)
+        if provider == "openai":
+            return await self._request_openai(target, prompt, schema)
+        if provider == "docker":
+            return await self._request_docker_runner(target, prompt, schema)
+        return None
+
+    @staticmethod
+    def _cache_key(settings: AISettings, prompt: Prompt, schema: JsonSchema | None = None) -> str:
+        # 键取自实际回答的 provider；结构化输出与自由文本的回答格式不同，schema 也计入键
+        return ResponseCache.make_key(
+            settings.provider, settings.model, settings.answer_style, prompt.text(), schema.name if schema else ""
+        )
+
+    async def _cache_lookup(self, prompt: Prompt, schema: JsonSchema | None, policy: CachePolicy) -> Optional[str]:
+        """按故障转移链的顺序查缓存，只查到第一个未熔断的 provider 为止：
+        主 provider 正常时不会返回备用 provider 缓存的回答。"""
+        if self.cache is None or not policy.read:
+            return None
+        for target in self.targets:
+            cached = await self.cache.get(self._cache_key(target.settings, prompt, schema))
+            if cached is not None or target.breaker.state != "open":
+                return cached
+        return None
+
+    async def _cache_set(self, key: str, answer: str, policy: CachePolicy) -> None:
+        if self.cache is not None and policy.write:
+            await self.cache.set(key, answer)
+
+    async def _request_custom_http(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> str:
+        settings = target.settings
+        assert settings.base_url, "base_url must be configured for http provider"
+        logger.debug("Calling custom HTTP endpoint %s", settings.base_url)
+        response = await self._http_client(target).post(
+            settings.base_url,
+            json=_custom_http_body(prompt, schema),
+            headers=settings.headers or None,
+        )
+        response.raise_for_status()
+        data = response.json()
+        answer = data.get("answer") or data.get("content")
+        if not answer:
+            raise ValueError("远程服务没有返回 answer / content 字段")
+        metrics.record_usage(target.name, data.get("usage"))
+        self._persist(prompt.text(), answer)
+        logger.info("Custom HTTP provider answered successfully")
+        return answer
+
+    async def _request_openai(self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None) -> str:
+        base_url, payload, headers, use_chat_api = self._openai_request(target.settings, prompt, schema)
+        response = await self._http_client(target).post(base_url, json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        answer = self._extract_openai_answer(data, prefer_chat=use_chat_api)
+        metrics.record_usage(target.name, data.get("usage") or (data.get("response") or {}).get("usage"))
+        self._persist(prompt.text(), answer)
+        logger.info("OpenAI provider answered successfully")
+        return answer
 
-    async def _request_openai(self, question: str) -> str:
-        api_key = self.settings.api_key or ""
+    @staticmethod
+    def _openai_request(
+        settings: AISettings, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> tuple[str, Dict[str, Any], Dict[str, str], bool]:
+        api_key = settings.api_key or ""
         if not api_key:
             raise ValueError("OpenAI 模式需要配置 api_key")
-        base_url = (self.settings.base_url or "https://api.openai.com/v1/responses").rstrip("/")
+        base_url = (settings.base_url or "https://api.openai.com/v1/responses").rstrip("/")
         use_chat_api = "chat/completions" in base_url
-        logger.debug("Calling OpenAI endpoint %s model=%s use_chat=%s", base_url, self.settings.model, use_chat_api)
+        logger.debug("Calling OpenAI endpoint %s model=%s use_chat=%s", base_url, settings.model, use_chat_api)
         if use_chat_api:
             payload: Dict[str, Any] = {
-                "model": self.settings.model,
-                "messages": [{"role": "user", "content": question}],
+                "model": settings.model,
+                "messages": prompt.messages(),
             }
         else:
             payload = {
-                "model": self.settings.model,
-                "input": question,
+                "model": settings.model,
+                "input": prompt.messages()[1:] if prompt.system else prompt.messages(),
             }
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", **(self.settings.headers or {})}
-        async with httpx.AsyncClient(timeout=self.settings.timeout) as client:
-            response = await client.post(base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            answer = self._extract_openai_answer(data, prefer_chat=use_chat_api)
-            self._persist(question, answer)
-            logger.info("OpenAI provider answered successfully")
-            return answer
+            if prompt.system:
+                payload["instructions"] = prompt.system
+        if schema is not None:
+            if use_chat_api:
+                payload["response_format"] = schema.response_format()
+            else:
+                payload["text"] = schema.text_format()
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", **(settings.headers or {})}
+        return base_url, payload, headers, use_chat_api
 
     @staticmethod
     def _extract_openai_answer(data: Dict[str, Any], *, prefer_chat: bool = False) -> str:
@@ -141,30 +587,201 @@ class AIClient:
                 return content
         raise ValueError("无法解析 OpenAI 返回结果")
 
-    async def _request_docker_runner(self, question: str) -> str:
-        base_url = self.settings.base_url or "http://localhost:12434/engines/llama.cpp/v1/chat/completions"
-        logger.debug("Calling docker runner %s model=%s", base_url, self.settings.model)
-        payload = {
-            "model": self.settings.model,
-            "messages": [{"role": "user", "content": question}],
+    async def _request_docker_runner(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> str:
+        base_url, payload, headers = self._docker_request(target.settings, prompt, schema)
+        response = await self._http_client(target).post(base_url, json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        choices = data.get("choices") or []
+        if not choices:
+            raise ValueError("Docker model runner 未返回 choices")
+        message = choices[0].get("message") or {}
+        answer = message.get("content")
+        if not answer:
+            raise ValueError("Docker model runner choices 缺少 message.content")
+        metrics.record_usage(target.name, data.get("usage"))
+        self._persist(prompt.text(), answer)
+        logger.info("Docker model runner answered successfully")
+        return answer
+
+    @staticmethod
+    def _docker_request(
+        settings: AISettings, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> tuple[str, Dict[str, Any], Dict[str, str]]:
+        base_url = settings.base_url or "http://localhost:12434/engines/llama.cpp/v1/chat/completions"
+        logger.debug("Calling docker runner %s model=%s", base_url, settings.model)
+        payload: Dict[str, Any] = {
+            "model": settings.model,
+            "messages": prompt.messages(),
+            # llama.cpp 复用与上次请求相同的前缀，只计算新增的 token
+            "cache_prompt": True,
         }
-        headers = {"Content-Type": "application/json", **(self.settings.headers or {})}
-        async with httpx.AsyncClient(timeout=self.settings.timeout) as client:
-            response = await client.post(base_url, json=payload, headers=headers)
+        if settings.docker_slots:
+            payload["id_slot"] = prompt.prefix_hash() % settings.docker_slots
+        if schema is not None:
+            payload["response_format"] = schema.response_format()
+        headers = {"Content-Type": "application/json", **(settings.headers or {})}
+        return base_url, payload, headers
+
+    async def ask_stream(
+        self,
+        question: str,
+        *,
+        context: Sequence[tuple[str, str]] = (),
+        cache: CachePolicy = CachePolicy(),
+        strict: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        schema: JsonSchema | None = None,
+    ) -> AsyncIterator[str]:
+        prompt = self._build_prompt(question, context)
+        cached = await self._cache_lookup(prompt, schema, cache)
+        if cached is not None:
+            logger.info("Streaming answer served from cache")
+            yield cached
+            return
+        errors: list[str] = []
+        for target in self.targets:
+            if not self._configured(target):
+                logger.warning("Provider '%s' is not configured, skipping", target.name)
+                continue
+            fragments: list[str] = []
+            started = time.perf_counter()
+            try:
+                target.breaker.check()
+                async with target.scheduler.slot(priority):
+                    logger.info("Dispatch streaming question to provider=%s", target.name)
+                    # 重试与熔断只覆盖到第一段输出为止，之后出错无法再换 provider
+                    stream, first = await self.retry.run(
+                        target.breaker, lambda: self._first_chunk(target, prompt, schema)
+                    )
+                    metrics.PROVIDER_TTFB.observe(time.perf_counter() - started, target.name)
+                    try:
+                        fragments.append(first)
+                        yield first
+                        async for delta in stream:
+                            fragments.append(delta)
+                            yield delta
+                    finally:
+                        await stream.aclose()
+            except SchedulerOverloaded:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                if fragments:
+                    # 已经向客户端输出了部分内容，无法再回退，交给调用方处理
+                    logger.exception("Provider %s stream broke after %s chunks", target.name, len(fragments))
+                    raise
+                metrics.PROVIDER_LATENCY.observe(time.perf_counter() - started, target.name, "error")
+                logger.warning("Provider %s stream failed: %s", target.name, exc)
+                errors.append(f"{target.name}: {exc}")
+                continue
+            answer = "".join(fragments)
+            metrics.PROVIDER_LATENCY.observe(time.perf_counter() - started, target.name, "ok")
+            metrics.PROMPT_CHARS.observe(len(prompt.text()), target.name)
+            metrics.ANSWER_CHARS.observe(len(answer), target.name)
+            self._persist(prompt.text(), answer)
+            await self._cache_set(self._cache_key(target.settings, prompt, schema), answer, cache)
+            logger.info("Provider %s streamed answer successfully chunks=%s", target.name, len(fragments))
+            return
+        if errors:
+            if strict:
+                raise ProviderError("; ".join(errors))
+            yield self.fallback(question, error="; ".join(errors))
+        else:
+            logger.warning("No remote provider configured, falling back to echo")
+            yield self.fallback(question)
+
+    @staticmethod
+    def _configured(target: ProviderTarget) -> bool:
+        provider = target.settings.provider
+        return provider in {"openai", "docker"} or (provider == "http" and bool(target.settings.base_url))
+
+    def _open_stream(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> AsyncIterator[str] | None:
+        provider = target.settings.provider
+        if provider == "http" and target.settings.base_url:
+            return self._stream_custom_http(target, prompt, schema)
+        if provider == "openai":
+            return self._stream_openai(target, prompt, schema)
+        if provider == "docker":
+            return self._stream_docker_runner(target, prompt, schema)
+        return None
+
+    async def _first_chunk(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> tuple[AsyncIterator[str], str]:
+        stream = self._open_stream(target, prompt, schema)
+        assert stream is not None
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            raise ValueError("模型流式返回为空") from None
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    async def _stream_custom_http(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> AsyncIterator[str]:
+        settings = target.settings
+        assert settings.base_url, "base_url must be configured for http provider"
+        async with self._http_client(target).stream(
+            "POST",
+            settings.base_url,
+            json={**_custom_http_body(prompt, schema), "stream": True},
+            headers=settings.headers or None,
+        ) as response:
             response.raise_for_status()
-            data = response.json()
-            choices = data.get("choices") or []
-            if not choices:
-                raise ValueError("Docker model runner 未返回 choices")
-            message = choices[0].get("message") or {}
-            answer = message.get("content")
-            if not answer:
-                raise ValueError("Docker model runner choices 缺少 message.content")
-            self._persist(question, answer)
-            logger.info("Docker model runner answered successfully")
-            return answer
+            if response.headers.get("content-type", "").startswith("application/json"):
+                # 服务端不支持流式时退化为一次性读取
+                data = json.loads(await response.aread())
+                answer = data.get("answer") or data.get("content")
+                if not answer:
+                    raise ValueError("远程服务没有返回 answer / content 字段")
+                yield answer
+                return
+            async for chunk in response.aiter_text():
+                if chunk:
+                    yield chunk
 
-    def _fallback(self, question: str, error: str | None = None) -> str:
+    async def _stream_openai(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> AsyncIterator[str]:
+        base_url, payload, headers, use_chat_api = self._openai_request(target.settings, prompt, schema)
+        payload["stream"] = True
+        if use_chat_api:
+            payload["stream_options"] = {"include_usage": True}
+        async with self._http_client(target).stream("POST", base_url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for event in _iter_sse_json(response):
+                metrics.record_usage(target.name, event.get("usage") or (event.get("response") or {}).get("usage"))
+                if use_chat_api:
+                    delta = _chat_delta(event)
+                elif event.get("type") == "response.output_text.delta":
+                    delta = event.get("delta") or ""
+                else:
+                    delta = ""
+                if delta:
+                    yield delta
+
+    async def _stream_docker_runner(
+        self, target: ProviderTarget, prompt: Prompt, schema: JsonSchema | None = None
+    ) -> AsyncIterator[str]:
+        base_url, payload, headers = self._docker_request(target.settings, prompt, schema)
+        payload["stream"] = True
+        async with self._http_client(target).stream("POST", base_url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for event in _iter_sse_json(response):
+                metrics.record_usage(target.name, event.get("usage"))
+                delta = _chat_delta(event)
+                if delta:
+                    yield delta
+
+    def fallback(self, question: str, error: str | None = None) -> str:
+        """本地回声回答；严格模式的调用方在 provider 全部失败后可自行决定是否使用。"""
+        metrics.FALLBACKS.inc("error" if error else "unconfigured")
         if error:
             logger.error("Fallback echo due to error: %s", error)
         else:
@@ -185,20 +802,11 @@ class AIClient:
             "answer": answer,
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
-        payload: list[Dict[str, Any]] = []
-        try:
-            payload = json.loads(self.history_path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError:
-            payload = []
-        payload.append(record)
-        self.history_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-        logger.debug("Persisted QA record, total=%s", len(payload))
+        self.history.append(record)
 
-    def _apply_answer_style(self, question: str) -> str:
+    def _build_prompt(self, question: str, context: Sequence[tuple[str, str]] = ()) -> Prompt:
         style = (self.settings.answer_style or "").strip()
-        if not style:
-            return question
-        return f"{style}\n\n问题：{question}"
+        return Prompt(question, style, tuple(context))
 
     def _build_settings(self, config_overrides: dict[str, Any]) -> AISettings:
         if config_overrides is None:
@@ -212,5 +820,125 @@ class AIClient:
         return AISettings(**data)
 
 
+def _custom_http_body(prompt: Prompt, schema: JsonSchema | None) -> Dict[str, Any]:
+    # question 仍是拼好的完整文本；支持多轮对话的自建服务可改用 messages，按 schema 约束输出
+    body: Dict[str, Any] = {"question": prompt.text(), "messages": prompt.messages()}
+    if schema is not None:
+        body["schema"] = schema.schema
+    return body
+
+
+async def _iter_sse_json(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data:
+            continue
+        if data == "[DONE]":
+            return
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            logger.debug("Skip non-JSON SSE payload: %s", data[:80])
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+def _chat_delta(event: Dict[str, Any]) -> str:
+    choices = event.get("choices")
+    if not isinstance(choices, list) or not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    content = delta.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def _provider_levels() -> Dict[tuple[str, ...], float]:
+    if _client is None:
+        return {}
+    levels: Dict[tuple[str, ...], float] = {}
+    for target in _client.targets:
+        levels[(target.name, "active")] = target.scheduler.active
+        levels[(target.name, "queued")] = target.scheduler.queue_length()
+    return levels
+
+
+def _circuit_states() -> Dict[tuple[str, ...], float]:
+    if _client is None:
+        return {}
+    return {(target.name,): float(target.breaker.state != "closed") for target in _client.targets}
+
+
+metrics.REGISTRY.register(
+    metrics.Gauge(
+        "mindflow_provider_requests", "Model calls in flight or queued", ("provider", "state"), _provider_levels
+    )
+)
+metrics.REGISTRY.register(
+    metrics.Gauge(
+        "mindflow_provider_circuit_open", "1 while the provider circuit is open or half-open", ("provider",),
+        _circuit_states,
+    )
+)
+
+
+async def _close_targets(targets: list[ProviderTarget]) -> None:
+    for target in targets:
+        if target.http is not None and not target.http.is_closed:
+            await target.http.aclose()
+        target.http = None
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ModuleNotFoundError:
+        logger.warning("http2=true but package 'h2' is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+_client: AIClient | None = None
+
+
 def get_ai_client() -> AIClient:
-    return AIClient()
+    global _client
+    if _client is None:
+        _client = AIClient()
+    return _client
+
+
+async def startup_ai_client() -> None:
+    await get_ai_client().start()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_on_signal)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # Windows 没有 SIGHUP；非主线程运行（如测试）时也无法注册
+        logger.debug("SIGHUP reload is not available on this platform")
+
+
+def _reload_on_signal() -> None:
+    if _client is None:
+        return
+    logger.info("SIGHUP received, reloading AI config")
+
+    async def reload() -> None:
+        try:
+            await get_ai_client().reload()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Failed to reload AI config: %s", exc)
+
+    get_ai_client()._spawn(reload())
+
+
+async def shutdown_ai_client() -> None:
+    global _client
+    try:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Header
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy(NamedTuple):
+    read: bool = True
+    write: bool = True
+
+
+def request_cache_policy(cache_control: str | None = Header(default=None)) -> CachePolicy:
+    directives = {part.strip().lower() for part in (cache_control or "").split(",")}
+    if "no-store" in directives:
+        return CachePolicy(read=False, write=False)
+    if "no-cache" in directives:
+        return CachePolicy(read=False, write=True)
+    return CachePolicy()
+
+
+class _Entry(NamedTuple):
+    value: str
+    expires_at: float
+    size: int
+
+
+class ResponseCache:
+    def __init__(self, *, max_bytes: int = 32 * 1024 * 1024, ttl: float = 3600.0, path: Optional[Path] = None) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, int] = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        if path is not None:
+            self._open_disk(path)
+
+    @staticmethod
+    def make_key(provider: str, model: str, answer_style: str, prompt: str, schema: str = "") -> str:
+        digest = hashlib.sha256()
+        # 不带 schema 的键与之前保持一致，已有的磁盘缓存继续有效
+        for part in (provider, model, answer_style, prompt, *((schema,) if schema else ())):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry.value
+            self._drop(key)
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                value, expires_at = row
+                self._remember(key, value, expires_at)
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return value
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        self._stats["writes"] += 1
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_execute, "DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "disk": str(self.path) if self.path else None,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = _Entry(value, expires_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _open_disk(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+        logger.info("Response cache disk tier enabled path=%s", path)
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple[str, float]]:
+        assert self._db is not None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        self._disk_execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)", key, value, expires_at
+        )
+
+    def _disk_execute(self, sql: str, *params: Any) -> None:
+        assert self._db is not None
+        with self._db_lock:
+            self._db.execute(sql, params)
+            self._db.commit()
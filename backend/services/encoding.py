@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import gzip
+import importlib.util
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+
+try:  # 可选依赖：安装后大对象序列化快数倍
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:  # 可选依赖：未安装时只提供 gzip
+    import brotli
+except ModuleNotFoundError:  # pragma: no cover
+    brotli = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# 小响应压缩得不偿失
+MIN_COMPRESS_BYTES = 1024
+
+# requirements.txt 默认安装的加速编解码库；缺失时功能降级但服务照常运行
+OPTIONAL_CODECS = {
+    "orjson": "JSON 序列化退回标准库 json",
+    "brotli": "响应与前端静态文件只提供 gzip 压缩",
+    "msgpack": "脑图接口不提供 application/vnd.mindflow.flat+msgpack",
+}
+
+
+def log_missing_codecs() -> list[str]:
+    """启动时调用一次，每个缺失的可选库记录一条警告。"""
+    missing = [name for name in OPTIONAL_CODECS if importlib.util.find_spec(name) is None]
+    for name in missing:
+        logger.warning(
+            "Optional codec %s is not installed: %s (pip install -r requirements.txt)", name, OPTIONAL_CODECS[name]
+        )
+    return missing
+
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def supported_encodings() -> tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str], size: int, available: Optional[tuple[str, ...]] = None) -> str:
+    if size < MIN_COMPRESS_BYTES or not accept_encoding:
+        return "identity"
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = "identity", 0.0
+    for coding in available if available is not None else supported_encodings():
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较：W/"3" 与 "3" 视为同一版本
+    target = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == target for candidate in if_none_match.split(","))
+
+
+class EncodedBody:
+    """一份已序列化的响应体及其按需生成、缓存的压缩版本。"""
+
+    def __init__(
+        self,
+        raw: bytes,
+        etag: str,
+        media_type: str = "application/json",
+        variants: Optional[Dict[str, bytes]] = None,
+    ) -> None:
+        self.raw = raw
+        self.etag = etag
+        self.media_type = media_type
+        self._variants: Dict[str, bytes] = {**(variants or {}), "identity": raw}
+
+    def variant(self, coding: str) -> bytes:
+        body = self._variants.get(coding)
+        if body is None:
+            if coding == "br":
+                body = brotli.compress(self.raw, quality=5)
+            else:
+                body = gzip.compress(self.raw, compresslevel=6)
+            self._variants[coding] = body
+        return body
+
+    def has_variant(self, coding: str) -> bool:
+        return coding in self._variants
+
+    def response(self, coding: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        merged = {"Vary": "Accept-Encoding", **(headers or {})}
+        if coding == "identity":
+            merged["ETag"] = self.etag
+        else:
+            # 压缩后的表示与原文字节不同，按 RFC 9110 使用弱 ETag
+            merged["ETag"] = self.etag if self.etag.startswith("W/") else f"W/{self.etag}"
+            merged["Content-Encoding"] = coding
+        return Response(self.variant(coding), media_type=self.media_type, headers=merged)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Literal, Optional
+
+try:
+    from backend.services.history_index import HistoryIndex
+    from backend.services.metrics import HISTORY_WRITES
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.history_index import HistoryIndex  # type: ignore
+    from services.metrics import HISTORY_WRITES  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+FsyncPolicy = Literal["batch", "interval", "never"]
+
+
+# 追加写入的 JSONL 问答历史，由单个后台任务批量落盘，避免并发请求互相覆盖
+class HistoryStore:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        fsync: FsyncPolicy = "batch",
+        fsync_interval: float = 1.0,
+        batch_size: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        keep_segments: int = 10,
+        index: HistoryIndex | None = None,
+    ) -> None:
+        if path.suffix == ".json":
+            path = path.with_suffix(".jsonl")
+        self.path = path
+        self.legacy_path = path.with_suffix(".json")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = max(1, batch_size)
+        self.max_bytes = max_bytes
+        self.keep_segments = keep_segments
+        self.index = index
+        self._queue: asyncio.Queue[Optional[Dict[str, Any]]] | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._last_fsync = 0.0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._migrate_legacy()
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="history-writer")
+        logger.info("History writer started path=%s fsync=%s", self.path, self.fsync)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._task is None or self._task.done():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # 没有事件循环（如脚本直接调用）时同步写入
+                self._write_batch([record])
+                return
+            self.start()
+        assert self._queue is not None
+        self._queue.put_nowait(record)
+
+    async def flush(self) -> None:
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        if self._queue is None or self._task is None:
+            return
+        if not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        self._queue = None
+        if self.index is not None:
+            self.index.close()
+        logger.info("History writer stopped")
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        if self.index is not None and self.index.empty():
+            # 首次启用索引（或索引文件被删除）时从 JSONL 重建；写入请求先在队列里等待
+            try:
+                await asyncio.to_thread(self.index.rebuild, self.iter_records())
+            except Exception:  # noqa: BLE001
+                logger.exception("Failed to rebuild history index %s", self.index.path)
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            batch: list[Dict[str, Any]] = []
+            taken = 1
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            while len(batch) < self.batch_size and not queue.empty():
+                item = queue.get_nowait()
+                taken += 1
+                if item is None:
+                    stopping = True
+                    continue
+                batch.append(item)
+            try:
+                if batch:
+                    started = time.perf_counter()
+                    await asyncio.to_thread(self._write_batch, batch)
+                    HISTORY_WRITES.observe(time.perf_counter() - started)
+            except Exception:  # noqa: BLE001
+                logger.exception("Failed to persist %s history records", len(batch))
+            finally:
+                for _ in range(taken):
+                    queue.task_done()
+
+    def _write_batch(self, batch: list[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        with self.path.open("a", encoding="utf-8") as fp:
+            fp.write(lines)
+            fp.flush()
+            if self._should_fsync():
+                os.fsync(fp.fileno())
+                self._last_fsync = time.monotonic()
+            size = fp.tell()
+        logger.debug("Persisted %s QA records", len(batch))
+        if self.index is not None:
+            try:
+                self.index.add(batch)
+            except sqlite3.Error:
+                # JSONL 才是数据源，索引写失败只影响搜索
+                logger.exception("Failed to index %s history records", len(batch))
+        if self.max_bytes and size >= self.max_bytes:
+            self._rotate()
+
+    def _should_fsync(self) -> bool:
+        if self.fsync == "batch":
+            return True
+        if self.fsync == "interval":
+            return time.monotonic() - self._last_fsync >= self.fsync_interval
+        return False
+
+    def _rotate(self) -> None:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        target = self.path.with_name(f"{self.path.stem}-{stamp}.jsonl")
+        suffix = 1
+        while target.exists():
+            target = self.path.with_name(f"{self.path.stem}-{stamp}-{suffix}.jsonl")
+            suffix += 1
+        os.replace(self.path, target)
+        logger.info("Rotated history segment to %s", target.name)
+        self._compact()
+
+    def _compact(self) -> None:
+        if self.keep_segments <= 0:
+            return
+        segments = self.segments()
+        for stale in segments[: max(0, len(segments) - self.keep_segments)]:
+            stale.unlink(missing_ok=True)
+            logger.info("Removed stale history segment %s", stale.name)
+
+    def segments(self) -> list[Path]:
+        """按轮转顺序从旧到新返回已轮转的分段。"""
+        # 按文件名排序时同一秒的 history-<stamp>-1 会排在 history-<stamp> 之前，改按 (时间戳, 序号) 排序
+        pattern = re.compile(rf"{re.escape(self.path.stem)}-(\d{{8}}T\d{{6}})(?:-(\d+))?\.jsonl")
+        segments: list[tuple[str, int, Path]] = []
+        for candidate in self.path.parent.glob(f"{self.path.stem}-*.jsonl"):
+            match = pattern.fullmatch(candidate.name)
+            if match is not None:
+                # 不符合命名规则的文件不是本存储写出的分段，既不读取也不清理
+                segments.append((match.group(1), int(match.group(2) or 0), candidate))
+        return [segment for _, _, segment in sorted(segments)]
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for segment in [*self.segments(), self.path]:
+            if not segment.exists():
+                continue
+            with segment.open(encoding="utf-8") as fp:
+                for line in fp:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skip corrupted history line in %s", segment.name)
+
+    def _migrate_legacy(self) -> None:
+        # 旧版本检出时可能已留下空的 history.jsonl，只有它已有记录时才跳过迁移
+        if not self.legacy_path.exists() or (self.path.exists() and self.path.stat().st_size > 0):
+            return
+        try:
+            payload = json.loads(self.legacy_path.read_text(encoding="utf-8") or "[]")
+        except json.JSONDecodeError:
+            logger.error("Legacy history %s is corrupted, skip migration", self.legacy_path)
+            return
+        records = payload if isinstance(payload, list) else []
+        tmp_path = self.path.with_suffix(".jsonl.tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            for record in records:
+                fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, self.path)
+        self.legacy_path.rename(self.legacy_path.with_suffix(".json.migrated"))
+        logger.info("Migrated %s legacy history records to %s", len(records), self.path.name)
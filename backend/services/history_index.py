@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词器不依赖空格切词，中文子串也能命中；短于 3 个字符的词无法生成 trigram，
+# 改查逐字拆分的影子表 records_chars：每个字符一个 token，短词作为短语查询，相邻字符即子串
+MIN_TRIGRAM_CHARS = 3
+
+
+def _chars(text: str) -> str:
+    return " ".join(text)
+
+
+def _phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _epoch(timestamp: Any) -> float:
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class HistoryIndex:
+    """问答历史的 SQLite 全文索引，随 HistoryStore 批量写入增量维护。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            backfill = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'records_chars'"
+            ).fetchone() is None
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_records_ts ON records (ts);
+                CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+                    question, answer, content='records', content_rowid='id', tokenize='trigram'
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS records_chars USING fts5(
+                    question, answer, content='', tokenize='unicode61 remove_diacritics 0'
+                );
+                """
+            )
+            if backfill:
+                # 旧版本创建的索引没有影子表，从 records 补齐
+                rows = self._db.execute("SELECT id, question, answer FROM records").fetchall()
+                self._db.executemany(
+                    "INSERT INTO records_chars (rowid, question, answer) VALUES (?, ?, ?)",
+                    ((row[0], _chars(row[1]), _chars(row[2])) for row in rows),
+                )
+            self._db.commit()
+
+    def empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM records LIMIT 1").fetchone() is None
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> int:
+        rows = [
+            (_epoch(record.get("timestamp")), str(record.get("question") or ""), str(record.get("answer") or ""))
+            for record in records
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            with self._db:
+                for row in rows:
+                    cursor = self._db.execute("INSERT INTO records (ts, question, answer) VALUES (?, ?, ?)", row)
+                    self._db.execute(
+                        "INSERT INTO records_fts (rowid, question, answer) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, row[1], row[2]),
+                    )
+                    self._db.execute(
+                        "INSERT INTO records_chars (rowid, question, answer) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, _chars(row[1]), _chars(row[2])),
+                    )
+        return len(rows)
+
+    def rebuild(self, records: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM records")
+                self._db.execute("INSERT INTO records_fts (records_fts) VALUES ('delete-all')")
+                self._db.execute("INSERT INTO records_chars (records_chars) VALUES ('delete-all')")
+        total = 0
+        batch: list[Dict[str, Any]] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += self.add(batch)
+                batch = []
+        total += self.add(batch)
+        logger.info("Rebuilt history index path=%s records=%s", self.path, total)
+        return total
+
+    def search(
+        self,
+        query: str = "",
+        *,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None,
+        limit: int = 20,
+    ) -> tuple[list[Dict[str, Any]], Optional[int]]:
+        """按 id 倒序（最新在前）分页，返回本页记录与下一页游标。"""
+        clauses: list[str] = []
+        params: list[Any] = []
+        terms = query.split()
+        indexed = [term for term in terms if len(term) >= MIN_TRIGRAM_CHARS]
+        short = [term for term in terms if len(term) < MIN_TRIGRAM_CHARS]
+        # 标点等会被 unicode61 当作分隔符丢弃，这类字符只能在影子表缩小范围后再逐条确认
+        exact = [term for term in short if not term.isalnum()]
+        short = [term for term in short if any(char.isalnum() for char in term)]
+        source = "records r"
+        order = "r.id"
+        if indexed:
+            # 从 FTS 表按 rowid 倒序流式读取，命中很多时也只扫描到凑满一页为止
+            source = "records_fts f JOIN records r ON r.id = f.rowid"
+            order = "f.rowid"
+            clauses.append("records_fts MATCH ?")
+            params.append(" AND ".join(_phrase(term) for term in indexed))
+        if short:
+            match = " AND ".join(_phrase(_chars(term)) for term in short)
+            if indexed:
+                clauses.append("f.rowid IN (SELECT rowid FROM records_chars WHERE records_chars MATCH ?)")
+            else:
+                source = "records_chars c JOIN records r ON r.id = c.rowid"
+                order = "c.rowid"
+                clauses.append("records_chars MATCH ?")
+            params.append(match)
+        for term in exact:
+            clauses.append("(instr(r.question, ?) > 0 OR instr(r.answer, ?) > 0)")
+            params.extend([term, term])
+        if since is not None:
+            clauses.append("r.ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("r.ts < ?")
+            params.append(until)
+        if before_id is not None:
+            clauses.append(f"{order} < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT r.id, r.ts, r.question, r.answer FROM {source} {where} ORDER BY {order} DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        items = [
+            {"id": row[0], "timestamp": _iso(row[1]), "question": row[2], "answer": row[3]} for row in rows[:limit]
+        ]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return items, next_cursor
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
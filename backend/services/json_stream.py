@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayStream:
+    """增量解析流式文本中的第一个 JSON 数组：每个元素一闭合就返回，不必等整段输出结束。
+
+    数组前后的说明文字、```json 代码块，以及 {"questions": [...]} 这类外层对象都会被跳过；
+    数组中只返回对象和字符串元素，无法解析的元素直接丢弃。
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 目标数组内部所在的嵌套深度，尚未遇到数组时为 None
+        self._array_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+        self._found = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> list[Any]:
+        if self.done:
+            return []
+        self._text += chunk
+        items: list[Any] = []
+        text = self._text
+        for index in range(self._pos, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._element_start is not None and self._depth == self._array_depth:
+                        self._emit(text[self._element_start : index + 1], items)
+                continue
+            if char == '"':
+                # 最外层的说明文字里的引号不成对也无妨，只在括号内跟踪字符串
+                if self._depth == 0:
+                    continue
+                self._in_string = True
+                if self._depth == self._array_depth and self._element_start is None:
+                    self._element_start = index
+            elif char in "[{":
+                if self._depth == self._array_depth and self._element_start is None:
+                    self._element_start = index
+                self._depth += 1
+                if char == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+            elif char in "]}":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if self._array_depth is None:
+                    continue
+                if self._depth == self._array_depth and self._element_start is not None:
+                    self._emit(text[self._element_start : index + 1], items)
+                elif self._depth < self._array_depth:
+                    if self._found:
+                        self.done = True
+                        break
+                    # 空数组或只含数字等元素，继续寻找后面的数组
+                    self._array_depth = None
+        # 只保留未闭合元素需要的文本，避免长输出反复拼接
+        keep = self._element_start if self._element_start is not None else len(text)
+        self._text = text[keep:]
+        self._pos = len(text) - keep
+        if self._element_start is not None:
+            self._element_start = 0
+        return items
+
+    def _emit(self, raw: str, items: list[Any]) -> None:
+        self._element_start = None
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.debug("Skip malformed array element: %s", raw[:80])
+            return
+        if isinstance(item, (dict, str)):
+            self._found += 1
+            items.append(item)
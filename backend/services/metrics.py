@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+IO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# 指标只在事件循环线程里更新，不加锁；线程池中的耗时由调用方在 await 前后计时
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def render(self) -> list[str]:
+        values = self._values
+        if self._collect is not None:
+            try:
+                values = {**values, **self._collect()}
+            except Exception:  # noqa: BLE001
+                logger.exception("Failed to collect gauge %s", self.name)
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：各桶（非累计）计数 + 溢出桶、总和
+        self._series: Dict[LabelValues, Tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> list[str]:
+        lines: list[str] = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="' + _format_number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            suffix = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_number(total[0])}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            body = metric.render()
+            if body:
+                lines.extend(metric.header())
+                lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("mindflow_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram(
+        "mindflow_http_request_duration_seconds",
+        "HTTP request latency until the response body is complete",
+        ("method", "route"),
+    )
+)
+HTTP_TTFB = REGISTRY.register(
+    Histogram("mindflow_http_time_to_first_byte_seconds", "Time until response headers are sent", ("method", "route"))
+)
+PROVIDER_LATENCY = REGISTRY.register(
+    Histogram("mindflow_provider_request_duration_seconds", "Model provider call latency", ("provider", "outcome"))
+)
+PROVIDER_TTFB = REGISTRY.register(
+    Histogram("mindflow_provider_time_to_first_chunk_seconds", "Streaming time to first chunk", ("provider",))
+)
+PROMPT_CHARS = REGISTRY.register(
+    Histogram("mindflow_prompt_chars", "Prompt size in characters", ("provider",), buckets=SIZE_BUCKETS)
+)
+ANSWER_CHARS = REGISTRY.register(
+    Histogram("mindflow_answer_chars", "Answer size in characters", ("provider",), buckets=SIZE_BUCKETS)
+)
+TOKENS = REGISTRY.register(
+    Counter("mindflow_provider_tokens_total", "Token usage reported by the provider", ("provider", "kind"))
+)
+FALLBACKS = REGISTRY.register(
+    Counter("mindflow_fallback_total", "Answers served by the local echo fallback", ("reason",))
+)
+HISTORY_WRITES = REGISTRY.register(
+    Histogram("mindflow_history_write_seconds", "History batch write duration", buckets=IO_BUCKETS)
+)
+MINDMAP_WRITES = REGISTRY.register(
+    Histogram("mindflow_mindmap_write_seconds", "Mindmap write duration", ("backend", "op"), buckets=IO_BUCKETS)
+)
+LOOP_LAG = REGISTRY.register(
+    Histogram("mindflow_event_loop_lag_seconds", "Event loop scheduling delay", buckets=IO_BUCKETS)
+)
+
+
+def record_usage(provider: str, usage: Any) -> None:
+    # OpenAI chat / llama.cpp：prompt_tokens / completion_tokens；Responses API：input_tokens / output_tokens
+    if not isinstance(usage, dict):
+        return
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    if isinstance(prompt, (int, float)):
+        TOKENS.inc(provider, "prompt", amount=prompt)
+    if isinstance(completion, (int, float)):
+        TOKENS.inc(provider, "completion", amount=completion)
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    # 用路径参数还原路由模板，避免 /api/maps/<id> 之类的路径撑爆标签基数
+    if "endpoint" not in scope:
+        return "unmatched"
+    path = scope.get("root_path", "") + scope["path"]
+    for name, value in (scope.get("path_params") or {}).items():
+        if value:
+            path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：不缓冲响应体，流式响应按发送完最后一个分块计时。"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                HTTP_TTFB.observe(time.perf_counter() - started, scope["method"], _route_label(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_label(scope)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
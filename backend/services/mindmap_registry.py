@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+try:
+    from backend.config import load_storage_config
+    from backend.services import metrics
+    from backend.services.mindmap_store import (
+        DATA_DIR,
+        JsonMindMapStore,
+        MindMapError,
+        MindMapNotFound,
+        MindMapStore,
+        SqliteMindMapStore,
+        get_mindmap_store,
+    )
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from config import load_storage_config  # type: ignore
+    from services import metrics  # type: ignore
+    from services.mindmap_store import (  # type: ignore
+        DATA_DIR,
+        JsonMindMapStore,
+        MindMapError,
+        MindMapNotFound,
+        MindMapStore,
+        SqliteMindMapStore,
+        get_mindmap_store,
+    )
+
+logger = logging.getLogger(__name__)
+
+# 原有的单张脑图（/api/mindmap）以该 id 出现在列表中，常驻内存且不可删除
+DEFAULT_MAP_ID = "default"
+MAP_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class MindMapExists(MindMapError):
+    def __init__(self, map_id: str) -> None:
+        super().__init__(f"脑图已存在：{map_id}")
+        self.map_id = map_id
+
+
+@dataclass
+class _Entry:
+    store: MindMapStore
+    leases: int = 0
+    idle: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+def _read_catalog(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8") or "{}")
+    except json.JSONDecodeError:
+        logger.exception("Mindmap catalog %s is corrupted, starting empty", path)
+        return {}
+    return {meta["id"]: meta for meta in data.get("maps", [])}
+
+
+def _write_catalog(path: Path, catalog: Dict[str, Dict[str, Any]]) -> None:
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fp:
+        json.dump({"maps": list(catalog.values())}, fp, ensure_ascii=False, indent=2)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+class MindMapRegistry:
+    """多脑图注册表：按需打开各脑图的存储，最近使用的保留在内存中，超出数量或内存上限时淘汰最久未用的。"""
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        default: MindMapStore,
+        backend: str = "json",
+        max_maps: int = 64,
+        cache_bytes: int = 256 << 20,
+        flush_delay: float = 0.0,
+    ) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.default = default
+        self.backend = backend
+        self.max_maps = max(1, max_maps)
+        self.cache_bytes = cache_bytes
+        self.flush_delay = flush_delay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._catalog_path = root / "catalog.json"
+        self._catalog = _read_catalog(self._catalog_path)
+        self._catalog_lock = asyncio.Lock()
+        # 每张脑图的存储各自持有锁，不同脑图的写入互不阻塞
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._closing: Dict[str, asyncio.Task[None]] = {}
+
+    def exists(self, map_id: str) -> bool:
+        return map_id == DEFAULT_MAP_ID or map_id in self._catalog
+
+    def list_maps(self) -> list[Dict[str, Any]]:
+        maps = [{"id": DEFAULT_MAP_ID, "title": "默认脑图", "createdAt": None, "loaded": True}]
+        maps.extend({**meta, "loaded": map_id in self._entries} for map_id, meta in self._catalog.items())
+        return maps
+
+    async def create(self, title: str, map_id: Optional[str] = None) -> Dict[str, Any]:
+        map_id = map_id or uuid.uuid4().hex[:12]
+        if not MAP_ID_PATTERN.match(map_id):
+            raise ValueError(f"脑图 id 只能包含字母、数字、下划线和连字符：{map_id}")
+        async with self._catalog_lock:
+            if self.exists(map_id):
+                raise MindMapExists(map_id)
+            meta = {"id": map_id, "title": title, "createdAt": datetime.utcnow().isoformat() + "Z"}
+            catalog = {**self._catalog, map_id: meta}
+            await asyncio.to_thread(self._create_files, map_id, catalog)
+            self._catalog = catalog
+        logger.info("Created mindmap id=%s", map_id)
+        return meta
+
+    async def delete(self, map_id: str, *, release: Optional[Callable[[MindMapStore], None]] = None) -> None:
+        """删除脑图；release 用于通知长连接等长期持有租约的使用方尽快释放。"""
+        if map_id == DEFAULT_MAP_ID:
+            raise ValueError("默认脑图不能删除")
+        async with self._catalog_lock:
+            if map_id not in self._catalog:
+                raise MindMapNotFound(map_id)
+            catalog = {key: meta for key, meta in self._catalog.items() if key != map_id}
+            await asyncio.to_thread(_write_catalog, self._catalog_path, catalog)
+            self._catalog = catalog
+        # 已从目录移除，不会再有新的租约；等进行中的请求结束后再关闭并删除文件
+        entry = self._entries.pop(map_id, None)
+        if entry is not None:
+            if release is not None:
+                release(entry.store)
+            if entry.leases:
+                await entry.idle.wait()
+            await entry.store.close()
+        closing = self._closing.get(map_id)
+        if closing is not None:
+            await asyncio.shield(closing)
+        await asyncio.to_thread(self._remove_files, map_id)
+        logger.info("Deleted mindmap id=%s", map_id)
+
+    @asynccontextmanager
+    async def lease(self, map_id: str) -> AsyncIterator[MindMapStore]:
+        """在请求期间借出脑图存储；借出中的脑图不会被淘汰。"""
+        if map_id == DEFAULT_MAP_ID:
+            yield self.default
+            return
+        entry = await self._acquire(map_id)
+        try:
+            yield entry.store
+        finally:
+            entry.leases -= 1
+            if not entry.leases:
+                entry.idle.set()
+            self._evict()
+
+    def memory_bytes(self) -> int:
+        return sum(entry.store.memory_bytes() for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "maps": len(self._catalog) + 1,
+            "loaded": len(self._entries),
+            "memoryBytes": self.memory_bytes(),
+            "maxMaps": self.max_maps,
+            "cacheBytes": self.cache_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    async def close(self) -> None:
+        entries = list(self._entries.values())
+        self._entries.clear()
+        await asyncio.gather(*(entry.store.close() for entry in entries), *self._closing.values())
+
+    async def _acquire(self, map_id: str) -> _Entry:
+        # 刚被淘汰的脑图可能还在落盘，等它关闭后再重新打开，避免读到旧文件
+        while (closing := self._closing.get(map_id)) is not None:
+            await asyncio.shield(closing)
+        if map_id not in self._catalog:
+            raise MindMapNotFound(map_id)
+        entry = self._entries.get(map_id)
+        if entry is None:
+            self.misses += 1
+            entry = self._entries[map_id] = _Entry(self._open(map_id))
+        else:
+            self.hits += 1
+            self._entries.move_to_end(map_id)
+        entry.leases += 1
+        entry.idle.clear()
+        return entry
+
+    def _evict(self) -> None:
+        total = self.memory_bytes()
+        for map_id in list(self._entries):
+            if len(self._entries) <= self.max_maps and total <= self.cache_bytes:
+                break
+            entry = self._entries[map_id]
+            if entry.leases:
+                continue
+            del self._entries[map_id]
+            total -= entry.store.memory_bytes()
+            self.evictions += 1
+            self._closing[map_id] = asyncio.create_task(self._close(map_id, entry.store))
+
+    async def _close(self, map_id: str, store: MindMapStore) -> None:
+        try:
+            await store.close()
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to close evicted mindmap id=%s", map_id)
+        finally:
+            self._closing.pop(map_id, None)
+
+    def _path(self, map_id: str) -> Path:
+        return self.root / (f"{map_id}.sqlite3" if self.backend == "sqlite" else f"{map_id}.json")
+
+    def _open(self, map_id: str) -> MindMapStore:
+        # 存储对象只在首次读写时才加载数据
+        if self.backend == "sqlite":
+            return SqliteMindMapStore(self._path(map_id))
+        return JsonMindMapStore(self._path(map_id), flush_delay=self.flush_delay)
+
+    def _create_files(self, map_id: str, catalog: Dict[str, Dict[str, Any]]) -> None:
+        # 清理上次删除中断时可能残留的同名文件，新脑图总是从空白开始
+        self._remove_files(map_id)
+        _write_catalog(self._catalog_path, catalog)
+
+    def _remove_files(self, map_id: str) -> None:
+        path = self._path(map_id)
+        for candidate in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            candidate.unlink(missing_ok=True)
+
+
+def create_mindmap_registry(config: Optional[Dict[str, Any]] = None) -> MindMapRegistry:
+    config = config if config is not None else load_storage_config()
+    root = Path(config.get("maps_dir") or DATA_DIR / "maps")
+    backend = config.get("backend", "json")
+    logger.info("Using %s storage for mindmaps under %s", backend, root)
+    return MindMapRegistry(
+        root,
+        default=get_mindmap_store(),
+        backend=backend if backend == "sqlite" else "json",
+        max_maps=int(config.get("max_maps") or 64),
+        cache_bytes=int(float(config.get("cache_mb") or 256) * (1 << 20)),
+        flush_delay=float(config.get("flush_delay") or 0),
+    )
+
+
+_registry: MindMapRegistry | None = None
+
+
+def get_mindmap_registry() -> MindMapRegistry:
+    global _registry
+    if _registry is None:
+        _registry = create_mindmap_registry()
+    return _registry
+
+
+async def shutdown_mindmap_registry() -> None:
+    global _registry
+    if _registry is not None:
+        await _registry.close()
+        _registry = None
+
+
+def _cache_levels() -> Dict[tuple[str, ...], float]:
+    if _registry is None:
+        return {}
+    return {("maps",): float(len(_registry._entries)), ("bytes",): float(_registry.memory_bytes())}
+
+
+metrics.REGISTRY.register(
+    metrics.Gauge("mindflow_mindmap_cache", "Mindmaps held in memory and their estimated size", ("kind",), _cache_levels)
+)
@@ -0,0 +1,685 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+try:
+    from backend.config import load_storage_config
+    from backend.services.metrics import MINDMAP_WRITES
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from config import load_storage_config  # type: ignore
+    from services.metrics import MINDMAP_WRITES  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+NODE_FIELDS = ("id", "parentId", "question", "answer", "position", "createdAt", "updatedAt")
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+Encoder = Callable[[int, list[Dict[str, Any]]], bytes]
+# 提交后同步回调（持锁调用，顺序与版本一致）：ops 为 None 表示整图覆盖
+ChangeListener = Callable[[int, Optional[list[Dict[str, Any]]]], None]
+
+
+class MindMapError(Exception):
+    pass
+
+
+class MindMapCorrupted(MindMapError):
+    pass
+
+
+class MindMapConflict(MindMapError):
+    def __init__(self, expected: int, current: int) -> None:
+        super().__init__(f"mindmap 版本冲突：期望 {expected}，当前 {current}")
+        self.expected = expected
+        self.current = current
+
+
+class MindMapOpError(MindMapError, ValueError):
+    pass
+
+
+class MindMapNotFound(MindMapError, LookupError):
+    def __init__(self, map_id: str) -> None:
+        super().__init__(f"脑图不存在：{map_id}")
+        self.map_id = map_id
+
+
+class MindMapStore(ABC):
+    def __init__(self) -> None:
+        self._listeners: list[ChangeListener] = []
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, version: int, ops: Optional[list[Dict[str, Any]]]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(version, ops)
+            except Exception:  # noqa: BLE001
+                logger.exception("Mindmap change listener failed")
+
+    @abstractmethod
+    async def snapshot(self) -> tuple[int, list[Dict[str, Any]]]:
+        ...
+
+    async def current_version(self) -> int:
+        version, _ = await self.snapshot()
+        return version
+
+    async def snapshot_encoded(self, encode: Encoder) -> tuple[int, bytes]:
+        """在线程中把整图直接编码为响应字节；节点写入时已校验过，不再经过 Pydantic。"""
+        version, nodes = await self.snapshot()
+        return version, await asyncio.to_thread(encode, version, nodes)
+
+    @abstractmethod
+    async def node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def subtree(self, node_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    async def ancestors(self, node_id: str) -> Optional[list[Dict[str, Any]]]:
+        """返回从根到父节点的祖先链（不含子节点）；节点不存在时返回 None。"""
+        node = await self.node(node_id)
+        if node is None:
+            return None
+        chain: list[Dict[str, Any]] = []
+        seen = {node_id}
+        while node is not None and node.get("parentId") and node["parentId"] not in seen:
+            seen.add(node["parentId"])
+            node = await self.node(node["parentId"])
+            if node is not None:
+                chain.append({key: value for key, value in node.items() if key != "children"})
+        chain.reverse()
+        return chain
+
+    @abstractmethod
+    async def replace(self, nodes: list[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        ...
+
+    @abstractmethod
+    async def apply(self, ops: Iterable[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        ...
+
+    def memory_bytes(self) -> int:
+        """常驻内存的估算大小，供多脑图 LRU 按内存淘汰。"""
+        return 0
+
+    async def close(self) -> None:
+        return None
+
+
+def _check_version(expected_version: Optional[int], current: int) -> None:
+    if expected_version is not None and expected_version != current:
+        raise MindMapConflict(expected_version, current)
+
+
+def _read_json_file(path: Path) -> tuple[int, list[Dict[str, Any]]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8") or "[]")
+    except json.JSONDecodeError as exc:
+        raise MindMapCorrupted(str(exc)) from exc
+    # 兼容旧格式：纯节点数组，视为版本 0
+    if isinstance(data, list):
+        return 0, data
+    return int(data.get("version", 0)), data.get("nodes", [])
+
+
+class JsonMindMapStore(MindMapStore):
+    def __init__(self, path: Path, *, flush_delay: float = 0.0) -> None:
+        super().__init__()
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self.path.write_text("[]", encoding="utf-8")
+        self.version = 0
+        self.flush_delay = flush_delay
+        self._roots: list[Dict[str, Any]] = []
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._size = 0
+        self._lock = asyncio.Lock()
+        # 延迟写盘时尚未落盘的增量批次；回滚时从磁盘重新加载后按序重放
+        self._journal: list[list[Dict[str, Any]]] = []
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+    async def snapshot(self) -> tuple[int, list[Dict[str, Any]]]:
+        async with self._lock:
+            await self._ensure_loaded()
+            return self.version, self._roots
+
+    async def current_version(self) -> int:
+        async with self._lock:
+            await self._ensure_loaded()
+            return self.version
+
+    async def snapshot_encoded(self, encode: Encoder) -> tuple[int, bytes]:
+        # 持锁编码：写操作同样持锁，线程中遍历 _roots 时不会被并发修改
+        async with self._lock:
+            await self._ensure_loaded()
+            return self.version, await asyncio.to_thread(encode, self.version, self._roots)
+
+    async def node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        return await self.subtree(node_id)
+
+    async def subtree(self, node_id: str) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            await self._ensure_loaded()
+            return self._index.get(node_id)
+
+    async def replace(self, nodes: list[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        async with self._lock:
+            try:
+                await self._ensure_loaded()
+            except MindMapCorrupted:
+                # 整体覆盖可以修复损坏的文件，但无法校验版本
+                if expected_version is not None:
+                    raise
+                logger.warning("Overwriting corrupted mindmap file %s", self.path)
+            _check_version(expected_version, self.version)
+            self._roots = nodes
+            self._reindex()
+            self.version += 1
+            await self._flush("replace")
+            self._notify(self.version, None)
+            return self.version
+
+    async def apply(self, ops: Iterable[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        ops = list(ops)
+        async with self._lock:
+            await self._ensure_loaded()
+            _check_version(expected_version, self.version)
+            applied = 0
+            try:
+                for op in ops:
+                    self._apply_op(op)
+                    applied += 1
+            except Exception:
+                # 批量操作要么全部生效要么全部放弃：从磁盘重新加载并重放未落盘的批次，回到上一个已提交的版本
+                logger.warning("Rolling back mindmap patch after %s ops", applied)
+                self._loaded = False
+                raise
+            self.version += 1
+            if self.flush_delay > 0:
+                self._journal.append(ops)
+                self._schedule_flush()
+            else:
+                await self._flush("apply")
+            self._notify(self.version, ops)
+            logger.info("Applied %s mindmap ops, version=%s", applied, self.version)
+            return self.version
+
+    def memory_bytes(self) -> int:
+        return self._size if self._loaded else 0
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._journal:
+                await self._flush("flush")
+            task, self._flush_task = self._flush_task, None
+        # 写盘已在锁内完成；此时定时任务只可能在休眠或等锁，取消不会打断写盘线程
+        if task is not None:
+            task.cancel()
+
+    def _apply_op(self, op: Dict[str, Any]) -> None:
+        kind = op.get("op")
+        if kind == "upsert":
+            self._upsert(op["node"])
+        elif kind == "move":
+            self._move(self._require(op["id"]), op.get("parentId"), op.get("index"))
+        elif kind == "delete":
+            self._delete(self._require(op["id"]))
+        elif kind == "position":
+            node = self._require(op["id"])
+            node["position"] = op["position"]
+            if op.get("updatedAt"):
+                node["updatedAt"] = op["updatedAt"]
+        else:
+            raise MindMapOpError(f"未知操作类型：{kind}")
+
+    def _upsert(self, data: Dict[str, Any]) -> None:
+        node = self._index.get(data["id"])
+        fields = {key: data[key] for key in NODE_FIELDS if key in data}
+        if node is None:
+            node = {**fields, "children": []}
+            parent_id = node.get("parentId")
+            siblings = self._require(parent_id)["children"] if parent_id else self._roots
+            siblings.append(node)
+            self._index[node["id"]] = node
+            return
+        parent_id = fields.pop("parentId", node.get("parentId"))
+        node.update(fields)
+        if parent_id != node.get("parentId"):
+            self._move(node, parent_id, None)
+
+    def _move(self, node: Dict[str, Any], parent_id: Optional[str], index: Optional[int]) -> None:
+        parent = self._require(parent_id) if parent_id else None
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor is node:
+                raise MindMapOpError(f"不能把节点 {node['id']} 移动到自己的子树下")
+            ancestor = self._index.get(ancestor.get("parentId") or "")
+        self._siblings_of(node).remove(node)
+        node["parentId"] = parent_id
+        siblings = parent["children"] if parent is not None else self._roots
+        siblings.insert(len(siblings) if index is None else index, node)
+
+    def _delete(self, node: Dict[str, Any]) -> None:
+        self._siblings_of(node).remove(node)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._index.pop(current["id"], None)
+            stack.extend(current.get("children", []))
+
+    def _siblings_of(self, node: Dict[str, Any]) -> list[Dict[str, Any]]:
+        parent_id = node.get("parentId")
+        return self._index[parent_id]["children"] if parent_id else self._roots
+
+    def _require(self, node_id: Optional[str]) -> Dict[str, Any]:
+        node = self._index.get(node_id or "")
+        if node is None:
+            raise MindMapOpError(f"节点不存在：{node_id}")
+        return node
+
+    def _reindex(self) -> None:
+        self._index = {}
+        stack = list(self._roots)
+        while stack:
+            node = stack.pop()
+            node.setdefault("children", [])
+            self._index[node["id"]] = node
+            stack.extend(node["children"])
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self.version, self._roots = await asyncio.to_thread(_read_json_file, self.path)
+        self._size = self.path.stat().st_size
+        self._reindex()
+        for batch in self._journal:
+            for op in batch:
+                self._apply_op(op)
+        self.version += len(self._journal)
+        self._loaded = True
+
+    def _schedule_flush(self) -> None:
+        # 延迟窗口内的多次增量修改合并为一次写盘
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        async with self._lock:
+            self._flush_task = None
+            if not self._journal:
+                return
+            try:
+                await self._flush("flush")
+            except OSError:
+                # 保留未落盘的批次，下一次修改时重试
+                logger.exception("Failed to flush mindmap %s", self.path)
+
+    async def _flush(self, op: str) -> None:
+        # 调用方持有锁，序列化与写盘放到线程中执行也不会与修改并发
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write, self.version, self._roots)
+        self._journal = []
+        MINDMAP_WRITES.observe(time.perf_counter() - started, "json", op)
+
+    def _write(self, version: int, roots: list[Dict[str, Any]]) -> None:
+        payload = json.dumps({"version": version, "nodes": roots}, ensure_ascii=False)
+        self._size = len(payload)
+        # 先写临时文件再原子替换，进程中途崩溃也不会留下半截 JSON
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            fp.write(payload)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, self.path)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    sort_order INTEGER NOT NULL DEFAULT 0,
+    question TEXT NOT NULL,
+    answer TEXT,
+    x REAL NOT NULL DEFAULT 0,
+    y REAL NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_parent ON nodes (parent_id, sort_order);
+"""
+
+_SUBTREE_SQL = """
+WITH RECURSIVE subtree(id) AS (
+    SELECT id FROM nodes WHERE id = ?
+    UNION ALL
+    SELECT nodes.id FROM nodes JOIN subtree ON nodes.parent_id = subtree.id
+)
+"""
+
+_ANCESTORS_SQL = """
+WITH RECURSIVE ancestors(id, parent, depth) AS (
+    SELECT id, parent_id, 0 FROM nodes WHERE id = ?
+    UNION ALL
+    SELECT nodes.id, nodes.parent_id, ancestors.depth + 1 FROM nodes JOIN ancestors ON nodes.id = ancestors.parent
+    WHERE ancestors.depth < 10000
+)
+"""
+
+_NODE_COLUMNS = "id, parent_id, sort_order, question, answer, x, y, created_at, updated_at"
+
+
+def _row_to_node(row: tuple[Any, ...]) -> Dict[str, Any]:
+    return {
+        "id": row[0],
+        "parentId": row[1],
+        "question": row[3],
+        "answer": row[4],
+        "position": {"x": row[5], "y": row[6]},
+        "createdAt": row[7],
+        "updatedAt": row[8],
+        "children": [],
+    }
+
+
+def _assemble(rows: Iterable[tuple[Any, ...]], root_id: Optional[str] = None) -> list[Dict[str, Any]]:
+    # rows 按 (parent_id, sort_order) 排序，一次遍历即可还原树结构
+    nodes = [_row_to_node(row) for row in rows]
+    index = {node["id"]: node for node in nodes}
+    roots: list[Dict[str, Any]] = []
+    for node in nodes:
+        parent = index.get(node["parentId"] or "")
+        if node["id"] == root_id or parent is None:
+            roots.append(node)
+        else:
+            parent["children"].append(node)
+    return roots
+
+
+class SqliteMindMapStore(MindMapStore):
+    def __init__(self, path: Path, *, legacy_json: Optional[Path] = None) -> None:
+        super().__init__()
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._lock = asyncio.Lock()
+        if legacy_json is not None:
+            self._migrate_json(legacy_json)
+
+    async def snapshot(self) -> tuple[int, list[Dict[str, Any]]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._run, self._snapshot)
+
+    async def current_version(self) -> int:
+        async with self._lock:
+            return await asyncio.to_thread(self._run, self._version)
+
+    async def snapshot_encoded(self, encode: Encoder) -> tuple[int, bytes]:
+        def run() -> tuple[int, bytes]:
+            version, nodes = self._snapshot()
+            return version, encode(version, nodes)
+
+        async with self._lock:
+            return await asyncio.to_thread(self._run, run)
+
+    async def node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            row = await asyncio.to_thread(self._run, self._node, node_id)
+        return _row_to_node(row) if row else None
+
+    async def subtree(self, node_id: str) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            roots = await asyncio.to_thread(self._run, self._subtree, node_id)
+        return roots[0] if roots else None
+
+    async def ancestors(self, node_id: str) -> Optional[list[Dict[str, Any]]]:
+        # 一次递归查询取回整条祖先链
+        async with self._lock:
+            rows = await asyncio.to_thread(self._run, self._ancestors, node_id)
+        if not rows:
+            return None
+        chain = [_row_to_node(row) for row in reversed(rows[1:])]
+        for node in chain:
+            del node["children"]
+        return chain
+
+    async def replace(self, nodes: list[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        async with self._lock:
+            started = time.perf_counter()
+            version = await asyncio.to_thread(self._transaction, self._replace, nodes, expected_version)
+            self._notify(version, None)
+        MINDMAP_WRITES.observe(time.perf_counter() - started, "sqlite", "replace")
+        return version
+
+    async def apply(self, ops: Iterable[Dict[str, Any]], expected_version: Optional[int] = None) -> int:
+        ops = list(ops)
+        async with self._lock:
+            started = time.perf_counter()
+            version = await asyncio.to_thread(self._transaction, self._apply_ops, ops, expected_version)
+            self._notify(version, ops)
+        MINDMAP_WRITES.observe(time.perf_counter() - started, "sqlite", "apply")
+        logger.info("Applied %s mindmap ops, version=%s", len(ops), version)
+        return version
+
+    async def close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+
+    def _run(self, func: Any, *args: Any) -> Any:
+        with self._db_lock:
+            return func(*args)
+
+    def _transaction(self, func: Any, *args: Any) -> Any:
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def _version(self) -> int:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_version(self, expected_version: Optional[int]) -> int:
+        current = self._version()
+        _check_version(expected_version, current)
+        version = current + 1
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(version),))
+        return version
+
+    def _snapshot(self) -> tuple[int, list[Dict[str, Any]]]:
+        rows = self._db.execute(f"SELECT {_NODE_COLUMNS} FROM nodes ORDER BY parent_id, sort_order")
+        return self._version(), _assemble(rows)
+
+    def _node(self, node_id: str) -> Optional[tuple[Any, ...]]:
+        return self._db.execute(f"SELECT {_NODE_COLUMNS} FROM nodes WHERE id = ?", (node_id,)).fetchone()
+
+    def _subtree(self, node_id: str) -> list[Dict[str, Any]]:
+        rows = self._db.execute(
+            f"{_SUBTREE_SQL} SELECT {_NODE_COLUMNS} FROM nodes WHERE id IN (SELECT id FROM subtree) "
+            "ORDER BY parent_id, sort_order",
+            (node_id,),
+        )
+        return _assemble(rows, root_id=node_id)
+
+    def _ancestors(self, node_id: str) -> list[tuple[Any, ...]]:
+        # 由近及远：第一行是节点自身，其后依次是父节点、祖父节点……
+        return self._db.execute(
+            f"{_ANCESTORS_SQL} SELECT {_NODE_COLUMNS} FROM nodes JOIN ancestors USING (id) ORDER BY ancestors.depth",
+            (node_id,),
+        ).fetchall()
+
+    def _replace(self, nodes: list[Dict[str, Any]], expected_version: Optional[int]) -> int:
+        version = self._bump_version(expected_version)
+        self._db.execute("DELETE FROM nodes")
+        self._insert_tree(nodes)
+        return version
+
+    def _insert_tree(self, nodes: list[Dict[str, Any]]) -> None:
+        rows = []
+        stack = [(node, None, order) for order, node in enumerate(nodes)]
+        while stack:
+            node, parent_id, order = stack.pop()
+            position = node.get("position") or {}
+            rows.append((
+                node["id"], parent_id, order, node["question"], node.get("answer"),
+                position.get("x", 0), position.get("y", 0), node["createdAt"], node["updatedAt"],
+            ))
+            stack.extend((child, node["id"], index) for index, child in enumerate(node.get("children") or []))
+        self._db.executemany(f"INSERT OR REPLACE INTO nodes ({_NODE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _apply_ops(self, ops: list[Dict[str, Any]], expected_version: Optional[int]) -> int:
+        version = self._bump_version(expected_version)
+        for op in ops:
+            kind = op.get("op")
+            if kind == "upsert":
+                self._upsert(op["node"])
+            elif kind == "move":
+                self._move(op["id"], op.get("parentId"), op.get("index"))
+            elif kind == "delete":
+                self._require(op["id"])
+                self._db.execute(f"{_SUBTREE_SQL} DELETE FROM nodes WHERE id IN (SELECT id FROM subtree)", (op["id"],))
+            elif kind == "position":
+                self._require(op["id"])
+                position = op["position"]
+                self._db.execute(
+                    "UPDATE nodes SET x = ?, y = ?, updated_at = COALESCE(?, updated_at) WHERE id = ?",
+                    (position["x"], position["y"], op.get("updatedAt"), op["id"]),
+                )
+            else:
+                raise MindMapOpError(f"未知操作类型：{kind}")
+        return version
+
+    def _upsert(self, data: Dict[str, Any]) -> None:
+        row = self._db.execute("SELECT parent_id, answer FROM nodes WHERE id = ?", (data["id"],)).fetchone()
+        position = data.get("position") or {}
+        if row is None:
+            parent_id = data.get("parentId")
+            if parent_id:
+                self._require(parent_id)
+            self._db.execute(
+                f"INSERT INTO nodes ({_NODE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    data["id"], parent_id, self._next_order(parent_id), data["question"], data.get("answer"),
+                    position.get("x", 0), position.get("y", 0), data["createdAt"], data["updatedAt"],
+                ),
+            )
+            return
+        self._db.execute(
+            "UPDATE nodes SET question = ?, answer = ?, x = ?, y = ?, created_at = ?, updated_at = ? WHERE id = ?",
+            (
+                # 与 JSON 存储一致：未给出的 answer 保持原值
+                data["question"], data.get("answer", row[1]), position.get("x", 0), position.get("y", 0),
+                data["createdAt"], data["updatedAt"], data["id"],
+            ),
+        )
+        if "parentId" in data and data["parentId"] != row[0]:
+            self._move(data["id"], data["parentId"], None)
+
+    def _move(self, node_id: str, parent_id: Optional[str], index: Optional[int]) -> None:
+        self._require(node_id)
+        if parent_id:
+            self._require(parent_id)
+            cycle = self._db.execute(
+                f"{_SUBTREE_SQL} SELECT 1 FROM subtree WHERE id = ?", (node_id, parent_id)
+            ).fetchone()
+            if cycle:
+                raise MindMapOpError(f"不能把节点 {node_id} 移动到自己的子树下")
+        if index is None:
+            order = self._next_order(parent_id)
+        else:
+            order = index
+            self._db.execute(
+                "UPDATE nodes SET sort_order = sort_order + 1 WHERE parent_id IS ? AND sort_order >= ?",
+                (parent_id, index),
+            )
+        self._db.execute("UPDATE nodes SET parent_id = ?, sort_order = ? WHERE id = ?", (parent_id, order, node_id))
+
+    def _next_order(self, parent_id: Optional[str]) -> int:
+        row = self._db.execute("SELECT MAX(sort_order) FROM nodes WHERE parent_id IS ?", (parent_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _require(self, node_id: str) -> None:
+        if self._db.execute("SELECT 1 FROM nodes WHERE id = ?", (node_id,)).fetchone() is None:
+            raise MindMapOpError(f"节点不存在：{node_id}")
+
+    def _migrate_json(self, legacy_json: Path) -> None:
+        with self._db_lock:
+            if self._db.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return
+            if not legacy_json.exists():
+                return
+            version, nodes = _read_json_file(legacy_json)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM nodes")
+                self._insert_tree(nodes)
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(version),))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (str(legacy_json),)
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        logger.info("Migrated mindmap %s into %s (version=%s)", legacy_json.name, self.path.name, version)
+
+
+def create_mindmap_store(config: Optional[Dict[str, Any]] = None) -> MindMapStore:
+    config = config if config is not None else load_storage_config()
+    backend = config.get("backend", "json")
+    json_path = DATA_DIR / "mindmap.json"
+    if backend == "sqlite":
+        path = Path(config.get("path") or DATA_DIR / "mindmap.sqlite3")
+        logger.info("Using SQLite mindmap storage at %s", path)
+        return SqliteMindMapStore(path, legacy_json=json_path)
+    if backend != "json":
+        logger.warning("Unknown storage backend '%s', falling back to json", backend)
+    path = Path(config.get("path") or json_path)
+    logger.info("Using JSON mindmap storage at %s", path)
+    return JsonMindMapStore(path, flush_delay=float(config.get("flush_delay") or 0))
+
+
+_store: MindMapStore | None = None
+
+
+def get_mindmap_store() -> MindMapStore:
+    global _store
+    if _store is None:
+        _store = create_mindmap_store()
+    return _store
+
+
+async def shutdown_mindmap_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import weakref
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+try:
+    from backend.services.encoding import dumps_json
+    from backend.services.mindmap_store import MindMapOpError, MindMapStore
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.encoding import dumps_json  # type: ignore
+    from services.mindmap_store import MindMapOpError, MindMapStore  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# 保留最近的变更事件，断线重连的客户端凭版本号续传
+BACKLOG = 1000
+# 每个订阅者最多积压的消息数，超出说明客户端消费过慢，断开让它重连续传
+QUEUE_SIZE = 256
+# 拖动产生的位置更新在该时间窗口内合并为一次提交与广播
+POSITION_COALESCE_SECONDS = 0.1
+
+# 当前提交来自哪个客户端，随变更事件广播，客户端据此忽略自己的回显
+current_origin: ContextVar[Optional[str]] = ContextVar("mindmap_origin", default=None)
+
+
+def _message(event: Dict[str, Any]) -> str:
+    return dumps_json(event).decode("utf-8")
+
+
+class Subscriber:
+    def __init__(self, client_id: str) -> None:
+        self.client_id = client_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+        self.closing = False
+
+
+class SyncChannel:
+    """单张脑图的推送通道：把提交后的节点级变更广播给所有订阅者，并合并高频的位置更新。"""
+
+    def __init__(
+        self, version: int = 0, *, backlog: int = BACKLOG, coalesce: float = POSITION_COALESCE_SECONDS
+    ) -> None:
+        self.version = version
+        self.coalesce = coalesce
+        self._backlog: deque[tuple[int, str]] = deque(maxlen=backlog)
+        self._subscribers: set[Subscriber] = set()
+        self._positions: Dict[str, Dict[str, Any]] = {}
+        self._position_origins: set[Optional[str]] = set()
+        self._flush_task: Optional[asyncio.Task[None]] = None
+        self.ready = asyncio.Event()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def on_change(self, version: int, ops: Optional[list[Dict[str, Any]]]) -> None:
+        if ops is None:
+            # 整图覆盖无法增量表达，客户端收到后重新拉取
+            event: Dict[str, Any] = {"type": "reset", "version": version}
+        else:
+            event = {"type": "ops", "version": version, "ops": ops, "origin": current_origin.get()}
+        message = _message(event)
+        self.version = version
+        self._backlog.append((version, message))
+        for subscriber in list(self._subscribers):
+            self.send(subscriber, message)
+
+    def subscribe(self, client_id: str, since: Optional[int]) -> tuple[Subscriber, list[str]]:
+        """登记订阅者并返回需要补发的消息；登记与取补发内容之间没有 await，不会漏掉事件。"""
+        subscriber = Subscriber(client_id)
+        self._subscribers.add(subscriber)
+        if since is None:
+            return subscriber, [_message({"type": "hello", "version": self.version})]
+        if since == self.version:
+            return subscriber, []
+        missed = [(version, message) for version, message in self._backlog if version > since]
+        # 版本号逐次递增，补发内容必须恰好覆盖 since+1..当前版本，否则只能让客户端整图重拉
+        if since < self.version and len(missed) == self.version - since and missed[0][0] == since + 1:
+            return subscriber, [message for _, message in missed]
+        return subscriber, [_message({"type": "reset", "version": self.version})]
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def send(self, subscriber: Subscriber, message: str) -> None:
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            subscriber.overflowed = True
+            self._subscribers.discard(subscriber)
+
+    def close_all(self, event: Dict[str, Any]) -> None:
+        """发送最后一条事件后断开所有订阅者。"""
+        message = _message(event)
+        for subscriber in list(self._subscribers):
+            subscriber.closing = True
+            self.send(subscriber, message)
+        self._subscribers.clear()
+
+    def queue_position(self, store: MindMapStore, op: Dict[str, Any]) -> None:
+        self._positions[op["id"]] = op
+        self._position_origins.add(current_origin.get())
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush(store))
+
+    async def flush_positions(self, store: MindMapStore) -> None:
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            task.cancel()
+        if not self._positions:
+            return
+        ops, origins = list(self._positions.values()), self._position_origins
+        self._positions, self._position_origins = {}, set()
+        token = current_origin.set(next(iter(origins)) if len(origins) == 1 else None)
+        try:
+            await store.apply(ops)
+        except MindMapOpError:
+            # 拖动期间节点可能已被删除：跳过不存在的节点后重试一次
+            remaining = [op for op in ops if await store.node(op["id"]) is not None]
+            if remaining:
+                try:
+                    await store.apply(remaining)
+                except MindMapOpError:
+                    logger.warning("Dropped %s coalesced position updates", len(remaining))
+        finally:
+            current_origin.reset(token)
+
+    async def _delayed_flush(self, store: MindMapStore) -> None:
+        await asyncio.sleep(self.coalesce)
+        self._flush_task = None
+        try:
+            await self.flush_positions(store)
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to flush coalesced position updates")
+
+
+_channels: "weakref.WeakKeyDictionary[MindMapStore, SyncChannel]" = weakref.WeakKeyDictionary()
+
+
+async def get_sync_channel(store: MindMapStore) -> SyncChannel:
+    channel = _channels.get(store)
+    if channel is None:
+        channel = _channels[store] = SyncChannel()
+        # 先挂监听再读版本：读取期间发生的提交已记入 backlog，版本取两者较大值
+        store.add_listener(channel.on_change)
+        try:
+            channel.version = max(channel.version, await store.current_version())
+        finally:
+            channel.ready.set()
+    await channel.ready.wait()
+    return channel
+
+
+def close_sync_channel(store: MindMapStore, event: Dict[str, Any]) -> None:
+    channel = _channels.get(store)
+    if channel is not None:
+        channel.close_all(event)
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional
+
+try:  # 可选依赖：未安装时只提供扁平 JSON
+    import msgpack
+except ModuleNotFoundError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+try:
+    from backend.services.encoding import dumps_json
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.encoding import dumps_json  # type: ignore
+
+TREE_JSON = "application/json"
+FLAT_JSON = "application/vnd.mindflow.flat+json"
+FLAT_MSGPACK = "application/vnd.mindflow.flat+msgpack"
+
+FLAT_FORMAT = "mindflow-flat/1"
+
+# 扁平格式按列存储：先序遍历，parent 为父节点在数组中的下标（根节点为 -1），
+# 因此父节点总在子节点之前，解析时单趟即可重建树并排除环
+FLAT_COLUMNS = ("id", "parent", "question", "answer", "x", "y", "createdAt", "updatedAt")
+
+
+def available_media_types() -> tuple[str, ...]:
+    if msgpack is not None:
+        return (FLAT_MSGPACK, FLAT_JSON, TREE_JSON)
+    return (FLAT_JSON, TREE_JSON)
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    # 只识别显式请求的扁平格式，其余（含 */*）保持原来的嵌套 JSON
+    if not accept:
+        return TREE_JSON
+    best, best_weight = TREE_JSON, 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        media_type = media_type.strip().lower()
+        if media_type not in (FLAT_JSON, FLAT_MSGPACK) or media_type not in available_media_types():
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if weight > best_weight:
+            best, best_weight = media_type, weight
+    return best
+
+
+def flatten_tree(version: int, roots: list[Dict[str, Any]]) -> Dict[str, Any]:
+    columns: Dict[str, list[Any]] = {name: [] for name in FLAT_COLUMNS}
+    stack: list[tuple[Dict[str, Any], int]] = [(node, -1) for node in reversed(roots)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(columns["id"])
+        position = node.get("position") or {}
+        columns["id"].append(node["id"])
+        columns["parent"].append(parent)
+        columns["question"].append(node.get("question", ""))
+        columns["answer"].append(node.get("answer"))
+        columns["x"].append(position.get("x", 0))
+        columns["y"].append(position.get("y", 0))
+        columns["createdAt"].append(node.get("createdAt", ""))
+        columns["updatedAt"].append(node.get("updatedAt", ""))
+        stack.extend((child, index) for child in reversed(node.get("children") or []))
+    return {"format": FLAT_FORMAT, "version": version, "count": len(columns["id"]), **columns}
+
+
+def build_tree(flat: Dict[str, Any]) -> list[Dict[str, Any]]:
+    count = len(flat["id"])
+    for name in FLAT_COLUMNS:
+        if len(flat[name]) != count:
+            raise ValueError(f"列 {name} 的长度 {len(flat[name])} 与 id 数量 {count} 不一致")
+    roots: list[Dict[str, Any]] = []
+    nodes: list[Dict[str, Any]] = []
+    seen: set[str] = set()
+    for index in range(count):
+        node_id = flat["id"][index]
+        if node_id in seen:
+            raise ValueError(f"节点 id 重复：{node_id}")
+        seen.add(node_id)
+        parent = flat["parent"][index]
+        if parent >= index or parent < -1:
+            raise ValueError(f"节点 {node_id} 的 parent 下标 {parent} 无效，父节点必须排在子节点之前")
+        node = {
+            "id": node_id,
+            "parentId": nodes[parent]["id"] if parent >= 0 else None,
+            "question": flat["question"][index],
+            "answer": flat["answer"][index],
+            "position": {"x": flat["x"][index], "y": flat["y"][index]},
+            "createdAt": flat["createdAt"][index],
+            "updatedAt": flat["updatedAt"][index],
+            "children": [],
+        }
+        nodes.append(node)
+        (nodes[parent]["children"] if parent >= 0 else roots).append(node)
+    return roots
+
+
+def encode(media_type: str, version: int, roots: list[Dict[str, Any]]) -> bytes:
+    if media_type == TREE_JSON:
+        return dumps_json({"nodes": roots, "version": version})
+    flat = flatten_tree(version, roots)
+    if media_type == FLAT_MSGPACK:
+        return msgpack.packb(flat, use_bin_type=True)
+    return dumps_json(flat)
+
+
+def decode(media_type: str, body: bytes) -> Any:
+    if media_type == FLAT_MSGPACK:
+        if msgpack is None:
+            raise LookupError("服务端未安装 msgpack")
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
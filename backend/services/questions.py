@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, AsyncIterator
+
+try:
+    from backend.services.ai_client import AIClient, JsonSchema
+    from backend.services.cache import CachePolicy
+    from backend.services.json_stream import JsonArrayStream
+    from backend.services.scheduler import Priority
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.ai_client import AIClient, JsonSchema  # type: ignore
+    from services.cache import CachePolicy  # type: ignore
+    from services.json_stream import JsonArrayStream  # type: ignore
+    from services.scheduler import Priority  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = (
+    "你是一位善于发散的思维导图助手，请根据当前节点生成 {count} 个子问题。"
+    "要求：\n"
+    "1. 子问题要与当前主题紧密相关，但角度互相不同。\n"
+    "2. 每个问题使用简洁的一句话，保持原语言。\n"
+    "3. {output}"
+    "\n\n当前问题：{topic}\n当前回答：{answer}\n"
+)
+
+# 输出格式的说明必须与是否启用结构化输出一致，否则提示词与 schema 互相矛盾
+ARRAY_OUTPUT = '最终只输出 JSON 数组，每个元素形如 {"question": "..."}。'
+OBJECT_OUTPUT = '最终只输出 JSON 对象，形如 {"questions": [{"question": "..."}]}。'
+
+# 结构化输出要求顶层为对象，子问题放在 questions 数组中；解析时两种形式都接受
+QUESTIONS_SCHEMA = JsonSchema(
+    "child_questions",
+    {
+        "type": "object",
+        "properties": {
+            "questions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"question": {"type": "string"}},
+                    "required": ["question"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["questions"],
+        "additionalProperties": False,
+    },
+)
+
+
+async def generate_questions(
+    client: AIClient,
+    topic: str,
+    answer: str | None,
+    count: int,
+    *,
+    cache: CachePolicy = CachePolicy(),
+    strict: bool = False,
+    priority: Priority = Priority.GENERATE,
+) -> list[str]:
+    prompt, schema = _request(client, topic, answer, count)
+    raw = await client.ask(prompt, cache=cache, strict=strict, priority=priority, schema=schema)
+    logger.debug("Raw generation response: %s", raw)
+    return parse_questions(raw, count)
+
+
+async def cached_questions(client: AIClient, topic: str, answer: str | None, count: int) -> list[str] | None:
+    """回答缓存中已有的子问题（包括后台预生成写入的），不调用模型。"""
+    prompt, schema = _request(client, topic, answer, count)
+    raw = await client.cached(prompt, schema=schema)
+    return parse_questions(raw, count) if raw is not None else None
+
+
+async def stream_questions(
+    client: AIClient,
+    topic: str,
+    answer: str | None,
+    count: int,
+    *,
+    cache: CachePolicy = CachePolicy(),
+    priority: Priority = Priority.GENERATE,
+) -> AsyncIterator[str]:
+    """边接收模型输出边解析，每个子问题完整后立即产出。"""
+    prompt, schema = _request(client, topic, answer, count)
+    parser = JsonArrayStream()
+    parts: list[str] = []
+    emitted = 0
+    async for delta in client.ask_stream(prompt, cache=cache, priority=priority, schema=schema):
+        parts.append(delta)
+        for item in parser.feed(delta):
+            question = _question_text(item)
+            if question and emitted < count:
+                emitted += 1
+                yield question
+    if not emitted:
+        # 没有解析出任何 JSON 元素（如回声模式），整段输出按行拆分兜底
+        for question in parse_questions("".join(parts), count):
+            yield question
+
+
+def _request(client: AIClient, topic: str, answer: str | None, count: int) -> tuple[str, JsonSchema | None]:
+    schema = QUESTIONS_SCHEMA if client.settings.structured_output else None
+    output = OBJECT_OUTPUT if schema is not None else ARRAY_OUTPUT
+    # 去掉首尾空白，同一节点无论来自预生成还是 /generate 都得到相同的提示词与缓存键
+    answer = (answer or "").strip() or "暂无"
+    return PROMPT_TEMPLATE.format(count=count, topic=topic.strip(), answer=answer, output=output), schema
+
+
+def _question_text(item: Any) -> str:
+    if isinstance(item, dict):
+        item = item.get("question")
+    return item.strip() if isinstance(item, str) else ""
+
+
+def parse_questions(raw: str, count: int) -> list[str]:
+    questions = [question for question in map(_question_text, JsonArrayStream().feed(raw)) if question]
+    if not questions:
+        logger.warning("Failed to parse generation response, fallback to line split")
+        for line in raw.splitlines():
+            line = line.strip("-*  \t")
+            if line:
+                questions.append(line)
+    if len(questions) > count:
+        questions = questions[:count]
+    return questions
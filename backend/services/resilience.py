@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 上游限流或临时不可用时值得重试；4xx 等请求本身的问题重试也没有意义
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} 暂时不可用（熔断中，约 {retry_in:.0f} 秒后重试）")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    # 连接失败、超时、连接被重置等传输层错误
+    return isinstance(exc, httpx.TransportError)
+
+
+def retry_after_hint(exc: BaseException) -> Optional[float]:
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却期内直接失败；冷却结束放行一个探测请求（half-open）。"""
+
+    def __init__(self, name: str, *, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats: Dict[str, int] = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def check(self) -> None:
+        # 仅判断是否处于冷却期，调用方据此在排队之前快速失败
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, remaining)
+
+    def allow(self) -> None:
+        self.check()
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            self.state = "half_open"
+            logger.info("Circuit %s half-open, probing", self.name)
+        if self._probing:
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.reset_timeout)
+        self._probing = True
+
+    def release(self) -> None:
+        # 请求未真正到达上游（如排队失败），归还探测名额但不计成败
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._stats["successes"] += 1
+        self._failures = 0
+        self._probing = False
+        if self.state != "closed":
+            logger.info("Circuit %s closed", self.name)
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self._stats["failures"] += 1
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self._stats["opened"] += 1
+                logger.warning("Circuit %s opened after %s failures", self.name, self._failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "state": self.state, "consecutive_failures": self._failures, **self._stats}
+
+
+class RetryPolicy:
+    def __init__(self, *, attempts: int, base_delay: float, max_delay: float) -> None:
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        if hint is not None:
+            return min(hint, self.max_delay)
+        # full jitter：在 [0, base * 2^attempt] 内随机，避免所有请求同时重试
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, breaker: CircuitBreaker, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            breaker.allow()
+            try:
+                result = await call()
+            except Exception as exc:  # noqa: BLE001
+                if not is_retryable(exc):
+                    # 请求本身有问题，不代表上游不健康
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.attempts or breaker.state == "open":
+                    raise
+                delay = self.delay(attempt - 1, retry_after_hint(exc))
+                logger.warning(
+                    "Provider %s attempt %s failed (%s), retrying in %.2fs", breaker.name, attempt, exc, delay
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    GENERATE = 1
+    SUMMARY = 2
+    BACKGROUND = 3
+
+
+class SchedulerOverloaded(Exception):
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class SchedulerTimeout(SchedulerOverloaded):
+    status_code = 503
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "enqueued_at")
+
+    def __init__(self, priority: Priority, seq: int, future: asyncio.Future[None]) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+# 每个 provider 一个调度器：限制同时在途的模型调用数，超出的请求按优先级排队；
+# 队列满时优先挤掉排在最后的低优先级请求，排队超时返回 503
+class ProviderScheduler:
+    def __init__(self, name: str, *, concurrency: int, max_queue: int, queue_timeout: float) -> None:
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._service_time = 1.0
+        self._stats: Dict[str, Dict[str, float]] = {
+            priority.name.lower(): {"admitted": 0, "rejected": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in Priority
+        }
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, *, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        await self._acquire(priority, self.queue_timeout if timeout is None else timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # 指数滑动平均的服务时间，用来估算 Retry-After
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def queue_length(self) -> int:
+        return sum(1 for waiter in self._queue if not waiter.future.done())
+
+    def waiting(self, more_urgent_than: Priority) -> int:
+        """排队中优先级高于给定级别的请求数，后台任务据此判断是否该让出模型。"""
+        return sum(1 for waiter in self._queue if not waiter.future.done() and waiter.priority < more_urgent_than)
+
+    def queued(self, priority: Priority) -> int:
+        """排队中该优先级的请求数。"""
+        return sum(1 for waiter in self._queue if not waiter.future.done() and waiter.priority == priority)
+
+    def stats(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {priority.name.lower(): 0 for priority in Priority}
+        for waiter in self._queue:
+            if not waiter.future.done():
+                queued[waiter.priority.name.lower()] += 1
+        classes = {}
+        for name, stat in self._stats.items():
+            admitted = stat["admitted"]
+            classes[name] = {
+                **stat,
+                "queued": queued[name],
+                "wait_avg": round(stat["wait_total"] / admitted, 4) if admitted else 0.0,
+            }
+        return {
+            "provider": self.name,
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queue_length": sum(queued.values()),
+            "max_queue": self.max_queue,
+            "service_time_avg": round(self._service_time, 4),
+            "classes": classes,
+        }
+
+    def _retry_after(self) -> float:
+        return self._service_time * (self.queue_length() + 1) / self.concurrency
+
+    async def _acquire(self, priority: Priority, timeout: float) -> None:
+        stat = self._stats[priority.name.lower()]
+        if self._active < self.concurrency and not self.queue_length():
+            self._active += 1
+            stat["admitted"] += 1
+            return
+        if self.queue_length() >= self.max_queue:
+            self._make_room(priority)
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # 超时与被唤醒同时发生：已经拿到 slot，直接使用
+                pass
+            else:
+                waiter.future.cancel()
+                stat["timeouts"] += 1
+                logger.warning("Scheduler %s queue timeout priority=%s", self.name, priority.name)
+                raise SchedulerTimeout(f"{self.name} 排队超时，请稍后重试", self._retry_after())
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._release()
+            else:
+                waiter.future.cancel()
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        stat["admitted"] += 1
+        stat["wait_total"] += waited
+        stat["wait_max"] = max(stat["wait_max"], waited)
+
+    def _make_room(self, priority: Priority) -> None:
+        pending = [waiter for waiter in self._queue if not waiter.future.done()]
+        victim = max(pending, default=None)
+        if victim is None or victim.priority <= priority:
+            self._stats[priority.name.lower()]["rejected"] += 1
+            logger.warning("Scheduler %s queue full, rejecting priority=%s", self.name, priority.name)
+            raise SchedulerOverloaded(f"{self.name} 请求队列已满，请稍后重试", self._retry_after())
+        self._stats[victim.priority.name.lower()]["rejected"] += 1
+        logger.warning("Scheduler %s queue full, evicting priority=%s", self.name, victim.priority.name)
+        victim.future.set_exception(SchedulerOverloaded(f"{self.name} 请求队列已满，请稍后重试", self._retry_after()))
+
+    def _release(self) -> None:
+        # slot 直接移交给优先级最高的等待者，_active 保持不变
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self._active -= 1
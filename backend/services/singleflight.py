@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task[T]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+# 相同 key 的并发调用只执行一次：首个调用者启动独立任务，其余调用者等待同一结果。
+# 任务不绑定在任何一个请求上，发起者断开也不会影响其他等待者；所有等待者都离开后才取消。
+class SingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call[T]] = {}
+        self._stats: Dict[str, int] = {"leaders": 0, "followers": 0, "abandoned": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["followers"] += 1
+            logger.debug("Joined in-flight call key=%s waiters=%s", key[:12], call.waiters + 1)
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+                self._stats["abandoned"] += 1
+                logger.info("Cancelled in-flight call key=%s, no waiters left", key[:12])
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": len(self._calls)}
+
+    def _forget(self, key: str, call: _Call[T]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    from backend.services import metrics
+    from backend.services.ai_client import AIClient, AISettings, get_ai_client
+    from backend.services.cache import CachePolicy
+    from backend.services.questions import cached_questions, generate_questions
+    from backend.services.scheduler import Priority
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services import metrics  # type: ignore
+    from services.ai_client import AIClient, AISettings, get_ai_client  # type: ignore
+    from services.cache import CachePolicy  # type: ignore
+    from services.questions import cached_questions, generate_questions  # type: ignore
+    from services.scheduler import Priority  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# generate(topic, answer, count, priority) -> 子问题列表；结果由 AIClient 写入回答缓存
+Generator = Callable[[str, str, int, Priority], Awaitable[list[Any]]]
+# cached(topic, answer, count) -> 回答缓存中的子问题，未命中返回 None
+CacheReader = Callable[[str, str, int], Awaitable[Optional[list[Any]]]]
+
+# 预生成前已查过缓存，只需写入；之后 /generate 以相同提示词直接命中
+BACKGROUND_CACHE = CachePolicy(read=False, write=True)
+
+# 运行中的预生成每隔这么久检查一次是否有交互请求在排队
+BUSY_POLL_SECONDS = 0.05
+
+SPECULATION = metrics.REGISTRY.register(
+    metrics.Counter("mindflow_speculation_total", "Speculative child-question generations by outcome", ("outcome",))
+)
+
+
+def speculation_key(topic: str, answer: str) -> str:
+    return hashlib.sha256(f"{topic.strip()}\0{answer.strip()}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Job:
+    key: str
+    topic: str
+    answer: str
+    task: Optional[asyncio.Task[list[Any]]] = None
+    # 已有用户在等待该结果，不再因交互请求排队而取消
+    claimed: bool = False
+    # 开始前用户已自行生成，预生成不再有意义
+    superseded: bool = False
+
+
+class Speculator:
+    """问答完成后在后台预生成子问题：队列有界，有交互请求排队时让出模型，并统计命中率。
+    结果存放在回答缓存中，这里只负责排队、让出与等待进行中的预生成。"""
+
+    def __init__(
+        self,
+        generate: Generator,
+        cached: CacheReader,
+        busy: Callable[[], bool],
+        queued: Callable[[], bool],
+        settings: Callable[[], AISettings],
+    ) -> None:
+        self._generate = generate
+        self._cached = cached
+        self._busy = busy
+        self._queued = queued
+        # 每次使用时读取，配置热加载后数量、队列上限等立即生效
+        self._settings = settings
+        # 不设 maxsize：排队上限在 submit 时按当前配置检查
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue()
+        self._jobs: Dict[str, _Job] = {}
+        self._worker: Optional[asyncio.Task[None]] = None
+        self._counts: Dict[str, int] = {}
+
+    def submit(self, topic: str, answer: str) -> bool:
+        """登记一次预生成；重复、队列已满或模型正忙时直接放弃，不影响调用方。"""
+        key = speculation_key(topic, answer)
+        if key in self._jobs:
+            self._record("duplicate")
+            return False
+        if self._busy():
+            self._record("skipped_busy")
+            return False
+        if self._queue.qsize() >= self._settings().speculation_queue:
+            self._record("dropped")
+            return False
+        job = _Job(key, topic, answer)
+        self._queue.put_nowait(job)
+        self._jobs[key] = job
+        self._record("enqueued")
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    async def lookup(self, topic: str, answer: str, count: int) -> Optional[list[Any]]:
+        """返回预生成的前 count 个子问题；已发给模型的预生成会等待其完成，仍在排队的直接放弃，未命中返回 None。"""
+        speculated = self._settings().speculation_count
+        if count > speculated:
+            self._record("miss_count")
+            return None
+        questions = await self._cached(topic, answer, speculated)
+        if questions:
+            self._record("hit")
+            return questions[:count]
+        job = self._jobs.get(speculation_key(topic, answer))
+        if job is not None and job.task is None:
+            job.superseded = True
+        elif job is not None:
+            job.claimed = True
+            while not job.task.done():
+                if self._queued():
+                    # 预生成还以最低优先级排在所有请求之后：取消它，由调用方按正常优先级生成
+                    job.superseded = True
+                    job.task.cancel()
+                    break
+                # 已发给模型时等待结果；不能直接 await 任务，它被取消时不应连带取消当前请求
+                await asyncio.wait({job.task}, timeout=BUSY_POLL_SECONDS)
+            if job.task.done() and not job.task.cancelled() and job.task.exception() is None:
+                self._record("hit_inflight")
+                return job.task.result()[:count]
+        self._record("miss")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._counts.get("hit", 0) + self._counts.get("hit_inflight", 0)
+        lookups = hits + self._counts.get("miss", 0) + self._counts.get("miss_count", 0)
+        return {
+            **self._counts,
+            "queued": self._queue.qsize(),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        self._jobs.clear()
+
+    def _record(self, outcome: str) -> None:
+        self._counts[outcome] = self._counts.get(outcome, 0) + 1
+        SPECULATION.inc(outcome)
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001
+                self._record("failed")
+                logger.exception("Speculative generation failed")
+            finally:
+                self._jobs.pop(job.key, None)
+
+    async def _process(self, job: _Job) -> None:
+        if job.superseded:
+            self._record("superseded")
+            return
+        if self._busy():
+            self._record("skipped_busy")
+            return
+        count = self._settings().speculation_count
+        if await self._cached(job.topic, job.answer, count):
+            # 之前的预生成或用户自己的 /generate 已把结果写入缓存
+            self._record("duplicate")
+            return
+        job.task = asyncio.create_task(self._generate(job.topic, job.answer, count, Priority.BACKGROUND))
+        while not job.task.done():
+            await asyncio.wait({job.task}, timeout=BUSY_POLL_SECONDS)
+            if not job.task.done() and not job.claimed and self._busy():
+                # 有交互请求在排队：放弃本次预生成，把模型让给用户
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+                self._record("cancelled")
+                return
+        if job.task.cancelled():
+            self._record("superseded" if job.superseded else "cancelled")
+            return
+        if job.task.exception() is not None:
+            self._record("failed")
+            logger.info("Speculative generation failed: %s", job.task.exception())
+            return
+        self._record("completed")
+
+
+def create_speculator(client: AIClient) -> Speculator:
+    return Speculator(
+        lambda topic, answer, count, priority: generate_questions(
+            client, topic, answer, count, cache=BACKGROUND_CACHE, strict=True, priority=priority
+        ),
+        lambda topic, answer, count: cached_questions(client, topic, answer, count),
+        # 有比后台任务更紧急的请求在排队，说明模型已被交互流量占满
+        lambda: any(target.scheduler.waiting(Priority.BACKGROUND) for target in client.targets),
+        # 服务内只有预生成使用 BACKGROUND，且同一时间只运行一个，据此判断它是否仍在排队
+        lambda: any(target.scheduler.queued(Priority.BACKGROUND) for target in client.targets),
+        lambda: client.settings,
+    )
+
+
+_speculator: Speculator | None = None
+
+
+def get_speculator() -> Speculator:
+    global _speculator
+    if _speculator is None:
+        _speculator = create_speculator(get_ai_client())
+    return _speculator
+
+
+async def shutdown_speculator() -> None:
+    global _speculator
+    if _speculator is not None:
+        await _speculator.close()
+        _speculator = None
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:  # 可选依赖：未安装时只生成 gzip，已有的 .br 文件照常使用
+    import brotli
+except ModuleNotFoundError:  # pragma: no cover
+    brotli = None  # type: ignore
+
+try:
+    from backend.services.encoding import MIN_COMPRESS_BYTES, EncodedBody, etag_matches, negotiate
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.encoding import MIN_COMPRESS_BYTES, EncodedBody, etag_matches, negotiate  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# 单个文件不超过该大小时连同压缩版本常驻内存，总量受 MEMORY_BUDGET 限制
+MEMORY_FILE_BYTES = 512 * 1024
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Vite 输出到 assets/ 的文件名带内容哈希（name-[hash].ext），内容变化文件名随之变化，可永久缓存
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# index.html 等固定文件名每次都向服务端确认，命中 ETag 时只返回 304
+REVALIDATE = "no-cache"
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/wasm")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(("+json", "+xml"))
+
+
+def _media_type(path: Path) -> str:
+    if path.suffix in {".js", ".mjs"}:
+        # 部分系统的 mimetypes 把 .js 映射为 text/plain，浏览器会拒绝执行模块脚本
+        return "application/javascript"
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    media_type: str
+    etag: str
+    size: int
+    cache_control: str
+    # 各编码对应的磁盘文件，identity 即原文件
+    files: Dict[str, Path] = field(default_factory=dict)
+    body: Optional[EncodedBody] = None
+
+    @property
+    def encodings(self) -> tuple[str, ...]:
+        return tuple(coding for coding in ("br", "gzip") if coding in self.files)
+
+
+class StaticSite:
+    """启动时为前端构建产物建立索引：预压缩（缺失时生成 .br/.gz）、按文件名设置缓存策略，小文件常驻内存。"""
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        memory_file_bytes: int = MEMORY_FILE_BYTES,
+        memory_budget: int = MEMORY_BUDGET,
+    ) -> None:
+        self.root = root.resolve()
+        self.memory_file_bytes = memory_file_bytes
+        self.memory_budget = memory_budget
+        self.memory_bytes = 0
+        self._assets: Dict[str, StaticAsset] = {}
+
+    async def load(self) -> None:
+        await asyncio.to_thread(self._build)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self._assets),
+            "inMemory": sum(1 for asset in self._assets.values() if asset.body is not None),
+            "memoryBytes": self.memory_bytes,
+        }
+
+    def response(self, full_path: str, request: Request) -> Response:
+        """返回对应文件；未知路径回退到 index.html 交给前端路由，assets/ 下的缺失文件返回 404。"""
+        asset = self._assets.get(full_path.strip("/"))
+        if asset is None:
+            if full_path.startswith("assets/"):
+                return Response(status_code=404)
+            asset = self._assets.get("index.html")
+            if asset is None:
+                return Response(status_code=404)
+        coding = negotiate(request.headers.get("accept-encoding"), asset.size, asset.encodings)
+        etag = asset.etag if coding == "identity" else f"W/{asset.etag}"
+        headers = {"Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+        if asset.body is not None:
+            return asset.body.response(coding, headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return FileResponse(asset.files[coding], media_type=asset.media_type, headers={**headers, "ETag": etag})
+
+    def _build(self) -> None:
+        assets: Dict[str, StaticAsset] = {}
+        self.memory_bytes = 0
+        generated = 0
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.suffix in {".br", ".gz"}:
+                continue
+            key = path.relative_to(self.root).as_posix()
+            raw = path.read_bytes()
+            media_type = _media_type(path)
+            hashed = key.startswith("assets/") and HASHED_NAME.search(key) is not None
+            asset = StaticAsset(
+                path=path,
+                media_type=media_type,
+                etag=f'"{hashlib.sha256(raw).hexdigest()[:16]}"',
+                size=len(raw),
+                cache_control=IMMUTABLE if hashed else REVALIDATE,
+                files={"identity": path},
+            )
+            variants: Dict[str, bytes] = {}
+            if _compressible(media_type) and len(raw) >= MIN_COMPRESS_BYTES:
+                for coding, suffix in ENCODING_SUFFIXES.items():
+                    body, created = self._variant(path, raw, coding, suffix)
+                    if body is None:
+                        continue
+                    generated += created
+                    # 压缩后没明显变小的文件直接发送原文
+                    if len(body) < len(raw) * 0.9:
+                        variants[coding] = body
+                        asset.files[coding] = path.with_name(path.name + suffix)
+            cost = len(raw) + sum(len(body) for body in variants.values())
+            if len(raw) <= self.memory_file_bytes and self.memory_bytes + cost <= self.memory_budget:
+                asset.body = EncodedBody(raw, asset.etag, media_type, variants)
+                self.memory_bytes += cost
+            else:
+                # 只走磁盘的文件若无法写出压缩版本就不提供该编码
+                for coding in list(asset.encodings):
+                    if not asset.files[coding].exists():
+                        del asset.files[coding]
+            assets[key] = asset
+        self._assets = assets
+        logger.info(
+            "Indexed %s frontend files under %s (%s compressed variants generated, %.1f MiB in memory)",
+            len(assets), self.root, generated, self.memory_bytes / (1 << 20),
+        )
+
+    @staticmethod
+    def _variant(path: Path, raw: bytes, coding: str, suffix: str) -> tuple[Optional[bytes], int]:
+        target = path.with_name(path.name + suffix)
+        # 构建时已生成且不早于原文件的压缩版本直接使用
+        if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+            return target.read_bytes(), 0
+        if coding == "br":
+            if brotli is None:
+                return None, 0
+            body = brotli.compress(raw, quality=11)
+        else:
+            body = gzip.compress(raw, compresslevel=9, mtime=0)
+        try:
+            target.write_bytes(body)
+        except OSError as exc:
+            # 只读的容器镜像里写不了文件，压缩结果仍可留在内存中使用
+            logger.debug("Cannot write %s: %s", target, exc)
+        return body, 1
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+try:
+    from backend.services.ai_client import AIClient
+    from backend.services.cache import CachePolicy
+    from backend.services.scheduler import Priority
+except ModuleNotFoundError:  # running from backend/ as working dir
+    from services.ai_client import AIClient  # type: ignore
+    from services.cache import CachePolicy  # type: ignore
+    from services.scheduler import Priority  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CHUNK_PROMPT = (
+    "你是一名知识整理助手，请阅读以下节点及其子节点的问题和回答，将核心信息压缩成一段摘要。"
+    "摘要应保持原语言，突出关键要点，可用短段落或要点形式，长度不超过 {limit} 字。"
+    "\n\n当前节点：{topic}\n\n原始内容：\n{context}"
+)
+
+REDUCE_PROMPT = (
+    "你是一名知识整理助手，下面是同一节点下各个分支的摘要，请合并成一段整体摘要。"
+    "摘要应保持原语言，去除重复信息，突出关键要点，长度不超过 {limit} 字。"
+    "\n\n当前节点：{topic}\n{own}\n\n分支摘要：\n{parts}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # 粗略估算：CJK 字符约 1 token/字，其余约 4 字符/token
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def split_by_tokens(text: str, budget: int) -> list[str]:
+    """按估算的 token 数把文本切成不超过预算的片段，优先在换行处断开，过长的单行按字符切开。"""
+    budget = max(2, budget)
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        for piece in _cut_line(line, budget):
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > budget:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _cut_line(line: str, budget: int) -> list[str]:
+    if estimate_tokens(line) <= budget:
+        return [line]
+    pieces: list[str] = []
+    start = 0
+    cost = 0.0
+    for index, ch in enumerate(line):
+        cost += 1 if ord(ch) >= 0x2E80 else 0.25
+        if cost > budget - 1:
+            pieces.append(line[start:index])
+            start, cost = index, (1 if ord(ch) >= 0x2E80 else 0.25)
+    pieces.append(line[start:])
+    return [piece for piece in pieces if piece]
+
+
+def _hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _own_line(node: Dict[str, Any], depth: int) -> str:
+    indent = "  " * depth
+    answer_text = node.get("answer") or "暂无回答"
+    return f"{indent}- 问题：{node.get('question', '')}\n{indent}  回答：{answer_text}"
+
+
+@dataclass
+class _Prepared:
+    node: Dict[str, Any]
+    depth: int
+    own: str
+    tokens: int = 0
+    digest: str = ""
+    children: list["_Prepared"] = field(default_factory=list)
+
+
+@dataclass
+class SummaryRun:
+    model_calls: int = 0
+    cache_hits: int = 0
+    chunks: int = 0
+
+
+class TreeSummarizer:
+    def __init__(self, *, cache_entries: int = 2048) -> None:
+        self.cache_entries = cache_entries
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+    async def summarize(
+        self,
+        client: AIClient,
+        root: Dict[str, Any],
+        *,
+        chunk_tokens: int,
+        concurrency: int,
+        summary_limit: int = 200,
+        cache: CachePolicy = CachePolicy(),
+    ) -> tuple[str, SummaryRun]:
+        prepared = self._prepare(root)
+        job = _SummaryJob(self, client, chunk_tokens, asyncio.Semaphore(max(1, concurrency)), summary_limit, cache)
+        summary = await job.summarize(prepared)
+        logger.info(
+            "Tree summary done nodes_tokens=%s chunks=%s calls=%s cache_hits=%s",
+            prepared.tokens, job.run.chunks, job.run.model_calls, job.run.cache_hits,
+        )
+        return summary, job.run
+
+    def cached(self, key: str) -> Optional[str]:
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def remember(self, key: str, value: str) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _prepare(root: Dict[str, Any]) -> _Prepared:
+        # 迭代后序遍历：子树 token 数相加，摘要 key 由自身内容与子节点 key 组合（Merkle 式），
+        # 任何分支内容变化只会影响它到根路径上的 key，其余分支继续命中缓存
+        top = _Prepared(root, 0, _own_line(root, 0))
+        stack: list[tuple[_Prepared, bool]] = [(top, False)]
+        while stack:
+            item, expanded = stack.pop()
+            if not expanded:
+                stack.append((item, True))
+                for child in item.node.get("children") or []:
+                    prepared = _Prepared(child, item.depth + 1, _own_line(child, item.depth + 1))
+                    item.children.append(prepared)
+                    stack.append((prepared, False))
+                continue
+            digest = hashlib.sha256(item.own.encode("utf-8"))
+            item.tokens = estimate_tokens(item.own)
+            for child in item.children:
+                digest.update(child.digest.encode("ascii"))
+                item.tokens += child.tokens
+            item.digest = digest.hexdigest()
+        return top
+
+
+def _render(item: _Prepared) -> str:
+    lines: list[str] = []
+    stack = [item]
+    while stack:
+        current = stack.pop()
+        lines.append(current.own)
+        stack.extend(reversed(current.children))
+    return "\n".join(lines)
+
+
+class _SummaryJob:
+    def __init__(
+        self,
+        owner: TreeSummarizer,
+        client: AIClient,
+        chunk_tokens: int,
+        semaphore: asyncio.Semaphore,
+        summary_limit: int,
+        cache: CachePolicy,
+    ) -> None:
+        self.owner = owner
+        self.client = client
+        self.chunk_tokens = chunk_tokens
+        self.semaphore = semaphore
+        self.summary_limit = summary_limit
+        self.cache = cache
+        self.run = SummaryRun()
+
+    async def summarize(self, item: _Prepared) -> str:
+        topic = item.node.get("question", "")
+        if item.tokens <= self.chunk_tokens:
+            return await self._chunk(f"subtree:{item.digest}", topic, _render(item))
+        # 子树过大：能整体放进预算的子分支打包成块（map），过大的子分支递归处理，最后逐层合并（reduce）
+        tasks: list[asyncio.Future[str]] = []
+        own = item.own.strip()
+        if estimate_tokens(item.own) > self.chunk_tokens:
+            # 节点自身的回答就超出预算（如很长的叶子回答）：先分段摘要，合并时不再附带原文
+            for piece in split_by_tokens(item.own, self.chunk_tokens):
+                tasks.append(asyncio.ensure_future(self._chunk(f"own:{_hash(topic, piece)}", topic, piece)))
+            own = ""
+        batch: list[_Prepared] = []
+        batch_tokens = 0
+        for child in item.children:
+            if child.tokens > self.chunk_tokens:
+                tasks.append(asyncio.ensure_future(self.summarize(child)))
+                continue
+            if batch and batch_tokens + child.tokens > self.chunk_tokens:
+                tasks.append(asyncio.ensure_future(self._pack(topic, batch)))
+                batch, batch_tokens = [], 0
+            batch.append(child)
+            batch_tokens += child.tokens
+        if batch:
+            tasks.append(asyncio.ensure_future(self._pack(topic, batch)))
+        try:
+            parts = list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return await self._reduce(item, own, parts)
+
+    async def _pack(self, topic: str, batch: list[_Prepared]) -> str:
+        # 提示词里还有父节点的问题，键同样要包含它，父节点改名后不能复用旧摘要
+        key = "pack:" + _hash(topic, *(child.digest for child in batch))
+        return await self._chunk(key, topic, "\n".join(_render(child) for child in batch))
+
+    async def _reduce(self, item: _Prepared, own: str, parts: list[str]) -> str:
+        topic = item.node.get("question", "")
+        # 分支摘要本身也可能超出预算，先分组合并，直到能放进一次调用
+        while len(parts) > 1 and estimate_tokens("\n".join(parts)) > self.chunk_tokens:
+            groups: list[list[str]] = [[]]
+            group_tokens = 0
+            for part in parts:
+                tokens = estimate_tokens(part)
+                if groups[-1] and group_tokens + tokens > self.chunk_tokens:
+                    groups.append([])
+                    group_tokens = 0
+                groups[-1].append(part)
+                group_tokens += tokens
+            if len(groups) == len(parts):
+                break
+            parts = list(await asyncio.gather(*(self._merge(topic, own, group) for group in groups)))
+        # 分支如何分块取决于 chunk_tokens，预算变化后的合并结果不能沿用
+        return await self._merge(topic, own, parts, key=f"reduce:{self.chunk_tokens}:{item.digest}")
+
+    async def _merge(self, topic: str, own: str, parts: list[str], key: str | None = None) -> str:
+        joined = "\n".join(f"- {part.strip()}" for part in parts)
+        if key is None:
+            key = "merge:" + _hash(topic, own, joined)
+        prompt = REDUCE_PROMPT.format(limit=self.summary_limit, topic=topic, own=own, parts=joined)
+        return await self._call(key, prompt)
+
+    async def _chunk(self, key: str, topic: str, context: str) -> str:
+        self.run.chunks += 1
+        prompt = CHUNK_PROMPT.format(limit=self.summary_limit, topic=topic, context=context)
+        return await self._call(key, prompt)
+
+    async def _call(self, key: str, prompt: str) -> str:
+        settings = self.client.settings
+        key = _hash(settings.provider, settings.model, settings.answer_style, str(self.summary_limit), key)
+        if self.cache.read:
+            cached = self.owner.cached(key)
+            if cached is not None:
+                self.run.cache_hits += 1
+                return cached
+        async with self.semaphore:
+            self.run.model_calls += 1
+            answer = await self.client.ask(prompt, cache=self.cache, strict=True, priority=Priority.SUMMARY)
+        if self.cache.write:
+            self.owner.remember(key, answer)
+        return answer
+
+
+_summarizer: TreeSummarizer | None = None
+
+
+def get_tree_summarizer() -> TreeSummarizer:
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = TreeSummarizer()
+    return _summarizer
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from services.history import HistoryStore
+
+
+def test_segments_keep_rotation_order_within_one_second(tmp_path: Path) -> None:
+    store = HistoryStore(tmp_path / "history.jsonl", max_bytes=1, keep_segments=0)
+    for index in range(12):
+        store.append({"question": f"q{index}", "answer": "a"})
+
+    segments = store.segments()
+    assert len(segments) == 12
+    assert [record["question"] for record in store.iter_records()] == [f"q{index}" for index in range(12)]
+
+
+def test_segments_sort_by_stamp_then_suffix(tmp_path: Path) -> None:
+    names = [
+        "history-20260102T000000-10.jsonl",
+        "history-20260102T000000-2.jsonl",
+        "history-20260101T235959-1.jsonl",
+        "history-20260102T000000.jsonl",
+        "history-20260101T235959.jsonl",
+        "history-export.jsonl",
+    ]
+    for name in names:
+        (tmp_path / name).write_text(json.dumps({"question": name}) + "\n", encoding="utf-8")
+
+    store = HistoryStore(tmp_path / "history.jsonl", keep_segments=3)
+    assert [segment.name for segment in store.segments()] == [
+        "history-20260101T235959.jsonl",
+        "history-20260101T235959-1.jsonl",
+        "history-20260102T000000.jsonl",
+        "history-20260102T000000-2.jsonl",
+        "history-20260102T000000-10.jsonl",
+    ]
+
+    store._compact()
+    assert sorted(path.name for path in tmp_path.glob("history-*.jsonl")) == [
+        "history-20260102T000000-10.jsonl",
+        "history-20260102T000000-2.jsonl",
+        "history-20260102T000000.jsonl",
+        "history-export.jsonl",
+    ]
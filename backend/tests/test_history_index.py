@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from services.history_index import HistoryIndex
+
+RECORDS = [
+    {"timestamp": "2026-01-01T00:00:00Z", "question": "什么是机器学习？", "answer": "让计算机从数据中学习规律。"},
+    {"timestamp": "2026-01-02T00:00:00Z", "question": "深度学习和机器学习的区别", "answer": "深度学习使用多层神经网络。"},
+    {"timestamp": "2026-01-03T00:00:00Z", "question": "How does AI work?", "answer": "Models learn from data, e.g. C# or Go."},
+    {"timestamp": "2026-01-04T00:00:00Z", "question": "器学是什么", "answer": "不是一个词。"},
+]
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> Iterator[HistoryIndex]:
+    instance = HistoryIndex(tmp_path / "history.sqlite3")
+    instance.add(RECORDS)
+    yield instance
+    instance.close()
+
+
+def _questions(index: HistoryIndex, query: str) -> list[str]:
+    items, _ = index.search(query, limit=10)
+    return [item["question"] for item in items]
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("机器", ["深度学习和机器学习的区别", "什么是机器学习？"]),
+        ("器", ["器学是什么", "深度学习和机器学习的区别", "什么是机器学习？"]),
+        ("网络", ["深度学习和机器学习的区别"]),
+        ("学 区别", ["深度学习和机器学习的区别"]),
+        ("机器学习 深度", ["深度学习和机器学习的区别"]),
+        ("ai", ["How does AI work?"]),
+        ("C#", ["How does AI work?"]),
+        ("器机", []),
+    ],
+)
+def test_short_terms_match_substrings(index: HistoryIndex, query: str, expected: list[str]) -> None:
+    assert _questions(index, query) == expected
+
+
+def test_short_terms_use_the_index(index: HistoryIndex) -> None:
+    plan = index._db.execute(
+        "EXPLAIN QUERY PLAN SELECT r.id FROM records_chars c JOIN records r ON r.id = c.rowid "
+        "WHERE records_chars MATCH ? ORDER BY c.rowid DESC",
+        ('"机 器"',),
+    ).fetchall()
+    assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+
+def test_pagination_with_short_term(index: HistoryIndex) -> None:
+    first, cursor = index.search("学", limit=2)
+    assert cursor == first[-1]["id"]
+    rest, cursor = index.search("学", before_id=cursor, limit=2)
+    assert cursor is None
+    assert [item["id"] for item in first + rest] == [4, 2, 1]
+
+
+def test_existing_index_is_backfilled(tmp_path: Path) -> None:
+    path = tmp_path / "history.sqlite3"
+    original = HistoryIndex(path)
+    original.add(RECORDS)
+    original.close()
+    with sqlite3.connect(path) as db:
+        db.execute("DROP TABLE records_chars")
+
+    reopened = HistoryIndex(path)
+    assert _questions(reopened, "机器") == ["深度学习和机器学习的区别", "什么是机器学习？"]
+    reopened.rebuild(RECORDS[:1])
+    assert _questions(reopened, "机器") == ["什么是机器学习？"]
+    reopened.close()
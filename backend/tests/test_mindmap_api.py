@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import mindmap
+from services.mindmap_store import JsonMindMapStore, MindMapStore, SqliteMindMapStore, get_mindmap_store
+
+TIMESTAMP = "2026-01-01T00:00:00.000Z"
+
+
+def _node(node_id: str, parent_id: str | None = None, question: str = "问题") -> dict:
+    return {
+        "id": node_id,
+        "parentId": parent_id,
+        "question": question,
+        "answer": None,
+        "position": {"x": 0, "y": 0},
+        "createdAt": TIMESTAMP,
+        "updatedAt": TIMESTAMP,
+    }
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def client(request: pytest.FixtureRequest, tmp_path: Path) -> TestClient:
+    store: MindMapStore
+    if request.param == "sqlite":
+        store = SqliteMindMapStore(tmp_path / "mindmap.sqlite3")
+    else:
+        store = JsonMindMapStore(tmp_path / "mindmap.json")
+    app = FastAPI()
+    app.include_router(mindmap.router, prefix="/api")
+    app.dependency_overrides[get_mindmap_store] = lambda: store
+    return TestClient(app)
+
+
+def test_upsert_without_parent_id_keeps_parent(client: TestClient) -> None:
+    ops = [{"op": "upsert", "node": _node("root")}, {"op": "upsert", "node": _node("child", "root")}]
+    assert client.patch("/api/mindmap", json={"ops": ops}).status_code == 200
+
+    edited = {key: value for key, value in _node("child", question="改过的问题").items() if key != "parentId"}
+    edited["answer"] = "新回答"
+    response = client.patch("/api/mindmap", json={"ops": [{"op": "upsert", "node": edited}]})
+    assert response.status_code == 200
+
+    nodes = client.get("/api/mindmap").json()["nodes"]
+    assert [node["id"] for node in nodes] == ["root"]
+    child = nodes[0]["children"][0]
+    assert (child["id"], child["parentId"], child["question"], child["answer"]) == ("child", "root", "改过的问题", "新回答")
+
+
+def test_upsert_with_null_parent_id_moves_to_root(client: TestClient) -> None:
+    ops = [{"op": "upsert", "node": _node("root")}, {"op": "upsert", "node": _node("child", "root")}]
+    client.patch("/api/mindmap", json={"ops": ops})
+
+    client.patch("/api/mindmap", json={"ops": [{"op": "upsert", "node": _node("child", None)}]})
+
+    nodes = client.get("/api/mindmap").json()["nodes"]
+    assert sorted(node["id"] for node in nodes) == ["child", "root"]
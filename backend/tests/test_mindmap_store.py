@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import pytest
+
+from services.mindmap_store import (
+    JsonMindMapStore,
+    MindMapConflict,
+    MindMapOpError,
+    MindMapStore,
+    SqliteMindMapStore,
+)
+
+pytestmark = pytest.mark.anyio
+
+TIMESTAMP = "2026-01-01T00:00:00.000Z"
+
+
+def _node(node_id: str, parent_id: str | None = None, **fields: Any) -> dict[str, Any]:
+    return {
+        "id": node_id,
+        "parentId": parent_id,
+        "question": fields.pop("question", f"问题 {node_id}"),
+        "answer": fields.pop("answer", None),
+        "position": {"x": 0, "y": 0},
+        "createdAt": TIMESTAMP,
+        "updatedAt": TIMESTAMP,
+        **fields,
+    }
+
+
+def _upsert(node_id: str, parent_id: str | None = None, **fields: Any) -> dict[str, Any]:
+    return {"op": "upsert", "node": _node(node_id, parent_id, **fields)}
+
+
+def _shape(nodes: list[dict[str, Any]]) -> list[Any]:
+    """把快照压缩成 [id, [子节点...]] 的嵌套列表，便于比较树形与顺序。"""
+    return [[node["id"], _shape(node.get("children") or [])] for node in nodes]
+
+
+@pytest.fixture(params=["json", "json-write-behind", "sqlite"])
+async def store(request: pytest.FixtureRequest, tmp_path: Path) -> AsyncIterator[MindMapStore]:
+    if request.param == "sqlite":
+        instance: MindMapStore = SqliteMindMapStore(tmp_path / "mindmap.sqlite3")
+    else:
+        delay = 60.0 if request.param == "json-write-behind" else 0.0
+        instance = JsonMindMapStore(tmp_path / "mindmap.json", flush_delay=delay)
+    await instance.apply([_upsert("root"), _upsert("a", "root"), _upsert("b", "root"), _upsert("a1", "a")])
+    yield instance
+    await instance.close()
+
+
+async def test_upsert_creates_and_updates(store: MindMapStore) -> None:
+    version = await store.apply([_upsert("c", "b", answer="回答")])
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["a", [["a1", []]]], ["b", [["c", []]]]]]]
+
+    partial = _node("c", question="新问题")
+    del partial["parentId"], partial["answer"]
+    assert await store.apply([{"op": "upsert", "node": partial}]) == version + 1
+    node = await store.node("c")
+    assert node is not None
+    assert (node["parentId"], node["question"], node["answer"]) == ("b", "新问题", "回答")
+
+
+async def test_upsert_with_new_parent_moves(store: MindMapStore) -> None:
+    await store.apply([_upsert("a1", "b")])
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["a", []], ["b", [["a1", []]]]]]]
+
+
+async def test_move_with_index(store: MindMapStore) -> None:
+    await store.apply([{"op": "move", "id": "b", "parentId": "root", "index": 0}])
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["b", []], ["a", [["a1", []]]]]]]
+
+    await store.apply([{"op": "move", "id": "a1", "parentId": None}])
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["b", []], ["a", []]]], ["a1", []]]
+
+
+async def test_delete_removes_subtree(store: MindMapStore) -> None:
+    await store.apply([{"op": "delete", "id": "a"}])
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["b", []]]]]
+    assert await store.node("a1") is None
+
+
+async def test_move_into_own_subtree_is_rejected(store: MindMapStore) -> None:
+    version = await store.current_version()
+    with pytest.raises(MindMapOpError):
+        await store.apply([{"op": "move", "id": "a", "parentId": "a1"}])
+    assert await store.current_version() == version
+    _, roots = await store.snapshot()
+    assert _shape(roots) == [["root", [["a", [["a1", []]]], ["b", []]]]]
+
+
+@pytest.mark.parametrize(
+    "bad_op",
+    [
+        {"op": "delete", "id": "missing"},
+        {"op": "teleport", "id": "a"},
+        {"op": "position", "id": "a"},  # 缺少 position 字段，抛出的不是 MindMapOpError
+    ],
+)
+async def test_failed_batch_rolls_back(store: MindMapStore, bad_op: dict[str, Any]) -> None:
+    version, roots = await store.snapshot()
+    before = _shape(roots)  # JSON 存储的快照直接引用内存中的树，先取出树形再修改
+    with pytest.raises(Exception):
+        await store.apply([
+            _upsert("c", "b"),
+            {"op": "move", "id": "a1", "parentId": "b"},
+            {"op": "delete", "id": "a"},
+            bad_op,
+        ])
+    version_after, roots = await store.snapshot()
+    assert (version_after, _shape(roots)) == (version, before)
+    assert await store.node("c") is None
+
+
+async def test_version_conflict(store: MindMapStore) -> None:
+    version = await store.current_version()
+    assert await store.apply([_upsert("c")], expected_version=version) == version + 1
+
+    with pytest.raises(MindMapConflict) as excinfo:
+        await store.apply([_upsert("d")], expected_version=version)
+    assert excinfo.value.current == version + 1
+    assert await store.node("d") is None
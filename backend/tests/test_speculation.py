@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import pytest
+
+from services.ai_client import AIClient, AISettings
+from services.questions import generate_questions
+from services.speculation import Speculator, create_speculator
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def calls() -> list[str]:
+    return []
+
+
+@pytest.fixture
+async def client(tmp_path: Path, calls: list[str]) -> AsyncIterator[AIClient]:
+    settings = AISettings(
+        provider="http",
+        base_url="http://127.0.0.1:9/v1",
+        history_path=tmp_path / "history.jsonl",
+        history_index=False,
+        config_watch_interval=0,
+        speculation_count=3,
+        speculation_queue=2,
+    )
+    instance = AIClient(settings)
+
+    async def dispatch(target: Any, prompt: Any, schema: Any = None) -> str:
+        calls.append(prompt.text())
+        count = int(prompt.text().split("生成 ")[1].split(" 个")[0])
+        return json.dumps({"questions": [{"question": f"子问题 {index}"} for index in range(count)]})
+
+    instance._dispatch = dispatch  # type: ignore[method-assign]
+    yield instance
+    await instance.aclose()
+
+
+async def _drain(speculator: Speculator) -> None:
+    for _ in range(100):
+        if not speculator.stats()["queued"] and not speculator._jobs:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("speculation did not finish")
+
+
+async def test_result_is_served_from_the_response_cache(client: AIClient, calls: list[str]) -> None:
+    speculator = create_speculator(client)
+    assert speculator.submit("什么是熵？", "  系统无序程度的度量。 ")
+    await _drain(speculator)
+    assert len(calls) == 1
+
+    assert await speculator.lookup("什么是熵？", "系统无序程度的度量。", 2) == ["子问题 0", "子问题 1"]
+    # 同样数量的普通 /generate 命中同一条缓存，不再调用模型
+    questions = await generate_questions(client, "什么是熵？", "系统无序程度的度量。", 3)
+    assert questions == ["子问题 0", "子问题 1", "子问题 2"]
+    assert len(calls) == 1
+    assert speculator.stats()["hit"] == 1
+    await speculator.close()
+
+
+async def test_cached_result_is_not_generated_again(client: AIClient, calls: list[str]) -> None:
+    await generate_questions(client, "问题", "回答", 3)
+    speculator = create_speculator(client)
+    assert speculator.submit("问题", "回答")
+    await _drain(speculator)
+    assert len(calls) == 1
+    assert speculator.stats()["duplicate"] == 1
+    await speculator.close()
+
+
+async def test_settings_are_read_on_each_use(client: AIClient) -> None:
+    speculator = create_speculator(client)
+    assert await speculator.lookup("问题", "回答", 4) is None
+    assert speculator.stats()["miss_count"] == 1
+
+    client.settings = client.settings.model_copy(update={"speculation_count": 4, "speculation_queue": 0})
+    assert not speculator.submit("问题", "回答")
+    assert speculator.stats()["dropped"] == 1
+
+    client.settings = client.settings.model_copy(update={"speculation_queue": 2})
+    assert speculator.submit("问题", "回答")
+    await _drain(speculator)
+    assert await speculator.lookup("问题", "回答", 4) == [f"子问题 {index}" for index in range(4)]
+    await speculator.close()
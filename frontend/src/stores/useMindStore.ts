@@ -131,6 +131,16 @@ export const useMindStore = defineStore('mind', {
         this.ensureRoot();
       }
     },
+    applyRemote(nodes: MindNode[]) {
+      // 合并其他客户端的修改：保留当前选中节点，不重新排版
+      this.nodes = nodes;
+      if (!this.selectedNodeId || !this.findNodeById(this.selectedNodeId)) {
+        this.selectedNodeId = nodes[0]?.id;
+      }
+      if (!this.nodes.length) {
+        this.ensureRoot();
+      }
+    },
     findNodeById(id: string): LocatedNode | null {
       const stack: LocatedNode[] = this.nodes.map(node => ({ node, parent: null }));
       while (stack.length) {
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { MindNode } from '../types/mind';
+import type { MindNode, NodePosition } from '../types/mind';
 
 const client = axios.create({
   baseURL: '/api'
@@ -7,21 +7,342 @@ const client = axios.create({
 
 interface MindMapResponse {
   nodes: MindNode[];
+  version?: number;
+}
+
+// 扁平列式格式：先序排列，parent 为父节点下标（根为 -1），比嵌套 JSON 更小、解析更快
+const FLAT_JSON = 'application/vnd.mindflow.flat+json';
+
+interface FlatMindMap {
+  format: 'mindflow-flat/1';
+  version: number;
+  count: number;
+  id: string[];
+  parent: number[];
+  question: string[];
+  answer: (string | null)[];
+  x: number[];
+  y: number[];
+  createdAt: string[];
+  updatedAt: string[];
+}
+
+type NodeData = Omit<MindNode, 'children'>;
+
+type MindMapOperation =
+  | { op: 'upsert'; node: NodeData }
+  | { op: 'move'; id: string; parentId: string | null; index?: number | null }
+  | { op: 'delete'; id: string }
+  | { op: 'position'; id: string; position: NodePosition; updatedAt?: string | null };
+
+// 推送通道 /api/mindmap/ws 的服务端消息
+type SyncEvent =
+  | { type: 'hello' | 'reset'; version: number }
+  | { type: 'ops'; version: number; ops: MindMapOperation[]; origin: string | null }
+  | { type: 'ack'; id: number; version: number }
+  | { type: 'error'; id: number | null; status: number; detail: unknown; version?: number }
+  | { type: 'deleted' | 'pong' };
+
+interface SaveResult {
+  version: number;
+}
+
+// 记录最近一次与服务端一致的节点快照，后续保存只发送差异
+let serverVersion: number | null = null;
+let synced = new Map<string, NodeData>();
+let pending: Promise<void> = Promise.resolve();
+
+const clientId = Math.random().toString(36).slice(2, 10);
+let socket: WebSocket | null = null;
+let requestId = 0;
+
+function flatten(nodes: MindNode[], acc = new Map<string, NodeData>()): Map<string, NodeData> {
+  for (const { children, ...data } of nodes) {
+    acc.set(data.id, data);
+    flatten(children, acc);
+  }
+  return acc;
+}
+
+function toFlat(nodes: MindNode[], version: number): FlatMindMap {
+  const flat: FlatMindMap = {
+    format: 'mindflow-flat/1',
+    version,
+    count: 0,
+    id: [],
+    parent: [],
+    question: [],
+    answer: [],
+    x: [],
+    y: [],
+    createdAt: [],
+    updatedAt: []
+  };
+  const stack: [MindNode, number][] = nodes.map((node) => [node, -1] as [MindNode, number]).reverse();
+  while (stack.length) {
+    const [node, parent] = stack.pop()!;
+    const index = flat.id.length;
+    flat.id.push(node.id);
+    flat.parent.push(parent);
+    flat.question.push(node.question);
+    flat.answer.push(node.answer ?? null);
+    flat.x.push(node.position.x);
+    flat.y.push(node.position.y);
+    flat.createdAt.push(node.createdAt);
+    flat.updatedAt.push(node.updatedAt);
+    for (let i = node.children.length - 1; i >= 0; i -= 1) {
+      stack.push([node.children[i], index]);
+    }
+  }
+  flat.count = flat.id.length;
+  return flat;
+}
+
+function fromFlat(flat: FlatMindMap): MindNode[] {
+  const roots: MindNode[] = [];
+  const built: MindNode[] = [];
+  for (let i = 0; i < flat.id.length; i += 1) {
+    const parent = flat.parent[i] >= 0 ? built[flat.parent[i]] : undefined;
+    const node: MindNode = {
+      id: flat.id[i],
+      parentId: parent ? parent.id : null,
+      question: flat.question[i],
+      answer: flat.answer[i] ?? undefined,
+      children: [],
+      position: { x: flat.x[i], y: flat.y[i] },
+      createdAt: flat.createdAt[i],
+      updatedAt: flat.updatedAt[i]
+    };
+    built.push(node);
+    (parent ? parent.children : roots).push(node);
+  }
+  return roots;
+}
+
+function applyOps(nodes: Map<string, NodeData>, ops: MindMapOperation[], local: boolean): void {
+  for (const op of ops) {
+    if (op.op === 'upsert') {
+      const before = nodes.get(op.node.id);
+      const node: NodeData = { ...op.node, answer: op.node.answer ?? undefined };
+      if (!before || before.parentId !== node.parentId) {
+        // 新节点或换了父节点：移到末尾，与服务端追加到 children 末尾一致
+        nodes.delete(node.id);
+      }
+      nodes.set(node.id, node);
+    } else if (op.op === 'move') {
+      const node = nodes.get(op.id);
+      if (!node) continue;
+      nodes.delete(op.id);
+      nodes.set(op.id, { ...node, parentId: op.parentId ?? null });
+    } else if (op.op === 'position') {
+      const node = nodes.get(op.id);
+      // 本地节点按 updatedAt 取较新者，正在拖动的节点不会被自己较早的回显拉回去
+      if (!node || (local && op.updatedAt && op.updatedAt < node.updatedAt)) continue;
+      nodes.set(op.id, { ...node, position: op.position, updatedAt: op.updatedAt ?? node.updatedAt });
+    } else {
+      const removed = new Set([op.id]);
+      let grew = true;
+      while (grew) {
+        grew = false;
+        for (const [id, node] of nodes) {
+          if (!removed.has(id) && node.parentId && removed.has(node.parentId)) {
+            removed.add(id);
+            grew = true;
+          }
+        }
+      }
+      removed.forEach(id => nodes.delete(id));
+    }
+  }
+}
+
+function buildTree(nodes: Map<string, NodeData>): MindNode[] {
+  const built = new Map<string, MindNode>();
+  for (const [id, data] of nodes) {
+    built.set(id, { ...data, children: [] });
+  }
+  const roots: MindNode[] = [];
+  for (const node of built.values()) {
+    const parent = node.parentId ? built.get(node.parentId) : undefined;
+    (parent ? parent.children : roots).push(node);
+  }
+  return roots;
+}
+
+function samePosition(a: NodePosition, b: NodePosition): boolean {
+  return a.x === b.x && a.y === b.y;
+}
+
+function diff(previous: Map<string, NodeData>, next: Map<string, NodeData>): MindMapOperation[] {
+  const ops: MindMapOperation[] = [];
+  // flatten 为先序遍历，父节点的 upsert 总是排在子节点之前
+  for (const [id, node] of next) {
+    const before = previous.get(id);
+    if (
+      !before ||
+      before.parentId !== node.parentId ||
+      before.question !== node.question ||
+      before.answer !== node.answer ||
+      before.createdAt !== node.createdAt
+    ) {
+      ops.push({ op: 'upsert', node });
+    } else if (!samePosition(before.position, node.position) || before.updatedAt !== node.updatedAt) {
+      ops.push({ op: 'position', id, position: node.position, updatedAt: node.updatedAt });
+    }
+  }
+  for (const [id, node] of previous) {
+    // 只删除被移除子树的根，后代会随之一起删除
+    if (!next.has(id) && !(node.parentId && previous.has(node.parentId) && !next.has(node.parentId))) {
+      ops.push({ op: 'delete', id });
+    }
+  }
+  return ops;
 }
 
 export async function fetchServerMindMap(): Promise<MindNode[] | null> {
   try {
-    const { data } = await client.get<MindMapResponse>('/mindmap');
-    return data.nodes ?? null;
+    const { data } = await client.get<FlatMindMap | MindMapResponse>('/mindmap', {
+      headers: { Accept: `${FLAT_JSON}, application/json;q=0.9` }
+    });
+    // 旧版本服务端不认识扁平格式时仍返回嵌套 JSON
+    const nodes = 'nodes' in data ? data.nodes ?? [] : fromFlat(data);
+    serverVersion = data.version ?? null;
+    synced = flatten(nodes);
+    return nodes;
   } catch {
     return null;
   }
 }
 
-export async function persistServerMindMap(nodes: MindNode[]): Promise<void> {
+async function replaceServerMindMap(nodes: MindNode[], next: Map<string, NodeData>): Promise<void> {
+  const { data } = await client.post<SaveResult>('/mindmap', toFlat(nodes, serverVersion ?? 0), {
+    headers: { 'Content-Type': FLAT_JSON }
+  });
+  serverVersion = data.version;
+  synced = next;
+}
+
+async function syncServerMindMap(nodes: MindNode[]): Promise<void> {
+  const next = flatten(nodes);
+  if (serverVersion === null) {
+    await replaceServerMindMap(nodes, next);
+    return;
+  }
+  const ops = diff(synced, next);
+  if (!ops.length) return;
+  if (socket?.readyState === WebSocket.OPEN) {
+    // 推送通道可用时发送节点级消息；位置更新由服务端合并后再提交和广播
+    const structural = ops.filter(op => op.op !== 'position');
+    if (structural.length) {
+      socket.send(JSON.stringify({ type: 'ops', id: ++requestId, ops: structural }));
+    }
+    for (const op of ops) {
+      if (op.op === 'position') {
+        socket.send(JSON.stringify({ type: 'position', id: op.id, position: op.position, updatedAt: op.updatedAt }));
+      }
+    }
+    synced = next;
+    return;
+  }
   try {
-    await client.post('/mindmap', { nodes } as MindMapResponse);
-  } catch {
-    // best-effort; 前端不阻塞
+    const { data } = await client.patch<SaveResult>('/mindmap', { baseVersion: serverVersion, ops });
+    serverVersion = data.version;
+    synced = next;
+  } catch (error) {
+    if (axios.isAxiosError(error) && (error.response?.status === 409 || error.response?.status === 422)) {
+      // 与服务端版本不一致时退回整图覆盖，保持原先“最后写入者生效”的语义
+      await replaceServerMindMap(nodes, next);
+      return;
+    }
+    throw error;
   }
 }
+
+export function persistServerMindMap(nodes: MindNode[]): Promise<void> {
+  pending = pending
+    .then(() => syncServerMindMap(nodes))
+    .catch(() => {
+      // best-effort; 前端不阻塞
+    });
+  return pending;
+}
+
+/**
+ * 连接脑图推送通道：其他客户端的修改以节点级事件实时到达，断线后凭版本号续传。
+ * current 返回当前本地脑图（普通对象），onRemote 接收合并远端修改后的整棵树；返回值用于断开。
+ */
+export function connectServerSync(current: () => MindNode[], onRemote: (nodes: MindNode[]) => void): () => void {
+  let stopped = false;
+  let retryDelay = 1000;
+
+  const refetch = () => {
+    pending = pending
+      .then(async () => {
+        const nodes = await fetchServerMindMap();
+        if (nodes) onRemote(nodes);
+      })
+      .catch(() => {});
+  };
+
+  const overwrite = () => {
+    // 节点级修改被拒绝时退回整图覆盖，与 HTTP 保存的冲突处理一致
+    pending = pending
+      .then(() => {
+        const nodes = current();
+        return replaceServerMindMap(nodes, flatten(nodes));
+      })
+      .catch(() => {});
+  };
+
+  const handle = (event: SyncEvent) => {
+    switch (event.type) {
+      case 'ops': {
+        if (serverVersion !== null && event.version > serverVersion + 1) {
+          // 中间漏了版本（例如服务端未经推送通道写入），整图重新同步
+          refetch();
+          return;
+        }
+        serverVersion = event.version;
+        if (event.origin === clientId) return;
+        applyOps(synced, event.ops, false);
+        const local = flatten(current());
+        applyOps(local, event.ops, true);
+        onRemote(buildTree(local));
+        return;
+      }
+      case 'reset':
+        if (serverVersion !== null && event.version > serverVersion) refetch();
+        return;
+      case 'ack':
+        serverVersion = Math.max(serverVersion ?? 0, event.version);
+        return;
+      case 'error':
+        if (event.status === 409 || event.status === 422) overwrite();
+    }
+  };
+
+  const open = () => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const query = new URLSearchParams({ client: clientId });
+    if (serverVersion !== null) query.set('since', String(serverVersion));
+    const ws = new WebSocket(`${protocol}//${window.location.host}/api/mindmap/ws?${query}`);
+    ws.onopen = () => {
+      retryDelay = 1000;
+    };
+    ws.onmessage = message => handle(JSON.parse(message.data) as SyncEvent);
+    ws.onclose = () => {
+      if (socket === ws) socket = null;
+      if (stopped) return;
+      setTimeout(open, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+    socket = ws;
+  };
+
+  open();
+  return () => {
+    stopped = true;
+    socket?.close();
+    socket = null;
+  };
+}
@@ -2,6 +2,8 @@ import axios from 'axios';
 
 interface AskPayload {
   question: string;
+  // 服务端据此把祖先节点的问答作为对话上下文
+  nodeId?: string;
 }
 
 interface AskResponse {
@@ -42,6 +44,51 @@ export async function askQuestion(payload: AskPayload): Promise<AskResponse> {
   return data;
 }
 
+async function postEventStream(
+  url: string,
+  payload: unknown,
+  onEvent: (event: string, data: any) => void
+): Promise<void> {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(payload)
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`HTTP ${response.status}`);
+  }
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+      const event = /^event: (.*)$/m.exec(frame)?.[1] ?? 'message';
+      const data = JSON.parse(/^data: (.*)$/m.exec(frame)?.[1] ?? '{}');
+      if (event === 'error') {
+        throw new Error(data.detail);
+      }
+      onEvent(event, data);
+    }
+  }
+}
+
+export async function askQuestionStream(payload: AskPayload, onDelta: (delta: string) => void): Promise<AskResponse> {
+  let answer = '';
+  await postEventStream('/api/ask/stream', payload, (event, data) => {
+    if (event === 'delta') {
+      answer += data.delta;
+      onDelta(data.delta);
+    }
+  });
+  return { answer };
+}
+
 export async function summarizeNode(payload: SummaryPayload): Promise<SummaryResponse> {
   const { data } = await client.post<SummaryResponse>('/summary', payload);
   return data;
@@ -51,3 +98,18 @@ export async function generateChildQuestions(payload: GenerateChildrenPayload):
   const { data } = await client.post<GenerateChildrenResponse>('/generate', payload);
   return data;
 }
+
+// 每解析出一个子问题就回调一次，首个子节点无需等待整段生成结束
+export async function generateChildQuestionsStream(
+  payload: GenerateChildrenPayload,
+  onQuestion: (question: { question: string }, index: number) => void
+): Promise<GenerateChildrenResponse> {
+  const questions: { question: string }[] = [];
+  await postEventStream('/api/generate/stream', payload, (event, data) => {
+    if (event === 'question') {
+      questions.push(data);
+      onQuestion(data, questions.length - 1);
+    }
+  });
+  return { questions };
+}